@@ -0,0 +1,35 @@
+"""add rate limit algorithm and burst to plans
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing plans keep their current behaviour via the server default.
+    op.add_column(
+        "plans",
+        sa.Column(
+            "algorithm",
+            sa.String(length=32),
+            server_default="fixed_window",
+            nullable=False,
+        ),
+    )
+    op.add_column("plans", sa.Column("burst", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("plans", "burst")
+    op.drop_column("plans", "algorithm")
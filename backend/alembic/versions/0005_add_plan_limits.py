@@ -0,0 +1,35 @@
+"""add multi-window limits to plans
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Read once per plan-cache refresh, never filtered on, so a JSONB list
+    # beats a child table here.
+    op.add_column(
+        "plans",
+        sa.Column(
+            "limits",
+            postgresql.JSONB(),
+            server_default=sa.text("'[]'::jsonb"),
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("plans", "limits")
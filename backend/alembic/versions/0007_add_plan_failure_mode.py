@@ -0,0 +1,27 @@
+"""add failure mode to plans
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "plans",
+        sa.Column("failure_mode", sa.String(16), server_default="local", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("plans", "failure_mode")
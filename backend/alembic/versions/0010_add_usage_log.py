@@ -0,0 +1,40 @@
+"""add partitioned usage_log table
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Daily partitions (usage_log_YYYYMMDD) are created and dropped by the
+    # ingester; see app/usage_log.py. No foreign key to api_keys: usage
+    # outlives deleted keys and the check would slow down bulk loads.
+    op.execute(
+        """
+        CREATE TABLE usage_log (
+            ts timestamptz NOT NULL,
+            event_id text NOT NULL,
+            key_id uuid NOT NULL,
+            route text NOT NULL,
+            allowed boolean NOT NULL,
+            cost integer NOT NULL,
+            PRIMARY KEY (ts, event_id)
+        ) PARTITION BY RANGE (ts)
+        """
+    )
+    op.create_index("ix_usage_log_key_id_ts", "usage_log", ["key_id", "ts"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_usage_log_key_id_ts", table_name="usage_log")
+    op.execute("DROP TABLE usage_log")
@@ -0,0 +1,35 @@
+"""add usage_rollups table
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The primary key doubles as the index GET /admin/usage reads with:
+    # one key, one period, a range of buckets.
+    op.create_table(
+        "usage_rollups",
+        sa.Column("key_id", sa.Uuid(), nullable=False),
+        sa.Column("period", sa.String(8), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("route", sa.Text(), nullable=False),
+        sa.Column("allowed", sa.BigInteger(), nullable=False),
+        sa.Column("rejected", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("key_id", "period", "bucket_start", "route"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("usage_rollups")
@@ -0,0 +1,45 @@
+"""add (user_id, created_at, id) indexes for keyset pagination
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # GET /admin/plans and /admin/api-keys page through one user's rows in
+    # (created_at, id) order and resume after the last row of the previous
+    # page; with these indexes each page is a short range scan however deep
+    # it is. Built concurrently so api_keys stays writable meanwhile.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_plans_user_id_created_at_id",
+            "plans",
+            ["user_id", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_api_keys_user_id_created_at_id",
+            "api_keys",
+            ["user_id", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_api_keys_user_id_created_at_id", table_name="api_keys", postgresql_concurrently=True
+        )
+        op.drop_index(
+            "ix_plans_user_id_created_at_id", table_name="plans", postgresql_concurrently=True
+        )
@@ -0,0 +1,117 @@
+"""notify quota_changes on plan, api key and user limit changes
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0013"
+down_revision: Union[str, None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Every instance LISTENs on quota_changes (app/change_feed.py) and drops
+    # the cache entries named in each payload: "key <hash> <hash> ..." or
+    # "plan <id> <id> ...". Statement-level triggers with transition tables
+    # send a bulk write as a few notifications of up to 100 ids each
+    # (payloads are capped at 8000 bytes), and only once it commits.
+    op.execute(
+        """
+        CREATE FUNCTION quota_notify(kind text, ids text[]) RETURNS void
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify('quota_changes', kind || ' ' || array_to_string(ids[i:i + 99], ' '))
+            FROM generate_series(1, coalesce(array_length(ids, 1), 0), 100) AS i;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION quota_notify_api_keys() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                -- Clears negative cache entries for the new hashes
+                PERFORM quota_notify('key', ARRAY(SELECT key_hash FROM new_rows));
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM quota_notify('key', ARRAY(SELECT key_hash FROM old_rows));
+            ELSE
+                -- Skips the last_used_at flushes, which change nothing cached
+                PERFORM quota_notify('key', ARRAY(
+                    SELECT DISTINCT unnest(ARRAY[o.key_hash, n.key_hash])
+                    FROM old_rows o JOIN new_rows n USING (id)
+                    WHERE (o.key_hash, o.plan_id, o.is_active, o.user_id)
+                        IS DISTINCT FROM (n.key_hash, n.plan_id, n.is_active, n.user_id)
+                ));
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION quota_notify_plans() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM quota_notify('plan', ARRAY(SELECT id::text FROM old_rows));
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION quota_notify_users() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            -- A user's pool limits are compiled into each of their plans
+            PERFORM quota_notify('plan', ARRAY(
+                SELECT p.id::text
+                FROM old_rows o JOIN new_rows n USING (id) JOIN plans p ON p.user_id = n.id
+                WHERE o.limits IS DISTINCT FROM n.limits
+            ));
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    for table, event, referencing in (
+        ("api_keys", "INSERT", "NEW TABLE AS new_rows"),
+        ("api_keys", "UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("api_keys", "DELETE", "OLD TABLE AS old_rows"),
+        ("plans", "UPDATE", "OLD TABLE AS old_rows"),
+        ("plans", "DELETE", "OLD TABLE AS old_rows"),
+        ("users", "UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ):
+        op.execute(
+            f"CREATE TRIGGER {table}_notify_{event.lower()} AFTER {event} ON {table} "
+            f"REFERENCING {referencing} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION quota_notify_{table}()"
+        )
+
+
+def downgrade() -> None:
+    for table, event in (
+        ("users", "update"),
+        ("plans", "delete"),
+        ("plans", "update"),
+        ("api_keys", "delete"),
+        ("api_keys", "update"),
+        ("api_keys", "insert"),
+    ):
+        op.execute(f"DROP TRIGGER {table}_notify_{event} ON {table}")
+    for function in (
+        "quota_notify_users()",
+        "quota_notify_plans()",
+        "quota_notify_api_keys()",
+        "quota_notify(text, text[])",
+    ):
+        op.execute(f"DROP FUNCTION {function}")
@@ -0,0 +1,116 @@
+"""Rate limit algorithms, evaluated atomically by the storage backend.
+
+- ``fixed_window``: one counter per window. Cheapest, but a client can spend
+  its whole limit at the end of one window and again at the start of the
+  next (2x burst at the boundary).
+- ``sliding_window``: the current window's counter plus the previous one,
+  weighted by how much of it still overlaps the sliding window. Two counters
+  per key, boundary bursts are smoothed out.
+- ``gcra``: generic cell rate algorithm (a token bucket stored as a single
+  "theoretical arrival time"). ``burst`` requests may arrive back to back,
+  after which requests are admitted at ``limit / window``.
+
+A plan can carry several limits over different periods. Day and month
+limits are calendar-aligned (UTC) fixed windows whose counters expire at
+the end of the period; second/minute/hour limits use the plan's algorithm.
+All of them are checked first and only incremented if every one allows the
+request, in the same atomic call that bumps the key's last-seen time; on
+Redis a decision is exactly one EVALSHA however many windows a plan has (see
+app/storage/). Daily request counts are kept apart from decisions: each one
+is counted in process and flushed to per-user Redis hashes by
+app/request_stats.py.
+"""
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+FIXED_WINDOW = "fixed_window"
+SLIDING_WINDOW = "sliding_window"
+GCRA = "gcra"
+ALGORITHMS = (FIXED_WINDOW, SLIDING_WINDOW, GCRA)
+
+# period -> (key code, length in ms); day and month are calendar periods
+PERIODS = {
+    "second": ("s", 1_000),
+    "minute": ("m", 60_000),
+    "hour": ("h", 3_600_000),
+    "day": ("d", None),
+    "month": ("M", None),
+}
+
+LAST_SEEN_TTL = 30 * 86400
+
+_ALGORITHM_CODES = {FIXED_WINDOW: 1, SLIDING_WINDOW: 2, GCRA: 3}
+
+
+@dataclass(frozen=True, slots=True)
+class Limit:
+    period: str
+    limit: int
+    algorithm: str = FIXED_WINDOW
+    burst: int | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Charge:
+    """``cost`` units against ``limit``, counted under the ``prefix`` key namespace."""
+
+    limit: Limit
+    prefix: str
+    cost: int = 1
+
+
+@dataclass(frozen=True, slots=True)
+class Decision:
+    allowed: bool
+    limit: int  # the binding (most restrictive) limit
+    remaining: int
+    reset_after: float  # seconds until the binding limit is fully available
+    retry_after: float  # seconds until a rejected request could succeed
+    binding: int = 0  # index of the binding charge
+
+
+BLOCKED = Decision(False, 0, 0, 60.0, 60.0)
+
+
+def _calendar_window(period: str, now_ms: int) -> tuple[str, int, int]:
+    """(window id, start ms, end ms) of the UTC day or month containing now."""
+    now = datetime.fromtimestamp(now_ms / 1000, timezone.utc)
+    if period == "day":
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        window_id = start.strftime("%Y%m%d")
+        end = start.timestamp() + 86400
+    else:
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        window_id = start.strftime("%Y%m")
+        if start.month == 12:
+            end = start.replace(year=start.year + 1, month=1).timestamp()
+        else:
+            end = start.replace(month=start.month + 1).timestamp()
+    return window_id, int(start.timestamp() * 1000), int(end * 1000)
+
+
+def window_args(limit: Limit, prefix: str, now_ms: int) -> tuple[list[str], list]:
+    """Counter keys and algorithm arguments (minus cost) for ``limit`` under ``prefix``."""
+    code, window_ms = PERIODS[limit.period]
+    if window_ms is None:
+        window_id, start, end = _calendar_window(limit.period, now_ms)
+        keys = [f"{prefix}{code}:{window_id}"]
+        return keys, [1, limit.limit, end - start, limit.limit, end]
+
+    algorithm = limit.algorithm
+    burst = limit.burst or limit.limit
+    if algorithm == GCRA:
+        keys = [f"{prefix}{code}:gcra"]
+        return keys, [3, limit.limit, window_ms, burst, 0]
+    window_id = now_ms // window_ms
+    end = (window_id + 1) * window_ms
+    keys = [f"{prefix}{code}:{window_id}"]
+    if algorithm == SLIDING_WINDOW:
+        keys.append(f"{prefix}{code}:{window_id - 1}")
+    return keys, [_ALGORITHM_CODES[algorithm], limit.limit, window_ms, burst, end]
+
+
+def blocks_everything(charges: Sequence[Charge]) -> bool:
+    # A zero limit (or a plan that no longer exists) blocks everything
+    return not charges or any(c.limit.limit <= 0 for c in charges)
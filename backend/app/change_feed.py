@@ -0,0 +1,85 @@
+"""Plan and API key changes from Postgres, applied to the in-process caches.
+
+Triggers on ``plans``, ``api_keys`` and ``users`` (migration 0013) NOTIFY
+``quota_changes`` when a transaction that changed something the caches hold
+commits. The payload is ``key <hash> ...`` or ``plan <id> ...``. Each instance
+LISTENs on its own connection and drops the named entries as notifications
+arrive, whoever made the change: an admin endpoint, an import, or plain SQL.
+The cache TTLs are then only a backstop.
+
+Notifications sent while an instance is not listening are lost, so after
+every (re)connect it reloads everything it has cached. LISTEN goes first, so
+a change made during the reload is applied once the reload finishes.
+"""
+import asyncio
+import logging
+
+import psycopg
+from sqlalchemy.engine import make_url
+
+from app.config import CHANGE_FEED_HEARTBEAT, DATABASE_URL
+from app.key_cache import key_cache
+from app.rate_limiter import invalidate_plans, load_keys, resync_plans
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "quota_changes"
+
+
+class ChangeFeed:
+    def __init__(self, dsn: str, heartbeat: float):
+        self.dsn = dsn
+        self.heartbeat = heartbeat
+        self.connected = False
+        self.notifications = 0
+        self.resyncs = 0
+
+    def apply(self, payload: str) -> None:
+        kind, *ids = payload.split()
+        self.notifications += 1
+        if kind == "key":
+            key_cache.invalidate_many(ids)
+        elif kind == "plan":
+            invalidate_plans(ids)
+        else:
+            logger.warning("Unknown change notification", extra={"kind": kind})
+
+    async def resync(self) -> None:
+        await resync_plans()
+        await key_cache.resync(load_keys)
+        self.resyncs += 1
+
+    async def run(self) -> None:
+        """Listen and apply changes until cancelled, reconnecting on failure."""
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+                async with conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    self.connected = True
+                    await self.resync()
+                    while True:
+                        async for notify in conn.notifies(timeout=self.heartbeat):
+                            self.apply(notify.payload)
+                        # A quiet channel or a dead connection? Find out.
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Change feed failed, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                self.connected = False
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "notifications": self.notifications,
+            "resyncs": self.resyncs,
+        }
+
+
+change_feed = ChangeFeed(
+    make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False),
+    CHANGE_FEED_HEARTBEAT,
+)
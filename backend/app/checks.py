@@ -0,0 +1,152 @@
+"""Rate limit decisions for keys named by the caller (POST /v1/check).
+
+Runs the same pipeline as ``RateLimitMiddleware`` (key cache, plan policy,
+penalty box, leases, storage, failure mode) for many (key, cost) pairs at
+once: key and plan lookups are batched into one query each on a cache miss
+and the storage decisions into pipelined round trips of up to
+``PIPELINE_SIZE``. Items for the
+same key are charged in order.
+"""
+import hashlib
+import math
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from app.algorithms import Decision
+from app.circuit_breaker import RedisUnavailable, redis_breaker
+from app.config import PENALTY_BOX_ENABLED
+from app.key_cache import key_cache
+from app.last_used import last_used_writer
+from app.leases import lease_manager
+from app.penalty_box import Block, penalty_box
+from app.rate_limiter import (
+    CHECK_PATH,
+    build_charges,
+    check_penalty_box,
+    fallback_decision,
+    get_plan_policies,
+    load_keys,
+    record_usage,
+)
+from app.storage import storage
+
+
+# Route name of usage events for checked keys
+CHECK_ROUTE = f"POST {CHECK_PATH}"
+
+# Decisions per pipelined round trip. Each one is a single breaker call, so it
+# has to fit in REDIS_BREAKER_SLOW_CALL like any per-request decision.
+PIPELINE_SIZE = 100
+
+
+@dataclass(frozen=True, slots=True)
+class CheckOutcome:
+    status: int  # what /v1 would have answered: 200, 401, 429 or 503
+    limit: int = 0
+    remaining: int = 0
+    reset: int = 0  # unix seconds
+    retry_after: int | None = None
+
+    @property
+    def allowed(self) -> bool:
+        return self.status == 200
+
+
+_INVALID = CheckOutcome(401)
+
+
+def _blocked(block: Block, now: float) -> CheckOutcome:
+    return CheckOutcome(
+        429, block.limit, 0, math.ceil(block.until), max(1, math.ceil(block.until - now))
+    )
+
+
+def _outcome(decision: Decision, now: float) -> CheckOutcome:
+    return CheckOutcome(
+        status=200 if decision.allowed else 429,
+        limit=decision.limit,
+        remaining=decision.remaining,
+        reset=math.ceil(now + decision.reset_after),
+        retry_after=None if decision.allowed else max(1, math.ceil(decision.retry_after)),
+    )
+
+
+async def check_many(items: Sequence[tuple[str, int]]) -> list[CheckOutcome]:
+    """Decide each (plaintext key, cost) pair, in order."""
+    now = time.time()
+    now_ms = int(now * 1000)
+    hashes = [hashlib.sha256(key.encode()).hexdigest() for key, _ in items]
+    keys = await key_cache.get_many(hashes, load_keys)
+    policies = await get_plan_policies(
+        k.plan_id for k in keys.values() if k is not None and k.is_active
+    )
+
+    outcomes: list[CheckOutcome | None] = [None] * len(items)
+    # (index, key, charges) still to be decided by storage
+    leased, pipelined = [], []
+    for i, ((_, cost), key_hash) in enumerate(zip(items, hashes)):
+        api_key = keys[key_hash]
+        if api_key is None or not api_key.is_active:
+            outcomes[i] = _INVALID
+            continue
+        prefix = api_key.redis_prefix
+        policy = policies[api_key.plan_id]
+        if PENALTY_BOX_ENABLED:
+            block = check_penalty_box(policy, prefix, api_key.plan_id, now)
+            if block is not None:
+                record_usage(api_key, CHECK_ROUTE, now, False, cost)
+                outcomes[i] = _blocked(block, now)
+                continue
+        charges = build_charges(policy, prefix, cost)
+        if lease_manager.enabled and lease_manager.covers(charges):
+            leased.append((i, api_key, charges))
+        else:
+            pipelined.append((i, api_key, charges))
+
+    decisions = []
+    for i, api_key, charges in leased:
+        try:
+            decision = await redis_breaker.call(
+                lease_manager.decide, charges, now_ms, f"{api_key.redis_prefix}seen"
+            )
+        except RedisUnavailable:
+            decision = fallback_decision(policies[api_key.plan_id], charges, now)
+        decisions.append((i, api_key, charges, decision))
+    for start in range(0, len(pipelined), PIPELINE_SIZE):
+        chunk = pipelined[start : start + PIPELINE_SIZE]
+        try:
+            results = await redis_breaker.call(
+                storage.decide_many,
+                [(charges, f"{api_key.redis_prefix}seen") for _, api_key, charges in chunk],
+                now_ms,
+            )
+        except RedisUnavailable:
+            results = [
+                fallback_decision(policies[api_key.plan_id], charges, now)
+                for _, api_key, charges in chunk
+            ]
+        decisions.extend(
+            (i, api_key, charges, decision)
+            for (i, api_key, charges), decision in zip(chunk, results)
+        )
+
+    for i, api_key, charges, decision in decisions:
+        if decision is None:
+            retry_after = max(1, math.ceil(redis_breaker.reset_timeout))
+            outcomes[i] = CheckOutcome(503, retry_after=retry_after)
+            continue
+        last_used_writer.record(api_key.key_id, now)
+        record_usage(api_key, CHECK_ROUTE, now, decision.allowed, items[i][1])
+        if not decision.allowed and PENALTY_BOX_ENABLED:
+            # Costs here are per item, so only block when even a cost-1
+            # request would have been rejected.
+            binding = charges[decision.binding]
+            if binding.cost == 1:
+                block = penalty_box.block(
+                    binding.prefix, api_key.plan_id, decision.limit, decision.retry_after, now
+                )
+                outcomes[i] = _blocked(block, now)
+                continue
+        outcomes[i] = _outcome(decision, now)
+    return outcomes
@@ -0,0 +1,135 @@
+"""Per-call timeouts and a circuit breaker around Redis calls on the hot path.
+
+Closed: calls go through, each bounded by ``timeout``. A call that fails,
+times out or takes longer than ``slow_call`` counts as a failure;
+``failure_threshold`` consecutive failures open the breaker.
+
+Open: calls fail immediately with CircuitOpenError (callers fall back to the
+local limiter) for ``reset_timeout`` seconds.
+
+Half-open: one probe call is let through; success closes the breaker, any
+failure opens it again. Other calls keep failing fast while the probe runs.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from redis.exceptions import RedisError
+
+from app.config import (
+    REDIS_BREAKER_FAILURE_THRESHOLD,
+    REDIS_BREAKER_RESET_TIMEOUT,
+    REDIS_BREAKER_SLOW_CALL,
+    REDIS_CALL_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RedisUnavailable(Exception):
+    """Redis failed, timed out, or the breaker is open."""
+
+
+class CircuitOpenError(RedisUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        timeout: float,
+        slow_call: float,
+        failure_threshold: int,
+        reset_timeout: float,
+    ):
+        self.timeout = timeout
+        self.slow_call = slow_call
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0  # consecutive
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0  # calls failed fast while open
+        self._probing = False
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args) -> T:
+        probe = False
+        if self.state != CLOSED:
+            if self._probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError("Redis circuit breaker is open")
+            self.state = HALF_OPEN
+            self._probing = probe = True
+
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(*args), self.timeout)
+        except (asyncio.TimeoutError, RedisError, OSError) as exc:
+            if self._counts(probe):
+                self._on_failure(repr(exc))
+            raise RedisUnavailable(str(exc) or type(exc).__name__) from exc
+        finally:
+            if probe:
+                self._probing = False
+
+        elapsed = time.monotonic() - start
+        if self._counts(probe):
+            if elapsed > self.slow_call:
+                self._on_failure(f"slow call: {elapsed * 1000:.0f} ms")
+            else:
+                self._on_success()
+        return result
+
+    def _counts(self, probe: bool) -> bool:
+        # A call started before the breaker opened may finish while it is
+        # open or probing; only the probe's outcome decides the state then
+        return probe or self.state == CLOSED
+
+    def _on_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info("Redis circuit breaker closed")
+        self.state = CLOSED
+        self.failures = 0
+
+    def _on_failure(self, reason: str) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or (
+            self.state == CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            logger.warning(
+                "Redis circuit breaker opened",
+                extra={"reason": reason, "failures": self.failures},
+            )
+
+    def reset(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+redis_breaker = CircuitBreaker(
+    REDIS_CALL_TIMEOUT,
+    REDIS_BREAKER_SLOW_CALL,
+    REDIS_BREAKER_FAILURE_THRESHOLD,
+    REDIS_BREAKER_RESET_TIMEOUT,
+)
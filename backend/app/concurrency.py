@@ -0,0 +1,102 @@
+"""Per-key caps on requests in flight, as expiring leases in storage.
+
+Each key with a cap has a set of lease ids scored by expiry. A request
+acquires a lease before it reaches the app and releases it when the
+response has finished (or failed, or the client went away). Leases held by
+this instance are renewed every ``ttl / 3`` seconds, so a crashed
+instance's slots come free within ``ttl`` and a long response never loses
+its slot.
+"""
+import asyncio
+import logging
+import time
+import uuid
+
+from app.circuit_breaker import redis_breaker
+from app.config import CONCURRENCY_LEASE_TTL
+from app.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimiter:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.acquired = 0
+        self.rejected = 0
+        # lease id -> slot set key, for every slot this instance holds
+        self._held: dict[str, str] = {}
+        self._releases: set[asyncio.Task] = set()
+
+    async def acquire(self, prefix: str, limit: int, now: float) -> str | None:
+        """A lease id, or None if ``limit`` requests are already in flight.
+
+        Raises RedisUnavailable like any other limiter call.
+        """
+        key = f"{prefix}inflight"
+        lease_id = uuid.uuid4().hex
+        now_ms = int(now * 1000)
+        # Recorded first: if we time out or are cancelled after the script
+        # ran, the slot is still released rather than left to expire.
+        self._held[lease_id] = key
+        try:
+            acquired = await redis_breaker.call(
+                storage.acquire_slot, key, lease_id, limit, now_ms, now_ms + int(self.ttl * 1000)
+            )
+        except BaseException:
+            self.release(lease_id)
+            raise
+        if not acquired:
+            del self._held[lease_id]
+            self.rejected += 1
+            return None
+        self.acquired += 1
+        return lease_id
+
+    def release(self, lease_id: str) -> None:
+        """Free a slot. Returns at once; storage is updated in the background."""
+        key = self._held.pop(lease_id, None)
+        if key is None:
+            return
+        task = asyncio.ensure_future(self._release(key, lease_id))
+        self._releases.add(task)
+        task.add_done_callback(self._releases.discard)
+
+    async def _release(self, key: str, lease_id: str) -> None:
+        # Not through the breaker: nobody waits on this, and failing fast
+        # while it is open would hold the slot until the lease expires.
+        try:
+            await storage.release_slot(key, lease_id)
+        except Exception:
+            # The lease expires on its own within ttl
+            logger.warning("Could not release concurrency slot", extra={"key": key})
+
+    async def drain(self) -> None:
+        """Wait for releases still in flight."""
+        while self._releases:
+            await asyncio.gather(*self._releases, return_exceptions=True)
+
+    async def renew(self) -> None:
+        leases = [(key, lease_id) for lease_id, key in self._held.items()]
+        if leases:
+            now_ms = int(time.time() * 1000)
+            await storage.renew_slots(leases, now_ms, now_ms + int(self.ttl * 1000))
+
+    async def run(self) -> None:
+        """Renew held leases every ``ttl / 3`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self.renew()
+            except Exception:
+                logger.exception("Concurrency lease renewal failed", extra={"held": len(self._held)})
+
+    def stats(self) -> dict:
+        return {
+            "held": len(self._held),
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+        }
+
+
+concurrency_limiter = ConcurrencyLimiter(CONCURRENCY_LEASE_TTL)
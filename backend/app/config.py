@@ -12,3 +12,89 @@ ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "dev-admin-token")
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-jwt-secret-change-me-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_DAYS = int(os.getenv("JWT_EXPIRE_DAYS", "7"))
+
+# bcrypt runs on its own threads; see app/passwords.py. Hashes beyond
+# workers + queue at once are refused with 503.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+# Login attempts per minute, per email and per client IP
+LOGIN_RATE_LIMIT_PER_EMAIL = int(os.getenv("LOGIN_RATE_LIMIT_PER_EMAIL", "10"))
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", "60"))
+
+# Plan and key changes reach every instance's caches within milliseconds
+# through Postgres LISTEN/NOTIFY; see app/change_feed.py. The cache TTLs
+# below are only a backstop, so lower them if the feed is disabled (e.g.
+# behind a transaction-pooling PgBouncer, where LISTEN does not work).
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "true").lower() == "true"
+CHANGE_FEED_HEARTBEAT = float(os.getenv("CHANGE_FEED_HEARTBEAT", "30"))
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", "3600"))
+
+# API key resolution cache (per instance); see app/key_cache.py
+KEY_CACHE_MAX_SIZE = int(os.getenv("KEY_CACHE_MAX_SIZE", "100000"))
+KEY_CACHE_TTL = float(os.getenv("KEY_CACHE_TTL", "3600"))
+KEY_CACHE_NEGATIVE_TTL = float(os.getenv("KEY_CACHE_NEGATIVE_TTL", "10"))
+
+# Verified JWT -> user cache for admin routes (per instance); see
+# app/principal_cache.py. Entries also expire with their token.
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+
+# Seconds between bulk api_keys.last_used_at flushes; see app/last_used.py
+LAST_USED_FLUSH_INTERVAL = float(os.getenv("LAST_USED_FLUSH_INTERVAL", "5"))
+
+# Local 429s for keys already over their limit; see app/penalty_box.py.
+# An escalation factor of 0 disables escalating cooldowns.
+PENALTY_BOX_ENABLED = os.getenv("PENALTY_BOX_ENABLED", "true").lower() == "true"
+PENALTY_BOX_MAX_SIZE = int(os.getenv("PENALTY_BOX_MAX_SIZE", "100000"))
+PENALTY_BOX_ESCALATION_FACTOR = float(os.getenv("PENALTY_BOX_ESCALATION_FACTOR", "0"))
+PENALTY_BOX_MAX_COOLDOWN = float(os.getenv("PENALTY_BOX_MAX_COOLDOWN", "3600"))
+
+# Quota leasing; see app/leases.py. A fraction of 0 disables leasing, plans
+# with limits below QUOTA_LEASE_MIN_LIMIT are always decided per request.
+QUOTA_LEASE_FRACTION = float(os.getenv("QUOTA_LEASE_FRACTION", "0"))
+QUOTA_LEASE_MIN_LIMIT = int(os.getenv("QUOTA_LEASE_MIN_LIMIT", "1000"))
+QUOTA_LEASE_RELEASE_INTERVAL = float(os.getenv("QUOTA_LEASE_RELEASE_INTERVAL", "1"))
+
+# Redis resilience; see app/circuit_breaker.py and app/fallback_limiter.py.
+# Per-call timeout and "slow call" threshold in seconds.
+REDIS_CALL_TIMEOUT = float(os.getenv("REDIS_CALL_TIMEOUT", "0.25"))
+REDIS_BREAKER_SLOW_CALL = float(os.getenv("REDIS_BREAKER_SLOW_CALL", "0.1"))
+REDIS_BREAKER_FAILURE_THRESHOLD = int(os.getenv("REDIS_BREAKER_FAILURE_THRESHOLD", "5"))
+REDIS_BREAKER_RESET_TIMEOUT = float(os.getenv("REDIS_BREAKER_RESET_TIMEOUT", "5"))
+# Plan limits are divided by this while falling back to per-instance limits
+FALLBACK_INSTANCE_COUNT = int(os.getenv("FALLBACK_INSTANCE_COUNT", "1"))
+FALLBACK_MAX_COUNTERS = int(os.getenv("FALLBACK_MAX_COUNTERS", "100000"))
+
+# Seconds a concurrency slot outlives an instance that stops renewing it
+CONCURRENCY_LEASE_TTL = float(os.getenv("CONCURRENCY_LEASE_TTL", "30"))
+
+# Rate limit counter storage: redis, redis_cluster or memory; see app/storage/
+LIMITER_BACKEND = os.getenv("LIMITER_BACKEND", "redis")
+REDIS_CLUSTER_URL = os.getenv("REDIS_CLUSTER_URL", "redis://localhost:7000/0")
+
+# Unix domain socket for sidecar decisions (empty = disabled)
+DECISION_SOCKET_PATH = os.getenv("DECISION_SOCKET_PATH", "")
+DECISION_SOCKET_MODE = int(os.getenv("DECISION_SOCKET_MODE", "660"), 8)
+
+# Usage metering; see app/usage_log.py. Events are buffered per instance,
+# appended to a Redis Stream and batch-loaded into the partitioned usage_log
+# table. A retention of 0 keeps every partition.
+USAGE_LOG_ENABLED = os.getenv("USAGE_LOG_ENABLED", "false").lower() == "true"
+USAGE_STREAM_KEY = os.getenv("USAGE_STREAM_KEY", "usage:events")
+USAGE_STREAM_MAXLEN = int(os.getenv("USAGE_STREAM_MAXLEN", "1000000"))
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "0.2"))
+USAGE_BUFFER_SIZE = int(os.getenv("USAGE_BUFFER_SIZE", "100000"))
+USAGE_BATCH_SIZE = int(os.getenv("USAGE_BATCH_SIZE", "5000"))
+USAGE_LOG_RETENTION_DAYS = int(os.getenv("USAGE_LOG_RETENTION_DAYS", "30"))
+
+# Hourly/daily usage counters for GET /admin/usage; see app/usage_rollups.py.
+# Buckets are folded into Postgres once closed for USAGE_ROLLUP_GRACE seconds.
+USAGE_ROLLUP_FLUSH_INTERVAL = float(os.getenv("USAGE_ROLLUP_FLUSH_INTERVAL", "5"))
+USAGE_ROLLUP_FOLD_INTERVAL = float(os.getenv("USAGE_ROLLUP_FOLD_INTERVAL", "60"))
+USAGE_ROLLUP_GRACE = float(os.getenv("USAGE_ROLLUP_GRACE", "60"))
+
+# Per-user counters for GET /admin/stats; see app/request_stats.py. Cached
+# plan and key counts are recounted in Postgres when older than
+# STATS_TOTALS_TTL seconds.
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "5"))
+STATS_TOTALS_TTL = int(os.getenv("STATS_TOTALS_TTL", "3600"))
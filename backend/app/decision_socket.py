@@ -0,0 +1,190 @@
+"""Binary rate limit decisions over a Unix domain socket, for sidecars.
+
+The same decisions as POST /v1/check without HTTP or JSON. Every frame is a
+big-endian u32 payload length followed by the payload:
+
+    request   u32 id | u32 cost | API key (UTF-8, rest of the payload)
+    response  u32 id | u16 status | u64 limit | u64 remaining | u64 reset | u32 retry_after
+
+The response fields are those of /v1/check, with ``retry_after`` 0 when
+allowed. Clients should pipeline: responses come back in request order, and
+all requests that arrive while a batch is being decided form the next batch
+(one ``check_many`` call). There is no authentication; access is controlled
+by the socket file's permissions. A malformed frame closes the connection.
+"""
+import asyncio
+import logging
+import os
+import struct
+
+from app.checks import CheckOutcome, check_many
+from app.config import DECISION_SOCKET_MODE, DECISION_SOCKET_PATH
+
+logger = logging.getLogger(__name__)
+
+LENGTH = struct.Struct(">I")
+REQUEST_HEADER = struct.Struct(">II")
+RESPONSE = struct.Struct(">IHQQQI")
+RESPONSE_FRAME = LENGTH.pack(RESPONSE.size)
+
+MAX_FRAME = 4096
+MAX_BATCH = 1000
+# Stop reading from a connection with this many decisions queued
+MAX_PENDING = 10_000
+
+
+def encode_request(request_id: int, key: str, cost: int = 1) -> bytes:
+    payload = REQUEST_HEADER.pack(request_id, cost) + key.encode()
+    return LENGTH.pack(len(payload)) + payload
+
+
+def encode_response(request_id: int, outcome: CheckOutcome) -> bytes:
+    return RESPONSE_FRAME + RESPONSE.pack(
+        request_id,
+        outcome.status,
+        outcome.limit,
+        outcome.remaining,
+        outcome.reset,
+        outcome.retry_after or 0,
+    )
+
+
+def decode_response(payload: bytes) -> tuple[int, CheckOutcome]:
+    request_id, status, limit, remaining, reset, retry_after = RESPONSE.unpack(payload)
+    return request_id, CheckOutcome(status, limit, remaining, reset, retry_after or None)
+
+
+class _Connection(asyncio.Protocol):
+    def __init__(self, server: "DecisionServer"):
+        self._server = server
+        self._transport: asyncio.Transport | None = None
+        self._buffer = bytearray()
+        self._pending: list[tuple[int, str, int]] = []  # (id, key, cost)
+        self._ready = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._reading = True
+        self._task: asyncio.Task | None = None
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self._transport = transport
+        self._task = asyncio.create_task(self._serve())
+        self._server._connections.add(self)
+        self._server.connections += 1
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._server._connections.discard(self)
+        self._task.cancel()
+
+    def data_received(self, data: bytes) -> None:
+        buffer = self._buffer
+        buffer += data
+        offset = 0
+        while len(buffer) - offset >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(buffer, offset)
+            if not REQUEST_HEADER.size < length <= MAX_FRAME:
+                return self._malformed(f"frame length {length}")
+            end = offset + LENGTH.size + length
+            if len(buffer) < end:
+                break
+            request_id, cost = REQUEST_HEADER.unpack_from(buffer, offset + LENGTH.size)
+            if cost == 0:
+                return self._malformed("cost 0")
+            key = buffer[offset + LENGTH.size + REQUEST_HEADER.size : end].decode("utf-8", "replace")
+            self._pending.append((request_id, key, cost))
+            offset = end
+        del buffer[:offset]
+
+        if self._pending:
+            self._ready.set()
+            if len(self._pending) >= MAX_PENDING and self._reading:
+                self._reading = False
+                self._transport.pause_reading()
+
+    def pause_writing(self) -> None:
+        self._writable.clear()
+
+    def resume_writing(self) -> None:
+        self._writable.set()
+
+    def _malformed(self, reason: str) -> None:
+        self._server.malformed += 1
+        logger.warning("Closing decision socket connection", extra={"reason": reason})
+        self._transport.abort()
+
+    async def _serve(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._pending:
+                    batch = self._pending[:MAX_BATCH]
+                    del self._pending[:MAX_BATCH]
+                    if not self._reading and len(self._pending) < MAX_PENDING:
+                        self._reading = True
+                        self._transport.resume_reading()
+
+                    outcomes = await check_many([(key, cost) for _, key, cost in batch])
+                    await self._writable.wait()
+                    self._transport.write(
+                        b"".join(
+                            encode_response(request_id, outcome)
+                            for (request_id, _, _), outcome in zip(batch, outcomes)
+                        )
+                    )
+                    self._server.decisions += len(batch)
+                    self._server.batches += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Decision socket batch failed")
+            self._transport.abort()
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class DecisionServer:
+    def __init__(self, path: str, mode: int):
+        self.path = path
+        self.mode = mode
+        self.connections = 0
+        self.decisions = 0
+        self.batches = 0
+        self.malformed = 0
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: set[_Connection] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_unix_server(lambda: _Connection(self), self.path)
+        os.chmod(self.path, self.mode)
+        logger.info("Decision socket listening", extra={"path": self.path})
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for connection in list(self._connections):
+            connection.close()
+        await self._server.wait_closed()
+        self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "open_connections": len(self._connections),
+            "connections": self.connections,
+            "decisions": self.decisions,
+            "batches": self.batches,
+            "malformed": self.malformed,
+        }
+
+
+decision_server = DecisionServer(DECISION_SOCKET_PATH, DECISION_SOCKET_MODE)
@@ -1,12 +1,15 @@
+import math
+import uuid
 from collections.abc import AsyncGenerator
 
 import jwt
-from fastapi import Depends, HTTPException, Security
+from fastapi import HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import ADMIN_API_TOKEN, JWT_ALGORITHM, JWT_SECRET
 from app.database import AsyncSessionLocal
+from app.principal_cache import Principal, principal_cache
 
 bearer_scheme = HTTPBearer()
 
@@ -23,21 +26,27 @@ async def require_admin(
         raise HTTPException(status_code=403, detail="Invalid admin token")
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Security(bearer_scheme),
-    db: AsyncSession = Depends(get_db),
-):
+async def _load_principal(token: str) -> tuple[Principal, float] | None:
     from app.models import User  # avoid circular import at module level
 
     try:
-        payload = jwt.decode(
-            credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM]
-        )
-        user_id: str = payload["sub"]
-    except (jwt.InvalidTokenError, KeyError):
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        user_id = uuid.UUID(payload["sub"])
+    except (jwt.InvalidTokenError, KeyError, ValueError):
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    user = await db.get(User, user_id)
+    async with AsyncSessionLocal() as session:
+        user = await session.get(User, user_id)
     if not user:
+        return None
+    return Principal(id=user.id, email=user.email), payload.get("exp", math.inf)
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Security(bearer_scheme),
+) -> Principal:
+    token = credentials.credentials
+    principal = await principal_cache.get(token, lambda: _load_principal(token))
+    if principal is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
+    return principal
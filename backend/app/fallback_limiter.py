@@ -0,0 +1,77 @@
+"""Per-instance limiter used while Redis is unreachable.
+
+Each instance only sees its own share of the traffic, so every limit is
+divided by the estimated number of instances (FALLBACK_INSTANCE_COUNT) and
+enforced as a fixed window in memory. It is approximate by design: it keeps
+a key from running unbounded during an outage, nothing more.
+"""
+import math
+from collections.abc import Sequence
+
+from app.algorithms import Charge, Decision, window_args
+from app.config import FALLBACK_INSTANCE_COUNT, FALLBACK_MAX_COUNTERS
+
+
+class FallbackLimiter:
+    def __init__(self, instances: int, max_counters: int):
+        self.instances = max(instances, 1)
+        self.max_counters = max_counters
+        self.decisions = 0
+        # window key -> (count, window end ms)
+        self._counters: dict[str, tuple[int, int]] = {}
+
+    def decide(self, charges: Sequence[Charge], now_ms: int) -> Decision:
+        """All-or-nothing like ``algorithms.decide``, every window fixed."""
+        self.decisions += 1
+        if not charges:
+            return Decision(False, 0, 0, 60.0, 60.0)
+
+        checks = []
+        binding = None
+        for i, charge in enumerate(charges):
+            # Sliding/GCRA state lives in Redis; approximate with the window
+            key = window_args(charge.limit, charge.prefix, now_ms)[0][0]
+            limit = math.ceil(charge.limit.limit / self.instances)
+            end = self._window_end(charge, now_ms)
+            count, _ = self._counters.get(key, (0, end))
+            remaining = limit - count - charge.cost
+            checks.append((key, count, end))
+            reset = (end - now_ms) / 1000
+            if remaining < 0:
+                return Decision(False, limit, 0, reset, reset, i)
+            if binding is None or remaining < binding[1]:
+                binding = (i, remaining, limit, reset)
+
+        if len(self._counters) + len(checks) > self.max_counters:
+            self._evict(now_ms)
+        for (key, count, end), charge in zip(checks, charges):
+            self._counters[key] = (count + charge.cost, end)
+        i, remaining, limit, reset = binding
+        return Decision(True, limit, remaining, reset, 0.0, i)
+
+    @staticmethod
+    def _window_end(charge: Charge, now_ms: int) -> int:
+        args = window_args(charge.limit, charge.prefix, now_ms)[1]
+        end = args[4]
+        if not end:  # gcra has no window boundary
+            window = args[2]
+            end = (now_ms // window + 1) * window
+        return end
+
+    def _evict(self, now_ms: int) -> None:
+        self._counters = {k: v for k, v in self._counters.items() if v[1] > now_ms}
+        if len(self._counters) >= self.max_counters:
+            self._counters.clear()
+
+    def clear(self) -> None:
+        self._counters.clear()
+
+    def stats(self) -> dict:
+        return {
+            "instances": self.instances,
+            "counters": len(self._counters),
+            "decisions": self.decisions,
+        }
+
+
+fallback_limiter = FallbackLimiter(FALLBACK_INSTANCE_COUNT, FALLBACK_MAX_COUNTERS)
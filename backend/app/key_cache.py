@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from dataclasses import dataclass
+
+from app.config import (
+    CHANGE_FEED_ENABLED,
+    KEY_CACHE_MAX_SIZE,
+    KEY_CACHE_NEGATIVE_TTL,
+    KEY_CACHE_TTL,
+)
+from app.redis_client import redis_client
+from app.storage import storage
+
+logger = logging.getLogger(__name__)
+
+# With the change feed disabled (see app/change_feed.py), admin writes publish
+# the affected key hash here so every instance drops it. A message may carry
+# several space-separated hashes (bulk operations).
+INVALIDATION_CHANNEL = "quota:keys:invalidate"
+# Hashes per message when invalidating in bulk (about 65 KB)
+_INVALIDATION_BATCH = 1000
+
+
+@dataclass(frozen=True, slots=True)
+class CachedKey:
+    key_id: str
+    plan_id: str
+    is_active: bool
+    redis_prefix: str
+    # Whose GET /admin/stats counts the key's requests
+    user_id: str | None = None
+
+
+class KeyCache:
+    """Bounded LRU + TTL cache of key_hash -> CachedKey.
+
+    Unknown hashes are cached as ``None`` for ``negative_ttl`` seconds so a
+    client retrying a bad key cannot drive Postgres traffic either. Concurrent
+    misses for the same hash share a single loader call.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[CachedKey | None, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        # Bumped on every invalidation; a load that started before an
+        # invalidation must not write its (possibly stale) result back.
+        self._epoch = 0
+
+    async def get(
+        self,
+        key_hash: str,
+        loader: Callable[[str], Awaitable[CachedKey | None]],
+    ) -> CachedKey | None:
+        entry = self._entries.get(key_hash)
+        if entry is not None and entry[1] > time.monotonic():
+            self._entries.move_to_end(key_hash)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        task = self._inflight.get(key_hash)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key_hash, loader))
+            self._inflight[key_hash] = task
+        # shield: a cancelled caller must not cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def get_many(
+        self,
+        key_hashes: Iterable[str],
+        loader: Callable[[list[str]], Awaitable[dict[str, CachedKey]]],
+    ) -> dict[str, CachedKey | None]:
+        """Look up many hashes; all misses are resolved by one ``loader`` call."""
+        now = time.monotonic()
+        found: dict[str, CachedKey | None] = {}
+        missing = []
+        for key_hash in dict.fromkeys(key_hashes):
+            entry = self._entries.get(key_hash)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key_hash)
+                self.hits += 1
+                found[key_hash] = entry[0]
+            else:
+                self.misses += 1
+                missing.append(key_hash)
+        if missing:
+            epoch = self._epoch
+            loaded = await loader(missing)
+            for key_hash in missing:
+                value = found[key_hash] = loaded.get(key_hash)
+                if epoch == self._epoch:
+                    self._store(key_hash, value)
+        return found
+
+    async def _load(self, key_hash: str, loader) -> CachedKey | None:
+        epoch = self._epoch
+        try:
+            value = await loader(key_hash)
+        finally:
+            if self._inflight.get(key_hash) is asyncio.current_task():
+                del self._inflight[key_hash]
+        if epoch == self._epoch:
+            self._store(key_hash, value)
+        return value
+
+    def _store(self, key_hash: str, value: CachedKey | None) -> None:
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self._entries[key_hash] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key_hash)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key_hash: str) -> None:
+        self._epoch += 1
+        self._entries.pop(key_hash, None)
+        self._inflight.pop(key_hash, None)
+
+    def invalidate_many(self, key_hashes: Iterable[str]) -> None:
+        self._epoch += 1
+        for key_hash in key_hashes:
+            self._entries.pop(key_hash, None)
+            self._inflight.pop(key_hash, None)
+
+    async def resync(
+        self,
+        loader: Callable[[list[str]], Awaitable[dict[str, CachedKey]]],
+        chunk: int = 5000,
+    ) -> None:
+        """Reload every cached hash, for when invalidations may have been
+        missed. Unlike ``clear`` this does not send all traffic to Postgres."""
+        key_hashes = list(self._entries)
+        for i in range(0, len(key_hashes), chunk):
+            batch = key_hashes[i : i + chunk]
+            epoch = self._epoch
+            loaded = await loader(batch)
+            if epoch != self._epoch:
+                # Something was invalidated meanwhile; we can't tell if it
+                # was read before or after, so drop the whole batch
+                self.invalidate_many(batch)
+                continue
+            for key_hash in batch:
+                if key_hash in self._entries:
+                    self._store(key_hash, loaded.get(key_hash))
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+        self._inflight.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+key_cache = KeyCache(KEY_CACHE_MAX_SIZE, KEY_CACHE_TTL, KEY_CACHE_NEGATIVE_TTL)
+
+
+async def publish_invalidation(key_hash: str) -> None:
+    """Drop ``key_hash`` locally and tell every other instance to do the same."""
+    key_cache.invalidate(key_hash)
+    if storage.shared and not CHANGE_FEED_ENABLED:
+        await redis_client.publish(INVALIDATION_CHANNEL, key_hash)
+
+
+async def publish_invalidations(key_hashes: Sequence[str]) -> None:
+    """publish_invalidation for many hashes: one local pass, and a pipeline of
+    batched messages rather than a round trip per key."""
+    key_cache.invalidate_many(key_hashes)
+    if storage.shared and not CHANGE_FEED_ENABLED and key_hashes:
+        pipe = redis_client.pipeline(transaction=False)
+        for i in range(0, len(key_hashes), _INVALIDATION_BATCH):
+            pipe.publish(INVALIDATION_CHANNEL, " ".join(key_hashes[i : i + _INVALIDATION_BATCH]))
+        await pipe.execute()
+
+
+async def listen_for_invalidations() -> None:
+    """Apply invalidations published by other instances. Runs until cancelled."""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published while we were not subscribed is lost, so
+            # start from an empty cache after every (re)subscribe.
+            key_cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    key_cache.invalidate_many(message["data"].split())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Key invalidation listener failed, resubscribing")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
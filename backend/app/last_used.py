@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, Uuid, column, update, values
+
+from app.config import LAST_USED_FLUSH_INTERVAL
+from app.database import AsyncSessionLocal
+from app.models import ApiKey
+
+logger = logging.getLogger(__name__)
+
+# Rows per UPDATE ... FROM (VALUES ...) statement; two bind params per row
+# keeps each statement well under the driver's 65535 parameter limit.
+FLUSH_CHUNK_SIZE = 5000
+
+
+class LastUsedWriter:
+    """Coalesces api_keys.last_used_at writes in memory and flushes them in bulk.
+
+    ``record`` is a dict assignment, so the request path never touches
+    Postgres; the latest timestamp per key wins until the next flush.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending: dict[str, float] = {}
+
+    def record(self, key_id: str, ts: float) -> None:
+        self._pending[key_id] = ts
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        rows = [
+            (uuid.UUID(key_id), datetime.fromtimestamp(ts, timezone.utc))
+            for key_id, ts in batch.items()
+        ]
+        try:
+            async with AsyncSessionLocal() as session:
+                for i in range(0, len(rows), FLUSH_CHUNK_SIZE):
+                    v = values(
+                        column("id", Uuid),
+                        column("ts", DateTime(timezone=True)),
+                        name="v",
+                    ).data(rows[i:i + FLUSH_CHUNK_SIZE])
+                    await session.execute(
+                        update(ApiKey)
+                        .where(ApiKey.id == v.c.id)
+                        .where(
+                            ApiKey.last_used_at.is_(None)
+                            | (ApiKey.last_used_at < v.c.ts)
+                        )
+                        .values(last_used_at=v.c.ts)
+                        .execution_options(synchronize_session=False)
+                    )
+                await session.commit()
+        except Exception:
+            # Put the batch back so the next flush retries it, without
+            # clobbering anything newer recorded in the meantime.
+            for key_id, ts in batch.items():
+                if ts > self._pending.get(key_id, 0):
+                    self._pending[key_id] = ts
+            raise
+        return len(rows)
+
+    async def run(self) -> None:
+        """Flush every ``interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception(
+                    "last_used_at flush failed", extra={"pending": self.pending}
+                )
+
+
+last_used_writer = LastUsedWriter(LAST_USED_FLUSH_INTERVAL)
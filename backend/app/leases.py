@@ -0,0 +1,240 @@
+"""Quota leasing: decide most requests in memory from slices reserved in Redis.
+
+Instead of one EVALSHA per request, an instance reserves a slice of a
+window's budget (``fraction x limit``) by adding it to the same Redis window
+counter the per-request script uses, then counts requests down against that
+slice locally. Redis traffic is roughly ``instances x limit / slice`` calls
+per window however many requests arrive. Idle slices are handed back
+(DECRBY) so other instances can use them; a slice left over when its window
+ends simply expires with the counter.
+
+Only fixed windows can be leased (fixed-window plans, plus day and month
+limits); sliding window and GCRA limits always use the per-request script.
+
+Accuracy:
+
+- A slice is only granted out of what is left of the window
+  (``min(slice, limit - count)``, atomically), so the counter never exceeds
+  the limit and, with synchronised clocks, admissions in a window never
+  exceed the limit: **no overshoot**.
+- Clock skew affects leasing exactly as it affects the per-request script:
+  an instance whose clock lags keeps charging the previous window's counter.
+  Every window counter still stays within its limit, but a real-time window
+  can see the lagging instances' use of the previous window's leftover on
+  top of its own limit. Leasing adds no overshoot of its own.
+- The cost is under-admission: quota reserved by one instance can't be used
+  by another, so a key can be rejected while up to
+  ``(instances - 1) x slice`` of its budget sits unused elsewhere, until the
+  holders release it (after ``release_interval`` seconds idle) or the window
+  ends.
+"""
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from app.algorithms import FIXED_WINDOW, PERIODS, Charge, Decision, window_args
+from app.config import QUOTA_LEASE_FRACTION, QUOTA_LEASE_MIN_LIMIT, QUOTA_LEASE_RELEASE_INTERVAL
+from app.storage import LeaseRequest, storage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Lease:
+    limit: int
+    window_end: int  # ms
+    balance: int  # reserved and not yet spent by this instance
+    count: int  # window counter after our last grant, our balance included
+    used_at: float  # monotonic
+
+
+class LeaseManager:
+    def __init__(self, fraction: float, min_limit: int, release_interval: float):
+        self.fraction = fraction
+        self.min_limit = min_limit
+        self.release_interval = release_interval
+        self.local_decisions = 0
+        self.storage_calls = 0
+        self._leases: dict[str, Lease] = {}
+        # One reservation in flight per window counter. A reservation holds
+        # the lock of every counter it leases, the key's own and any shared
+        # pool's, taken in sorted order so two reservations can't deadlock.
+        self._locks: dict[str, asyncio.Lock] = {}
+        # Reservations holding or waiting for each lock; ``release`` leaves
+        # those counters (and their locks) alone
+        self._reserving: dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.fraction > 0
+
+    def covers(self, charges: Sequence[Charge]) -> bool:
+        """Whether every charge is a fixed window big enough to lease."""
+        for charge in charges:
+            limit = charge.limit
+            if limit.limit < self.min_limit:
+                return False
+            if PERIODS[limit.period][1] is not None and limit.algorithm != FIXED_WINDOW:
+                return False
+        return bool(charges)
+
+    def _slice(self, limit: int) -> int:
+        return max(1, math.ceil(limit * self.fraction))
+
+    async def decide(
+        self,
+        charges: Sequence[Charge],
+        now_ms: int,
+        seen_key: str,
+    ) -> Decision:
+        """Same contract as ``algorithms.decide``, spending local leases first."""
+        keys = [window_args(c.limit, c.prefix, now_ms)[0][0] for c in charges]
+        decision = self._spend(charges, keys, now_ms)
+        if decision is not None:
+            return decision
+
+        locked = sorted(set(keys))
+        for key in locked:
+            self._reserving[key] = self._reserving.get(key, 0) + 1
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                for key in locked:
+                    await stack.enter_async_context(self._locks.setdefault(key, asyncio.Lock()))
+                # Another request may have topped the leases up while we waited
+                decision = self._spend(charges, keys, now_ms)
+                if decision is not None:
+                    return decision
+                return await self._reserve(charges, keys, now_ms, seen_key)
+        finally:
+            for key in locked:
+                self._reserving[key] -= 1
+                if not self._reserving[key]:
+                    del self._reserving[key]
+
+    def _spend(
+        self,
+        charges: Sequence[Charge],
+        keys: list[str],
+        now_ms: int,
+    ) -> Decision | None:
+        leases = []
+        for charge, key in zip(charges, keys):
+            lease = self._leases.get(key)
+            if lease is None or lease.balance < charge.cost or lease.window_end <= now_ms:
+                return None
+            leases.append(lease)
+
+        now = time.monotonic()
+        for charge, lease in zip(charges, leases):
+            lease.balance -= charge.cost
+            lease.used_at = now
+        self.local_decisions += 1
+        return self._allowed(charges, leases, now_ms)
+
+    async def _reserve(
+        self,
+        charges: Sequence[Charge],
+        keys: list[str],
+        now_ms: int,
+        seen_key: str,
+    ) -> Decision:
+        requests = []
+        for charge, key in zip(charges, keys):
+            lease = self._leases.get(key)
+            balance = lease.balance if lease and lease.window_end > now_ms else 0
+            need = max(charge.cost - balance, 0)
+            requests.append(
+                LeaseRequest(
+                    key=key,
+                    limit=charge.limit.limit,
+                    window_end=window_args(charge.limit, charge.prefix, now_ms)[1][4],
+                    want=max(need, self._slice(charge.limit.limit)),
+                    need=need,
+                )
+            )
+
+        self.storage_calls += 1
+        result = await storage.lease(requests, now_ms, seen_key)
+        if not result.allowed:
+            reset_after = (requests[result.failed].window_end - now_ms) / 1000
+            limit = charges[result.failed].limit.limit
+            return Decision(False, limit, 0, reset_after, reset_after, result.failed)
+
+        now = time.monotonic()
+        leases = []
+        for charge, key, request, (granted, count) in zip(charges, keys, requests, result.grants):
+            lease = self._leases.get(key)
+            if lease is None or lease.window_end <= now_ms:
+                lease = self._leases[key] = Lease(
+                    charge.limit.limit, request.window_end, 0, count, now
+                )
+            lease.balance += granted - charge.cost
+            lease.count = count
+            lease.used_at = now
+            leases.append(lease)
+        return self._allowed(charges, leases, now_ms)
+
+    @staticmethod
+    def _allowed(charges: Sequence[Charge], leases: list[Lease], now_ms: int) -> Decision:
+        # Remaining as seen from here: what storage had left at our last grant
+        # plus what we still hold locally.
+        binding = min(
+            range(len(leases)),
+            key=lambda i: leases[i].limit - leases[i].count + leases[i].balance,
+        )
+        lease = leases[binding]
+        return Decision(
+            allowed=True,
+            limit=charges[binding].limit.limit,
+            remaining=max(lease.limit - lease.count + lease.balance, 0),
+            reset_after=(lease.window_end - now_ms) / 1000,
+            retry_after=0.0,
+            binding=binding,
+        )
+
+    async def release(self, idle_for: float = 0.0) -> int:
+        """Hand back leases unused for ``idle_for`` seconds; returns the quota released."""
+        now = time.monotonic()
+        now_ms = int(time.time() * 1000)
+        keys, amounts = [], []
+        for key, lease in list(self._leases.items()):
+            if key in self._reserving:
+                # A reservation in flight may have counted on this balance
+                continue
+            if lease.window_end <= now_ms:
+                del self._leases[key]
+                self._locks.pop(key, None)
+            elif now - lease.used_at >= idle_for:
+                del self._leases[key]
+                self._locks.pop(key, None)
+                if lease.balance:
+                    keys.append(key)
+                    amounts.append(lease.balance)
+
+        await storage.release(keys, amounts)
+        return sum(amounts)
+
+    async def run(self) -> None:
+        """Release idle leases every ``release_interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.release_interval)
+            try:
+                await self.release(self.release_interval)
+            except Exception:
+                logger.exception("quota lease release failed", extra={"leases": len(self._leases)})
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "leases": len(self._leases),
+            "held": sum(lease.balance for lease in self._leases.values()),
+            "local_decisions": self.local_decisions,
+            "storage_calls": self.storage_calls,
+        }
+
+
+lease_manager = LeaseManager(QUOTA_LEASE_FRACTION, QUOTA_LEASE_MIN_LIMIT, QUOTA_LEASE_RELEASE_INTERVAL)
@@ -1,21 +1,84 @@
+import asyncio
+import logging
 import os
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.change_feed import change_feed
+from app.circuit_breaker import redis_breaker
+from app.concurrency import concurrency_limiter
+from app.config import CHANGE_FEED_ENABLED
+from app.decision_socket import decision_server
+from app.fallback_limiter import fallback_limiter
+from app.key_cache import key_cache, listen_for_invalidations
+from app.last_used import last_used_writer
+from app.leases import lease_manager
 from app.logging_config import setup_logging
+from app.passwords import password_hasher
+from app.penalty_box import penalty_box
+from app.principal_cache import listen_for_user_invalidations, principal_cache
 from app.rate_limiter import RateLimitMiddleware
 from app.redis_client import redis_client
-from app.routers import admin, public
+from app.request_stats import request_stats
+from app.routers import admin, check, public, transfer, users
 from app.routers.auth import router as auth_router
+from app.storage import storage
+from app.usage_log import usage_ingester, usage_recorder
+from app.usage_rollups import usage_rollups
 
 setup_logging()
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    try:
+        await storage.load_scripts()
+    except Exception:
+        # Scripts also load on first use; don't refuse to start without Redis
+        logger.exception("Could not preload rate limit scripts")
+    background = [
+        asyncio.create_task(last_used_writer.run()),
+        asyncio.create_task(lease_manager.run()),
+        asyncio.create_task(concurrency_limiter.run()),
+        asyncio.create_task(usage_rollups.run()),
+        asyncio.create_task(request_stats.run()),
+    ]
+    if usage_recorder.enabled:
+        background.append(asyncio.create_task(usage_recorder.run()))
+        background.append(asyncio.create_task(usage_ingester.run()))
+    if CHANGE_FEED_ENABLED:
+        # Plan and key changes, from any instance or writer, via Postgres
+        background.append(asyncio.create_task(change_feed.run()))
+    if storage.shared:
+        # Other instances' user removals (and, without the change feed, key
+        # writes) arrive over Redis pub/sub
+        if not CHANGE_FEED_ENABLED:
+            background.append(asyncio.create_task(listen_for_invalidations()))
+        background.append(asyncio.create_task(listen_for_user_invalidations()))
+    if decision_server.enabled:
+        await decision_server.start()
     yield
+    await decision_server.close()
+    for task in background:
+        task.cancel()
+    for task in background:
+        with suppress(asyncio.CancelledError):
+            await task
+    # Drain last_used_at updates buffered since the last periodic flush
+    await last_used_writer.flush()
+    await usage_rollups.flush()
+    await request_stats.flush()
+    if usage_recorder.enabled:
+        # Usage events buffered since the last periodic flush
+        await usage_recorder.flush()
+    # Hand unused quota back to the other instances
+    await lease_manager.release()
+    await concurrency_limiter.drain()
+    password_hasher.shutdown()
+    await storage.aclose()
     await redis_client.aclose()
 
 
@@ -29,15 +92,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.add_middleware(RateLimitMiddleware)
 
 app.include_router(auth_router)
 app.include_router(public.router)
+app.include_router(check.router)
 app.include_router(admin.router)
+app.include_router(users.router)
+app.include_router(transfer.router)
 
 
 @app.get("/health")
 def health():
     return {"ok": True}
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "key_cache": key_cache.stats(),
+        "change_feed": change_feed.stats(),
+        "principal_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "penalty_box": penalty_box.stats(),
+        "leases": lease_manager.stats(),
+        "concurrency": concurrency_limiter.stats(),
+        "redis_breaker": redis_breaker.stats(),
+        "fallback_limiter": fallback_limiter.stats(),
+        "decision_socket": decision_server.stats(),
+        "request_stats": request_stats.stats(),
+        "usage_rollups": usage_rollups.stats(),
+        "usage_log": {"recorder": usage_recorder.stats(), "ingester": usage_ingester.stats()},
+    }
@@ -1,7 +1,19 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -15,6 +27,10 @@ class User(Base):
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Quota pools shared by all of the user's keys: [{"period": "minute", "limit": 1000}, ...]
+    limits: Mapped[list] = mapped_column(
+        JSONB, default=list, server_default=text("'[]'::jsonb"), nullable=False
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -24,11 +40,37 @@ class User(Base):
 
 class Plan(Base):
     __tablename__ = "plans"
-    __table_args__ = (UniqueConstraint("name", "user_id", name="uq_plans_name_user"),)
+    __table_args__ = (
+        UniqueConstraint("name", "user_id", name="uq_plans_name_user"),
+        Index("ix_plans_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     default_rpm: Mapped[int] = mapped_column(Integer, nullable=False)
+    algorithm: Mapped[str] = mapped_column(
+        String(32), default="fixed_window", server_default="fixed_window", nullable=False
+    )
+    burst: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Extra windows enforced alongside default_rpm: [{"period": "day", "limit": 10000}, ...]
+    limits: Mapped[list] = mapped_column(
+        JSONB, default=list, server_default=text("'[]'::jsonb"), nullable=False
+    )
+    # Per-route cost and limits: [{"method": "POST", "path": "/v1/export", "cost": 50, "limits": [...]}]
+    routes: Mapped[list] = mapped_column(
+        JSONB, default=list, server_default=text("'[]'::jsonb"), nullable=False
+    )
+    # Quota pools shared by all keys on the plan, on top of each key's own limits
+    pool_limits: Mapped[list] = mapped_column(
+        JSONB, default=list, server_default=text("'[]'::jsonb"), nullable=False
+    )
+    # Requests per key allowed in flight at once (None = no cap)
+    max_concurrent: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # What to do while Redis is unreachable: "local" (per-instance fallback
+    # limiter), "open" (allow everything) or "closed" (reject with 503)
+    failure_mode: Mapped[str] = mapped_column(
+        String(16), default="local", server_default="local", nullable=False
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -41,6 +83,7 @@ class Plan(Base):
 
 class ApiKey(Base):
     __tablename__ = "api_keys"
+    __table_args__ = (Index("ix_api_keys_user_id_created_at_id", "user_id", "created_at", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     key_hash: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
@@ -60,3 +103,38 @@ class ApiKey(Base):
     user_id: Mapped[uuid.UUID | None] = mapped_column(
         ForeignKey("users.id"), nullable=True
     )
+
+
+class UsageLog(Base):
+    """One rate limit decision; written in batches by app/usage_log.py.
+
+    Range-partitioned by day on ``ts``; ``event_id`` is the Redis Stream
+    entry id plus the event's position in it, which makes redelivered
+    events idempotent.
+    """
+
+    __tablename__ = "usage_log"
+    __table_args__ = (
+        Index("ix_usage_log_key_id_ts", "key_id", "ts"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    event_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    key_id: Mapped[uuid.UUID] = mapped_column(nullable=False)
+    route: Mapped[str] = mapped_column(Text, nullable=False)
+    allowed: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    cost: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class UsageRollup(Base):
+    """Requests per key, route and hour or day; see app/usage_rollups.py."""
+
+    __tablename__ = "usage_rollups"
+
+    key_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    period: Mapped[str] = mapped_column(String(8), primary_key=True)  # "hour" or "day"
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    route: Mapped[str] = mapped_column(Text, primary_key=True)
+    allowed: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    rejected: Mapped[int] = mapped_column(BigInteger, nullable=False)
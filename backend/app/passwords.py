@@ -0,0 +1,67 @@
+"""bcrypt off the event loop, with bounded concurrency.
+
+A bcrypt hash or check takes a few hundred milliseconds of CPU. Run inline
+in an async handler it stalls every other request on the worker, /v1
+included. Here it runs on a small dedicated thread pool (bcrypt releases the
+GIL), and at most ``workers + max_queue`` calls may be running or waiting at
+once; beyond that ``PasswordHasherBusy`` is raised, so a login storm gets
+fast 503s rather than an ever longer queue.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from app.config import PASSWORD_HASH_QUEUE, PASSWORD_HASH_WORKERS
+
+
+class PasswordHasherBusy(Exception):
+    """Every worker is busy and the queue is full."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.completed = 0
+        self.rejected = 0
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(fn, *args)
+        self._pending += 1
+
+        def done(_) -> None:
+            # Counted until the thread is done with it, even if the caller
+            # was cancelled meanwhile
+            self._pending -= 1
+            self.completed += 1
+
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(done, f))
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(bcrypt.hashpw, password.encode(), bcrypt.gensalt())
+        return hashed.decode()
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(bcrypt.checkpw, password.encode(), hashed.encode())
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
@@ -0,0 +1,98 @@
+"""In-process penalty box for keys that are already over their limit.
+
+Once Redis rejects a key, every instance that saw the rejection remembers
+"blocked until retry_after" locally and answers further requests for that
+key with 429 straight from memory: no Postgres, no Redis, until the window
+that rejected it rolls over. Blocks are per instance and only ever as long
+as Redis itself said to wait, so they never reject a request Redis would
+have allowed -- unless escalation is on.
+
+With ``escalation_factor`` set, a key that keeps hammering while blocked
+(at least ``escalation_factor x limit`` locally rejected requests during one
+block) gets twice the cooldown on its next block, doubling each time up to
+``max_cooldown``. A block that passes quietly resets the escalation.
+"""
+from dataclasses import dataclass
+
+from app.config import (
+    PENALTY_BOX_ESCALATION_FACTOR,
+    PENALTY_BOX_MAX_COOLDOWN,
+    PENALTY_BOX_MAX_SIZE,
+)
+
+
+@dataclass(slots=True)
+class Block:
+    plan_id: str
+    limit: int
+    until: float  # unix time
+    hits: int = 0  # requests rejected locally during this block
+    strikes: int = 0  # consecutive escalated blocks
+
+
+class PenaltyBox:
+    def __init__(self, maxsize: int, escalation_factor: float, max_cooldown: float):
+        self.maxsize = maxsize
+        self.escalation_factor = escalation_factor
+        self.max_cooldown = max_cooldown
+        self.local_rejections = 0
+        self.blocks = 0
+        self.escalations = 0
+        self._entries: dict[str, Block] = {}
+
+    def check(self, scope: str, plan_id: str, now: float) -> Block | None:
+        """The active block for ``scope``, counting the request as rejected."""
+        block = self._entries.get(scope)
+        if block is None or block.until <= now or block.plan_id != plan_id:
+            # Expired entries stay around so the next block can see their hits.
+            return None
+        block.hits += 1
+        self.local_rejections += 1
+        return block
+
+    def block(self, scope: str, plan_id: str, limit: int, retry_after: float, now: float) -> Block:
+        """Record a Redis rejection for ``scope``; returns the block applied."""
+        cooldown = retry_after
+        strikes = 0
+        previous = self._entries.pop(scope, None)
+        if (
+            self.escalation_factor
+            and previous is not None
+            and previous.plan_id == plan_id
+            and previous.hits >= self.escalation_factor * max(limit, 1)
+        ):
+            strikes = previous.strikes + 1
+            cooldown = max(retry_after, min(retry_after * 2**strikes, self.max_cooldown))
+            self.escalations += 1
+
+        if len(self._entries) >= self.maxsize:
+            self._evict(now)
+        block = Block(plan_id=plan_id, limit=limit, until=now + cooldown, strikes=strikes)
+        self._entries[scope] = block
+        self.blocks += 1
+        return block
+
+    def _evict(self, now: float) -> None:
+        expired = [scope for scope, block in self._entries.items() if block.until <= now]
+        for scope in expired:
+            del self._entries[scope]
+        # Still full: drop the oldest blocks (dicts keep insertion order).
+        while len(self._entries) >= self.maxsize:
+            del self._entries[next(iter(self._entries))]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "blocks": self.blocks,
+            "escalations": self.escalations,
+            "local_rejections": self.local_rejections,
+        }
+
+
+penalty_box = PenaltyBox(
+    PENALTY_BOX_MAX_SIZE, PENALTY_BOX_ESCALATION_FACTOR, PENALTY_BOX_MAX_COOLDOWN
+)
@@ -0,0 +1,132 @@
+"""Verified JWT -> principal cache for admin routes.
+
+A token is verified and its user loaded from Postgres once; later requests
+with the same token are answered from memory. An entry lives for ``ttl``
+seconds but never past the token's ``exp``, so an expired token is
+re-verified (and rejected) as before. Removing a user drops all of their
+entries on every instance via Redis pub/sub.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from app.config import PRINCIPAL_CACHE_MAX_SIZE, PRINCIPAL_CACHE_TTL
+from app.redis_client import redis_client
+from app.storage import storage
+
+logger = logging.getLogger(__name__)
+
+# Operator user removals publish the user id here so every instance drops it.
+INVALIDATION_CHANNEL = "quota:users:invalidate"
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    id: uuid.UUID
+    email: str
+
+
+class PrincipalCache:
+    """Bounded LRU of token -> (principal, expiry), indexed by user."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[Principal, float]] = OrderedDict()
+        self._tokens: dict[uuid.UUID, set[str]] = {}
+        # As in KeyCache: a load that started before an invalidation must not
+        # write its (possibly removed) user back.
+        self._epoch = 0
+
+    async def get(
+        self,
+        token: str,
+        loader: Callable[[], Awaitable[tuple[Principal, float] | None]],
+    ) -> Principal | None:
+        """The principal for ``token``. On a miss ``loader`` verifies the
+        token and returns its principal and expiry (unix seconds)."""
+        entry = self._entries.get(token)
+        if entry is not None and entry[1] > time.time():
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        epoch = self._epoch
+        loaded = await loader()
+        if loaded is None:
+            return None
+        principal, expires_at = loaded
+        if epoch == self._epoch:
+            self._store(token, principal, min(expires_at, time.time() + self.ttl))
+        return principal
+
+    def _store(self, token: str, principal: Principal, expires_at: float) -> None:
+        self._entries[token] = (principal, expires_at)
+        self._entries.move_to_end(token)
+        self._tokens.setdefault(principal.id, set()).add(token)
+        while len(self._entries) > self.maxsize:
+            self._forget(*self._entries.popitem(last=False))
+
+    def _forget(self, token: str, entry: tuple[Principal, float]) -> None:
+        tokens = self._tokens.get(entry[0].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[entry[0].id]
+
+    def invalidate_user(self, user_id: uuid.UUID) -> None:
+        self._epoch += 1
+        for token in self._tokens.pop(user_id, ()):
+            self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+        self._tokens.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_MAX_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+async def publish_user_invalidation(user_id: uuid.UUID) -> None:
+    """Drop ``user_id`` locally and tell every other instance to do the same."""
+    principal_cache.invalidate_user(user_id)
+    if storage.shared:
+        await redis_client.publish(INVALIDATION_CHANNEL, str(user_id))
+
+
+async def listen_for_user_invalidations() -> None:
+    """Apply user removals published by other instances. Runs until cancelled."""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Removals published while we were not subscribed are lost
+            principal_cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    principal_cache.invalidate_user(uuid.UUID(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("User invalidation listener failed, resubscribing")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
@@ -1,141 +1,504 @@
-import asyncio
 import hashlib
+import json
 import logging
+import math
 import time
-from datetime import datetime, timezone
+import uuid
+from collections.abc import Iterable
+from dataclasses import dataclass
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import JSONResponse
+from sqlalchemy import select
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.algorithms import Charge, Decision, Limit
+from app.circuit_breaker import RedisUnavailable, redis_breaker
+from app.concurrency import concurrency_limiter
+from app.config import PENALTY_BOX_ENABLED, PLAN_CACHE_TTL
 from app.database import AsyncSessionLocal
-from app.models import ApiKey, Plan
-from app.redis_client import redis_client
+from app.fallback_limiter import fallback_limiter
+from app.key_cache import CachedKey, key_cache
+from app.last_used import last_used_writer
+from app.leases import lease_manager
+from app.models import ApiKey, Plan, User
+from app.penalty_box import Block, penalty_box
+from app.request_stats import request_stats
+from app.route_table import RouteTable
+from app.storage import storage
+from app.usage_log import usage_recorder
+from app.usage_rollups import usage_rollups
 
 logger = logging.getLogger(__name__)
 
-# In-memory plan cache: {plan_id: (rpm, cached_at)}
-_plan_cache: dict[str, tuple[int, float]] = {}
-PLAN_CACHE_TTL = 60  # seconds
 
-# Lua script for atomic increment + expire
-RATE_LIMIT_SCRIPT = """
-local count = redis.call('INCR', KEYS[1])
-if count == 1 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end
-return count
-"""
+@dataclass(frozen=True, slots=True)
+class RoutePolicy:
+    cost: int
+    limits: tuple[Limit, ...]
+    # Counter namespace for the route's own limits, under the key's prefix
+    scope: str
+    # "METHOD /path/pattern", for usage events
+    name: str
 
 
-ADMIN_RATE_LIMIT_RPM = 60
+@dataclass(frozen=True, slots=True)
+class PoolPolicy:
+    """Limits shared by several keys (all keys of a plan, or of a user)."""
 
+    prefix: str
+    limits: tuple[Limit, ...]
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.url.path.startswith("/admin"):
-            return await self._admin_rate_limit(request, call_next)
 
-        if not request.url.path.startswith("/v1"):
-            return await call_next(request)
+@dataclass(frozen=True, slots=True)
+class PlanPolicy:
+    limits: tuple[Limit, ...]
+    routes: RouteTable[RoutePolicy]
+    failure_mode: str = "local"
+    pools: tuple[PoolPolicy, ...] = ()
+    max_concurrent: int | None = None
 
-        api_key_header = request.headers.get("X-API-Key")
-        if not api_key_header:
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Missing X-API-Key header"},
-            )
 
-        key_hash = hashlib.sha256(api_key_header.encode()).hexdigest()
+# In-memory plan cache: {plan_id: (policy, cached_at)}. Entries are dropped
+# by app/change_feed.py when a plan or its owner's limits change.
+_plan_cache: dict[str, tuple[PlanPolicy, float]] = {}
+# As in KeyCache: a load that started before an invalidation must not store
+# what it read.
+_plan_epoch = 0
 
-        async with AsyncSessionLocal() as session:
-            from sqlalchemy import select
+ADMIN_RATE_LIMIT_RPM = 60
 
-            result = await session.execute(
-                select(ApiKey).where(
-                    ApiKey.key_hash == key_hash, ApiKey.is_active.is_(True)
-                )
+CHECK_PATH = "/v1/check"
+
+# Usage for paths that match neither a plan route nor an app route, so a
+# client requesting random paths cannot grow the rollups without bound
+UNMATCHED_ROUTE = "other"
+
+
+def record_usage(api_key: CachedKey, route: str, now: float, allowed: bool, cost: int) -> None:
+    """Count one decision for GET /admin/stats, GET /admin/usage and the usage log."""
+    if api_key.user_id is not None:
+        request_stats.record(api_key.user_id, now)
+    usage_rollups.record(api_key.key_id, route, now, allowed)
+    usage_recorder.record(api_key.key_id, route, now, allowed, cost)
+
+
+def compile_plan_policy(plan: Plan, user_limits: list | None = None) -> PlanPolicy:
+    """Turn a Plan row (and its owner's pool limits) into the immutable limits
+    and route table the hot path uses."""
+    limits = (
+        Limit("minute", plan.default_rpm, plan.algorithm, plan.burst),
+        *(Limit(lim["period"], lim["limit"], plan.algorithm) for lim in plan.limits),
+    )
+    routes = RouteTable()
+    for route in plan.routes:
+        route_id = hashlib.sha1(f"{route['method']} {route['path']}".encode()).hexdigest()[:8]
+        routes.add(
+            route["method"],
+            route["path"],
+            RoutePolicy(
+                cost=route["cost"],
+                limits=tuple(
+                    Limit(lim["period"], lim["limit"], plan.algorithm)
+                    for lim in route["limits"]
+                ),
+                scope=f"r:{route_id}:",
+                name=f"{route['method']} {route['path']}",
+            ),
+        )
+    tenant = _tenant(plan.user_id, plan.id)
+    pools = []
+    if plan.pool_limits:
+        pools.append((storage.pool_prefix(f"p:{plan.id}", tenant), plan.pool_limits))
+    if user_limits and plan.user_id is not None:
+        pools.append((storage.pool_prefix(f"u:{plan.user_id}", tenant), user_limits))
+    return PlanPolicy(
+        limits=limits,
+        routes=routes,
+        failure_mode=plan.failure_mode,
+        max_concurrent=plan.max_concurrent,
+        pools=tuple(
+            PoolPolicy(
+                prefix,
+                tuple(Limit(lim["period"], lim["limit"], plan.algorithm) for lim in pool_limits),
             )
-            api_key = result.scalar_one_or_none()
-
-            if not api_key:
-                return JSONResponse(
-                    status_code=401,
-                    content={"detail": "Invalid or inactive API key"},
-                )
+            for prefix, pool_limits in pools
+        ),
+    )
+
+
+def _tenant(user_id, plan_id) -> str:
+    # Keys and pools that can be charged together share a tenant
+    return str(user_id or plan_id)
+
+
+def build_charges(
+    policy: PlanPolicy,
+    prefix: str,
+    cost: int = 1,
+    route: RoutePolicy | None = None,
+) -> list[Charge]:
+    """Everything one request charges, in one atomic decision: the key's own
+    limits and the plan and user pools at ``cost``, then the route's limits."""
+    charges = [Charge(limit, prefix, cost) for limit in policy.limits]
+    for pool in policy.pools:
+        charges.extend(Charge(limit, pool.prefix, cost) for limit in pool.limits)
+    if route is not None:
+        charges.extend(Charge(limit, prefix + route.scope) for limit in route.limits)
+    return charges
+
+
+def check_penalty_box(
+    policy: PlanPolicy,
+    prefix: str,
+    plan_id: str,
+    now: float,
+    route: RoutePolicy | None = None,
+) -> Block | None:
+    """A local block on the key, one of its pools, or the route, if any."""
+    block = penalty_box.check(prefix, plan_id, now)
+    if block is None:
+        for pool in policy.pools:
+            block = penalty_box.check(pool.prefix, plan_id, now)
+            if block is not None:
+                break
+    if block is None and route is not None:
+        block = penalty_box.check(prefix + route.scope, plan_id, now)
+    return block
+
+
+_KEY_QUERY = select(
+    ApiKey.key_hash,
+    ApiKey.id,
+    ApiKey.plan_id,
+    ApiKey.is_active,
+    ApiKey.user_id,
+    Plan.user_id.label("owner_id"),
+).join(Plan, Plan.id == ApiKey.plan_id)
+
+
+async def _load_key(key_hash: str) -> CachedKey | None:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            _KEY_QUERY.where(ApiKey.key_hash == key_hash)
+        )
+        row = result.first()
+    return _cached_key(row) if row is not None else None
+
+
+async def load_keys(key_hashes: list[str]) -> dict[str, CachedKey]:
+    """Batch loader for ``key_cache.get_many``: one query for every hash."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            _KEY_QUERY.where(ApiKey.key_hash.in_(key_hashes))
+        )
+        return {row.key_hash: _cached_key(row) for row in result}
+
+
+def _cached_key(row) -> CachedKey:
+    key_id = str(row.id)
+    return CachedKey(
+        key_id=key_id,
+        plan_id=str(row.plan_id),
+        is_active=row.is_active,
+        redis_prefix=storage.key_prefix(key_id, _tenant(row.owner_id, row.plan_id)),
+        user_id=str(row.user_id) if row.user_id is not None else None,
+    )
+
+
+async def _load_plan_policies(plan_ids: list[str]) -> dict[str, PlanPolicy]:
+    """Compile each plan that exists, with one query, and cache the result."""
+    epoch = _plan_epoch
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Plan, User.limits)
+            .outerjoin(User, User.id == Plan.user_id)
+            .where(Plan.id.in_([uuid.UUID(p) for p in plan_ids]))
+        )
+        policies = {
+            str(plan.id): compile_plan_policy(plan, user_limits) for plan, user_limits in result
+        }
+    if epoch == _plan_epoch:
+        now = time.time()
+        for plan_id, policy in policies.items():
+            _plan_cache[plan_id] = (policy, now)
+    return policies
+
+
+async def get_plan_policies(plan_ids: Iterable[str]) -> dict[str, PlanPolicy]:
+    """Policies for several plans, loading every uncached plan in one query."""
+    now = time.time()
+    policies = {}
+    missing = []
+    for plan_id in set(plan_ids):
+        cached = _plan_cache.get(plan_id)
+        if cached and now - cached[1] < PLAN_CACHE_TTL:
+            policies[plan_id] = cached[0]
+        else:
+            missing.append(plan_id)
+    if missing:
+        policies.update(await _load_plan_policies(missing))
+        for plan_id in missing:
+            policies.setdefault(plan_id, PlanPolicy(limits=(), routes=RouteTable()))
+    return policies
+
+
+def invalidate_plans(plan_ids: Iterable[str]) -> None:
+    global _plan_epoch
+    _plan_epoch += 1
+    for plan_id in plan_ids:
+        _plan_cache.pop(plan_id, None)
+
+
+async def resync_plans(chunk: int = 1000) -> None:
+    """Reload every cached plan, for when change notifications may have been
+    missed. Plans that are gone are dropped."""
+    plan_ids = list(_plan_cache)
+    for i in range(0, len(plan_ids), chunk):
+        batch = plan_ids[i : i + chunk]
+        epoch = _plan_epoch
+        loaded = await _load_plan_policies(batch)
+        # Whatever was not reloaded (deleted, or invalidated meanwhile) goes
+        stale = [p for p in batch if p not in loaded or epoch != _plan_epoch]
+        if stale:
+            invalidate_plans(stale)
+
+
+def fallback_decision(policy: PlanPolicy, charges: list[Charge], now: float) -> Decision | None:
+    """Decision while Redis is unreachable; None means fail closed (503)."""
+    if policy.failure_mode == "closed":
+        return None
+    if policy.failure_mode == "open":
+        limit = min((c.limit.limit for c in charges), default=0)
+        return Decision(True, limit, limit, 60.0, 0.0)
+    return fallback_limiter.decide(charges, int(now * 1000))
+
+
+def _rejection(detail: str) -> tuple[bytes, list[tuple[bytes, bytes]]]:
+    # Same bytes JSONResponse would render, encoded once at import time.
+    body = json.dumps({"detail": detail}, separators=(",", ":")).encode()
+    headers = [
+        (b"content-length", str(len(body)).encode()),
+        (b"content-type", b"application/json"),
+    ]
+    return body, headers
+
+
+_MISSING_KEY = _rejection("Missing X-API-Key header")
+_INVALID_KEY = _rejection("Invalid or inactive API key")
+_RATE_LIMITED = _rejection("Rate limit exceeded")
+_ADMIN_RATE_LIMITED = _rejection("Admin rate limit exceeded")
+_UNAVAILABLE = _rejection("Rate limiter unavailable")
+_TOO_MANY_CONCURRENT = _rejection("Too many concurrent requests")
+
+
+async def _reject(
+    send: Send,
+    status: int,
+    rejection: tuple[bytes, list[tuple[bytes, bytes]]],
+    extra_headers: list[tuple[bytes, bytes]] | None = None,
+) -> None:
+    body, headers = rejection
+    if extra_headers:
+        headers = headers + extra_headers
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _blocked_headers(block: Block, now: float) -> list[tuple[bytes, bytes]]:
+    return [
+        (b"x-ratelimit-limit", str(block.limit).encode()),
+        (b"x-ratelimit-remaining", b"0"),
+        (b"x-ratelimit-reset", str(math.ceil(block.until)).encode()),
+        (b"retry-after", str(max(1, math.ceil(block.until - now))).encode()),
+    ]
+
+
+def _header(scope: Scope, name: bytes) -> bytes | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+class RateLimitMiddleware:
+    """Pure ASGI rate limiter for /v1 (per API key) and /admin (per client IP)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # The app's own /v1 route templates, for naming usage; built on the
+        # first request, once every router is included
+        self._app_routes: RouteTable[str] | None = None
+
+    def _route_name(self, scope: Scope) -> str:
+        if self._app_routes is None:
+            self._app_routes = RouteTable(
+                (method, route.path, f"{method} {route.path}")
+                for route in getattr(scope.get("app"), "routes", ())
+                if route.path.startswith("/v1")
+                for method in getattr(route, "methods", None) or ()
+            )
+        return self._app_routes.match(scope["method"], scope["path"]) or UNMATCHED_ROUTE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        if path.startswith("/admin"):
+            return await self._admin_rate_limit(scope, receive, send)
+
+        # /v1/check is called by gateways with a service token and charges
+        # the keys named in the body, not a key of its own.
+        if (
+            not path.startswith("/v1")
+            or path == CHECK_PATH
+            or path.startswith(CHECK_PATH + "/")
+        ):
+            return await self.app(scope, receive, send)
+
+        api_key_header = _header(scope, b"x-api-key")
+        if not api_key_header:
+            return await _reject(send, 401, _MISSING_KEY)
 
-            plan_id_str = str(api_key.plan_id)
-            api_key_id_str = str(api_key.id)
+        key_hash = hashlib.sha256(api_key_header).hexdigest()
 
-            # Get plan RPM with caching
-            rpm = await self._get_plan_rpm(session, api_key.plan_id, plan_id_str)
+        api_key = await key_cache.get(key_hash, _load_key)
+        if api_key is None or not api_key.is_active:
+            return await _reject(send, 401, _INVALID_KEY)
 
-            # Fire-and-forget last_used_at update
-            asyncio.create_task(
-                self._update_last_used(api_key_id_str)
-            )
+        plan_id_str = api_key.plan_id
+        api_key_id_str = api_key.key_id
 
-        # Fixed window rate limiting
+        policy = await self._get_plan_policy(plan_id_str)
+        prefix = api_key.redis_prefix
+        route = policy.routes.match(scope["method"], path)
+        route_name = route.name if route else self._route_name(scope)
+        cost = route.cost if route else 1
         now = time.time()
-        window = int(now) // 60
-        redis_key = f"rl:{api_key_id_str}:{window}"
-        window_reset = (window + 1) * 60
 
-        count = await redis_client.eval(RATE_LIMIT_SCRIPT, 1, redis_key, 60)
+        if PENALTY_BOX_ENABLED:
+            block = check_penalty_box(policy, prefix, plan_id_str, now, route)
+            if block is not None:
+                record_usage(api_key, route_name, now, False, cost)
+                return await _reject(send, 429, _RATE_LIMITED, _blocked_headers(block, now))
+
+        # Before the decision, so a request turned away for the cap is not
+        # charged to the rate limit too
+        lease_id = None
+        if policy.max_concurrent is not None:
+            try:
+                lease_id = await concurrency_limiter.acquire(prefix, policy.max_concurrent, now)
+            except RedisUnavailable:
+                # Same choice as for the rate limit; "local" and "open" run
+                # without a cap until Redis is back.
+                if policy.failure_mode == "closed":
+                    retry_after = str(max(1, math.ceil(redis_breaker.reset_timeout))).encode()
+                    return await _reject(send, 503, _UNAVAILABLE, [(b"retry-after", retry_after)])
+            else:
+                if lease_id is None:
+                    record_usage(api_key, route_name, now, False, cost)
+                    return await _reject(
+                        send,
+                        429,
+                        _TOO_MANY_CONCURRENT,
+                        [
+                            (b"x-concurrency-limit", str(policy.max_concurrent).encode()),
+                            (b"retry-after", b"1"),
+                        ],
+                    )
+
+        # The slot is held until the app returns: the last body chunk was
+        # sent, or the request failed, was cancelled or the client
+        # disconnected. A request the rate limit rejects gives it back.
+        try:
+            charges = build_charges(policy, prefix, cost, route)
+
+            decide_fn = storage.decide
+            if lease_manager.enabled and lease_manager.covers(charges):
+                decide_fn = lease_manager.decide
+            try:
+                decision = await redis_breaker.call(
+                    decide_fn,
+                    charges,
+                    int(now * 1000),
+                    f"{prefix}seen",
+                )
+            except RedisUnavailable:
+                decision = fallback_decision(policy, charges, now)
+                if decision is None:
+                    retry_after = str(max(1, math.ceil(redis_breaker.reset_timeout))).encode()
+                    return await _reject(
+                        send, 503, _UNAVAILABLE, [(b"retry-after", retry_after)]
+                    )
+            last_used_writer.record(api_key_id_str, now)
+
+            rl_headers = [
+                (b"x-ratelimit-limit", str(decision.limit).encode()),
+                (b"x-ratelimit-remaining", str(decision.remaining).encode()),
+                (b"x-ratelimit-reset", str(math.ceil(now + decision.reset_after)).encode()),
+            ]
+
+            if not decision.allowed:
+                record_usage(api_key, route_name, now, False, cost)
+                if PENALTY_BOX_ENABLED:
+                    # Block the binding key, pool or route only if even a
+                    # cost-1 request would have been rejected by it;
+                    # otherwise just this route.
+                    binding = charges[decision.binding]
+                    block_scope = binding.prefix if binding.cost == 1 else prefix + route.scope
+                    block = penalty_box.block(
+                        block_scope, plan_id_str, decision.limit, decision.retry_after, now
+                    )
+                    rl_headers = _blocked_headers(block, now)
+                else:
+                    retry_after = max(1, math.ceil(decision.retry_after))
+                    rl_headers.append((b"retry-after", str(retry_after).encode()))
+                logger.warning(
+                    "Rate limit exceeded",
+                    extra={
+                        "key_id": api_key_id_str,
+                        "plan_id": plan_id_str,
+                        "path": path,
+                        "limit": decision.limit,
+                    },
+                )
+                return await _reject(send, 429, _RATE_LIMITED, rl_headers)
 
-        # Track daily request count
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        asyncio.create_task(redis_client.incr(f"stats:requests:{today}"))
+            record_usage(api_key, route_name, now, True, cost)
 
-        remaining = max(0, rpm - count)
-        headers = {
-            "X-RateLimit-Limit": str(rpm),
-            "X-RateLimit-Remaining": str(remaining),
-            "X-RateLimit-Reset": str(window_reset),
-        }
+            async def send_with_headers(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = message.setdefault("headers", [])
+                    if not isinstance(headers, list):
+                        headers = message["headers"] = list(headers)
+                    headers.extend(rl_headers)
+                await send(message)
 
-        if count > rpm:
-            retry_after = window_reset - int(now)
-            headers["Retry-After"] = str(max(1, retry_after))
-            logger.warning(
-                "Rate limit exceeded",
-                extra={
-                    "key_id": api_key_id_str,
-                    "plan_id": plan_id_str,
-                    "path": request.url.path,
-                    "count": count,
-                    "limit": rpm,
-                },
-            )
-            return JSONResponse(
-                status_code=429,
-                content={"detail": "Rate limit exceeded"},
-                headers=headers,
-            )
-
-        response = await call_next(request)
-        for k, v in headers.items():
-            response.headers[k] = v
-        return response
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            if lease_id is not None:
+                concurrency_limiter.release(lease_id)
 
-    async def _get_plan_rpm(self, session, plan_id, plan_id_str: str) -> int:
+    async def _get_plan_policy(self, plan_id_str: str) -> PlanPolicy:
         now = time.time()
         cached = _plan_cache.get(plan_id_str)
         if cached and now - cached[1] < PLAN_CACHE_TTL:
             return cached[0]
 
-        plan = await session.get(Plan, plan_id)
-        if not plan:
-            return 0
-        _plan_cache[plan_id_str] = (plan.default_rpm, now)
-        return plan.default_rpm
+        return (await get_plan_policies([plan_id_str]))[plan_id_str]
 
-    async def _admin_rate_limit(self, request: Request, call_next):
-        client_ip = request.client.host if request.client else "unknown"
+    async def _admin_rate_limit(self, scope: Scope, receive: Receive, send: Send) -> None:
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         now = time.time()
         window = int(now) // 60
         redis_key = f"admin_rl:{client_ip}:{window}"
         window_reset = (window + 1) * 60
 
-        count = await redis_client.eval(RATE_LIMIT_SCRIPT, 1, redis_key, 60)
+        try:
+            count = await redis_breaker.call(storage.incr_window, redis_key, 60)
+        except RedisUnavailable:
+            # Admin routes still require a token; don't lock operators out
+            return await self.app(scope, receive, send)
 
         if count > ADMIN_RATE_LIMIT_RPM:
             retry_after = window_reset - int(now)
@@ -143,22 +506,11 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                 "Admin rate limit exceeded",
                 extra={"client_ip": client_ip, "count": count},
             )
-            return JSONResponse(
-                status_code=429,
-                content={"detail": "Admin rate limit exceeded"},
-                headers={"Retry-After": str(max(1, retry_after))},
+            return await _reject(
+                send,
+                429,
+                _ADMIN_RATE_LIMITED,
+                [(b"retry-after", str(max(1, retry_after)).encode())],
             )
 
-        return await call_next(request)
-
-    async def _update_last_used(self, api_key_id_str: str):
-        try:
-            import uuid
-
-            async with AsyncSessionLocal() as session:
-                api_key = await session.get(ApiKey, uuid.UUID(api_key_id_str))
-                if api_key:
-                    api_key.last_used_at = datetime.now(timezone.utc)
-                    await session.commit()
-        except Exception:
-            pass  # fire-and-forget
+        await self.app(scope, receive, send)
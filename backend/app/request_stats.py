@@ -0,0 +1,155 @@
+"""Per-user counters behind GET /admin/stats, answered with one HMGET.
+
+Each user has one Redis hash, ``{ns}:{user_id}``:
+
+- ``requests:{YYYY-MM-DD}``: requests decided for the user's keys that day
+  (UTC). ``record`` bumps an in-process counter; every ``interval`` seconds
+  the counters are added with one pipelined HINCRBY per user and day, so the
+  hot path does no I/O and tenants never share a key.
+- ``plans`` and ``keys``: the user's plan and API key counts, adjusted by the
+  admin endpoints that create and delete them, plus ``totals_at``, when they
+  were last counted in Postgres. A read that finds them missing or older
+  than ``totals_ttl`` seconds counts again, which also repairs any drift
+  (a write racing a recount, or Redis being down during a write).
+
+A hash expires ``STATS_TTL`` seconds after its user's last request or count.
+"""
+import asyncio
+import logging
+import time
+
+from sqlalchemy import func, select
+
+from app.config import STATS_FLUSH_INTERVAL, STATS_TOTALS_TTL
+from app.database import AsyncSessionLocal
+from app.models import ApiKey, Plan
+from app.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+STATS_TTL = 7 * 86400
+
+# KEYS: stats hash. ARGV: field, increment, ... Adjusts only the counts that
+# are cached; a missing count is recounted on the next read.
+ADJUST_SCRIPT = """
+for i = 1, #ARGV, 2 do
+  if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 1 then
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+  end
+end
+"""
+
+
+def day(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+class RequestStats:
+    def __init__(
+        self,
+        interval: float,
+        totals_ttl: float,
+        namespace: str = "stats",
+        client=redis_client,
+    ):
+        self.interval = interval
+        self.totals_ttl = totals_ttl
+        self.namespace = namespace
+        self.client = client
+        self.flushes = 0
+        self.recounts = 0
+        self._adjust_script = client.register_script(ADJUST_SCRIPT)
+        # (user id, day) -> requests not yet added to Redis
+        self._counts: dict[tuple[str, str], int] = {}
+
+    def record(self, user_id: str, ts: float) -> None:
+        slot = (user_id, day(ts))
+        self._counts[slot] = self._counts.get(slot, 0) + 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._counts)
+
+    def _hash(self, user_id: str) -> str:
+        return f"{self.namespace}:{user_id}"
+
+    async def flush(self) -> int:
+        if not self._counts:
+            return 0
+        batch, self._counts = self._counts, {}
+        pipe = self.client.pipeline(transaction=False)
+        for (user_id, today), count in batch.items():
+            name = self._hash(user_id)
+            pipe.hincrby(name, f"requests:{today}", count)
+            # Days older than the hash's TTL are never read again
+            pipe.hdel(name, f"requests:{day(time.time() - STATS_TTL)}")
+            pipe.expire(name, STATS_TTL)
+        try:
+            await pipe.execute()
+        except Exception:
+            for slot, count in batch.items():
+                self._counts[slot] = self._counts.get(slot, 0) + count
+            raise
+        self.flushes += 1
+        return len(batch)
+
+    async def adjust(self, user_id: str, plans: int = 0, keys: int = 0) -> None:
+        """Apply a committed plan or key write to the cached counts."""
+        args = []
+        if plans:
+            args += ["plans", plans]
+        if keys:
+            args += ["keys", keys]
+        try:
+            await self._adjust_script(keys=[self._hash(user_id)], args=args)
+        except Exception:
+            # The next recount picks the write up
+            logger.exception("Could not adjust cached stats", extra={"user_id": user_id})
+
+    async def read(self, user_id: str, now: float | None = None) -> tuple[int, int, int]:
+        """(plans, keys, requests today) for one user."""
+        now = time.time() if now is None else now
+        today = day(now)
+        plans, keys, totals_at, requests = await self.client.hmget(
+            self._hash(user_id), "plans", "keys", "totals_at", f"requests:{today}"
+        )
+        if plans is None or keys is None or totals_at is None or (
+            now - float(totals_at) >= self.totals_ttl
+        ):
+            plans, keys = await self._recount(user_id, now)
+        # Requests this instance hasn't flushed yet
+        requests = int(requests or 0) + self._counts.get((user_id, today), 0)
+        return int(plans), int(keys), requests
+
+    async def _recount(self, user_id: str, now: float) -> tuple[int, int]:
+        async with AsyncSessionLocal() as session:
+            plans = (
+                await session.execute(select(func.count(Plan.id)).where(Plan.user_id == user_id))
+            ).scalar() or 0
+            keys = (
+                await session.execute(
+                    select(func.count(ApiKey.id)).where(ApiKey.user_id == user_id)
+                )
+            ).scalar() or 0
+        name = self._hash(user_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(name, mapping={"plans": plans, "keys": keys, "totals_at": now})
+        pipe.expire(name, STATS_TTL)
+        await pipe.execute()
+        self.recounts += 1
+        return plans, keys
+
+    async def run(self) -> None:
+        """Flush every ``interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Request stats flush failed", extra={"pending": self.pending})
+
+    def stats(self) -> dict:
+        return {"pending": self.pending, "flushes": self.flushes, "recounts": self.recounts}
+
+
+request_stats = RequestStats(STATS_FLUSH_INTERVAL, STATS_TOTALS_TTL)
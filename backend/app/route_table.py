@@ -0,0 +1,85 @@
+"""Per-plan route table mapping (method, path) to a route's cost and limits.
+
+Patterns are matched segment by segment against a trie built once when the
+plan is loaded, so a lookup costs O(path depth) no matter how many routes a
+plan defines:
+
+- ``/v1/export``       literal segments
+- ``/v1/items/{id}``   ``{name}`` matches exactly one segment
+- ``/v1/files/*``      trailing ``*`` matches any remainder (including none)
+
+Literal segments beat ``{param}`` segments, which beat ``*``. A method of
+``*`` matches any method, a specific method beats ``*``.
+"""
+from collections.abc import Iterable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+ANY_METHOD = "*"
+
+
+class _Node:
+    __slots__ = ("literal", "param", "methods", "wildcard")
+
+    def __init__(self):
+        self.literal: dict[str, _Node] = {}
+        self.param: _Node | None = None
+        self.methods: dict = {}
+        self.wildcard: dict = {}
+
+
+def split_path(path: str) -> list[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+class RouteTable(Generic[T]):
+    def __init__(self, routes: Iterable[tuple[str, str, T]] = ()):
+        self._root = _Node()
+        self._size = 0
+        for method, pattern, value in routes:
+            self.add(method, pattern, value)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, method: str, pattern: str, value: T) -> None:
+        node = self._root
+        segments = split_path(pattern)
+        for i, segment in enumerate(segments):
+            if segment == "*":
+                if i != len(segments) - 1:
+                    raise ValueError(f"'*' must be the last segment: {pattern}")
+                node.wildcard[method.upper()] = value
+                self._size += 1
+                return
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            else:
+                node = node.literal.setdefault(segment, _Node())
+        node.methods[method.upper()] = value
+        self._size += 1
+
+    def match(self, method: str, path: str) -> T | None:
+        if not self._size:
+            return None
+        return self._match(self._root, split_path(path), 0, method)
+
+    def _match(self, node: _Node, segments: list[str], i: int, method: str) -> T | None:
+        if i == len(segments):
+            value = node.methods.get(method) or node.methods.get(ANY_METHOD)
+            if value is not None:
+                return value
+        else:
+            child = node.literal.get(segments[i])
+            if child is not None:
+                value = self._match(child, segments, i + 1, method)
+                if value is not None:
+                    return value
+            if node.param is not None:
+                value = self._match(node.param, segments, i + 1, method)
+                if value is not None:
+                    return value
+        return node.wildcard.get(method) or node.wildcard.get(ANY_METHOD)
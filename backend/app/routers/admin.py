@@ -1,18 +1,43 @@
+import base64
 import hashlib
 import logging
 import secrets
 import uuid
+from collections.abc import AsyncIterator
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import (
+    DateTime,
+    String,
+    Uuid,
+    any_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database import AsyncSessionLocal
 from app.dependencies import get_current_user, get_db
-from app.models import ApiKey, Plan, User
-from app.redis_client import redis_client
+from app.key_cache import publish_invalidation, publish_invalidations
+from app.models import ApiKey, Plan
+from app.principal_cache import Principal
+from app.rate_limiter import invalidate_plans
+from app.request_stats import request_stats
 from app.schemas import (
+    ApiKeyBulkCreate,
+    ApiKeyBulkIds,
+    ApiKeyBulkResult,
+    ApiKeyBulkUpdate,
     ApiKeyCreate,
     ApiKeyCreatedResponse,
     ApiKeyResponse,
@@ -20,8 +45,13 @@ from app.schemas import (
     PlanCreate,
     PlanResponse,
     PlanUpdate,
+    RouteUsage,
     StatsResponse,
+    UsageBucket,
+    UsagePeriod,
+    UsageResponse,
 )
+from app.usage_rollups import PERIODS, bucket_start, usage_rollups
 
 logger = logging.getLogger(__name__)
 
@@ -30,21 +60,9 @@ router = APIRouter(prefix="/admin", dependencies=[Depends(get_current_user)])
 
 @router.get("/stats", response_model=StatsResponse)
 async def get_stats(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    total_plans = (
-        await db.execute(
-            select(func.count(Plan.id)).where(Plan.user_id == current_user.id)
-        )
-    ).scalar() or 0
-    total_keys = (
-        await db.execute(
-            select(func.count(ApiKey.id)).where(ApiKey.user_id == current_user.id)
-        )
-    ).scalar() or 0
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    requests_today = int(await redis_client.get(f"stats:requests:{today}") or 0)
+    total_plans, total_keys, requests_today = await request_stats.read(str(current_user.id))
     return StatsResponse(
         total_plans=total_plans,
         total_keys=total_keys,
@@ -52,16 +70,120 @@ async def get_stats(
     )
 
 
+# Buckets one GET /admin/usage may return
+MAX_USAGE_BUCKETS = 1000
+# Buckets returned by default, ending with the current one
+_DEFAULT_USAGE_BUCKETS = {"hour": 24, "day": 30}
+
+
+@router.get("/usage", response_model=UsageResponse)
+async def get_usage(
+    key_id: uuid.UUID,
+    period: UsagePeriod = "hour",
+    start: datetime | None = Query(
+        None, description="Defaults to the last 24 hours (or 30 days) up to end"
+    ),
+    end: datetime | None = Query(None, description="Defaults to now"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    key = await db.get(ApiKey, key_id)
+    if not key or key.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="API key not found")
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is None or (start is not None and start.tzinfo is None):
+        raise HTTPException(status_code=422, detail="start and end need a timezone")
+    size = PERIODS[period]
+    if start is None:
+        first = bucket_start(end.timestamp(), period) - (_DEFAULT_USAGE_BUCKETS[period] - 1) * size
+    else:
+        first = bucket_start(start.timestamp(), period)
+    # Buckets starting before end, at least one; checked before building the
+    # list, which for a start in year 1 would hold millions of entries
+    count = max(1, -((first - int(end.timestamp())) // size))
+    if count > MAX_USAGE_BUCKETS:
+        raise HTTPException(
+            status_code=422, detail=f"at most {MAX_USAGE_BUCKETS} buckets per request"
+        )
+    starts = [first + i * size for i in range(count)]
+
+    counts = await usage_rollups.read(key_id, period, starts)
+    buckets = []
+    for bucket in starts:
+        routes = [
+            RouteUsage(route=route, allowed=allowed, rejected=rejected)
+            for route, (allowed, rejected) in sorted(counts[bucket].items())
+        ]
+        buckets.append(
+            UsageBucket(
+                start=datetime.fromtimestamp(bucket, timezone.utc),
+                allowed=sum(r.allowed for r in routes),
+                rejected=sum(r.rejected for r in routes),
+                routes=routes,
+            )
+        )
+    return UsageResponse(
+        key_id=key_id,
+        period=period,
+        start=buckets[0].start,
+        end=datetime.fromtimestamp(starts[-1] + size, timezone.utc),
+        allowed=sum(b.allowed for b in buckets),
+        rejected=sum(b.rejected for b in buckets),
+        buckets=buckets,
+    )
+
+
+def _encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+
+async def _page(
+    db: AsyncSession,
+    model,
+    user_id: uuid.UUID,
+    cursor: str | None,
+    limit: int,
+    response: Response,
+):
+    """One page of a user's rows in (created_at, id) order, resuming after
+    ``cursor``. Sets X-Next-Cursor when the page is full."""
+    stmt = select(model).where(model.user_id == user_id)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(model.created_at, model.id) > _decode_cursor(cursor))
+    result = await db.execute(stmt.order_by(model.created_at, model.id).limit(limit))
+    rows = result.scalars().all()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows
+
+
 @router.post("/plans", response_model=PlanResponse, status_code=201)
 async def create_plan(
     body: PlanCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     plan = Plan(
         id=uuid.uuid4(),
         name=body.name,
         default_rpm=body.default_rpm,
+        algorithm=body.algorithm,
+        burst=body.burst,
+        limits=[lim.model_dump() for lim in body.limits],
+        routes=[route.model_dump() for route in body.routes],
+        pool_limits=[lim.model_dump() for lim in body.pool_limits],
+        max_concurrent=body.max_concurrent,
+        failure_mode=body.failure_mode,
         created_at=datetime.now(timezone.utc),
         user_id=current_user.id,
     )
@@ -72,37 +194,41 @@ async def create_plan(
         await db.rollback()
         raise HTTPException(status_code=409, detail="Plan name already exists")
     await db.refresh(plan)
+    await request_stats.adjust(str(current_user.id), plans=1)
     logger.info("Plan created", extra={"plan_id": str(plan.id), "plan_name": plan.name})
     return PlanResponse(
         id=plan.id, name=plan.name, default_rpm=plan.default_rpm,
+        algorithm=plan.algorithm, burst=plan.burst,
+        limits=plan.limits, routes=plan.routes, pool_limits=plan.pool_limits,
+        max_concurrent=plan.max_concurrent, failure_mode=plan.failure_mode,
         created_at=plan.created_at, key_count=0,
     )
 
 
 @router.get("/plans", response_model=list[PlanResponse])
 async def list_plans(
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: str | None = Query(None, description="X-Next-Cursor of the previous page"),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(
-        select(Plan)
-        .where(Plan.user_id == current_user.id)
-        .order_by(Plan.created_at)
-        .offset(skip)
-        .limit(limit)
-    )
-    plans = result.scalars().all()
-    counts_result = await db.execute(
-        select(ApiKey.plan_id, func.count(ApiKey.id).label("cnt"))
-        .where(ApiKey.user_id == current_user.id)
-        .group_by(ApiKey.plan_id)
-    )
-    key_counts = {row.plan_id: row.cnt for row in counts_result}
+    plans = await _page(db, Plan, current_user.id, cursor, limit, response)
+    key_counts = {}
+    if plans:
+        # Only the plans on this page, via ix_api_keys_plan_id
+        counts_result = await db.execute(
+            select(ApiKey.plan_id, func.count(ApiKey.id).label("cnt"))
+            .where(ApiKey.plan_id.in_([p.id for p in plans]))
+            .group_by(ApiKey.plan_id)
+        )
+        key_counts = {row.plan_id: row.cnt for row in counts_result}
     return [
         PlanResponse(
             id=p.id, name=p.name, default_rpm=p.default_rpm,
+            algorithm=p.algorithm, burst=p.burst,
+            limits=p.limits, routes=p.routes, pool_limits=p.pool_limits,
+            max_concurrent=p.max_concurrent, failure_mode=p.failure_mode,
             created_at=p.created_at, key_count=key_counts.get(p.id, 0),
         )
         for p in plans
@@ -112,7 +238,7 @@ async def list_plans(
 @router.get("/plans/{plan_id}", response_model=PlanResponse)
 async def get_plan(
     plan_id: uuid.UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     plan = await db.get(Plan, plan_id)
@@ -124,6 +250,9 @@ async def get_plan(
     key_count = count_result.scalar() or 0
     return PlanResponse(
         id=plan.id, name=plan.name, default_rpm=plan.default_rpm,
+        algorithm=plan.algorithm, burst=plan.burst,
+        limits=plan.limits, routes=plan.routes, pool_limits=plan.pool_limits,
+        max_concurrent=plan.max_concurrent, failure_mode=plan.failure_mode,
         created_at=plan.created_at, key_count=key_count,
     )
 
@@ -132,7 +261,7 @@ async def get_plan(
 async def update_plan(
     plan_id: uuid.UUID,
     body: PlanUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     plan = await db.get(Plan, plan_id)
@@ -142,12 +271,29 @@ async def update_plan(
         plan.name = body.name
     if body.default_rpm is not None:
         plan.default_rpm = body.default_rpm
+    if body.algorithm is not None:
+        plan.algorithm = body.algorithm
+    # Nullable fields: an explicit null clears them
+    if "burst" in body.model_fields_set:
+        plan.burst = body.burst
+    if body.limits is not None:
+        plan.limits = [lim.model_dump() for lim in body.limits]
+    if body.routes is not None:
+        plan.routes = [route.model_dump() for route in body.routes]
+    if body.pool_limits is not None:
+        plan.pool_limits = [lim.model_dump() for lim in body.pool_limits]
+    if "max_concurrent" in body.model_fields_set:
+        plan.max_concurrent = body.max_concurrent
+    if body.failure_mode is not None:
+        plan.failure_mode = body.failure_mode
     try:
         await db.commit()
     except IntegrityError:
         await db.rollback()
         raise HTTPException(status_code=409, detail="Plan name already exists")
     await db.refresh(plan)
+    # Right away here; other instances hear of it through the change feed
+    invalidate_plans([str(plan_id)])
     logger.info("Plan updated", extra={"plan_id": str(plan_id)})
     return plan
 
@@ -155,7 +301,7 @@ async def update_plan(
 @router.delete("/plans/{plan_id}", status_code=204)
 async def delete_plan(
     plan_id: uuid.UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     plan = await db.get(Plan, plan_id)
@@ -171,13 +317,14 @@ async def delete_plan(
         )
     await db.delete(plan)
     await db.commit()
+    await request_stats.adjust(str(current_user.id), plans=-1)
     logger.info("Plan deleted", extra={"plan_id": str(plan_id)})
 
 
 @router.post("/api-keys", response_model=ApiKeyCreatedResponse, status_code=201)
 async def create_api_key(
     body: ApiKeyCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     plan = await db.get(Plan, body.plan_id)
@@ -199,6 +346,7 @@ async def create_api_key(
     db.add(api_key)
     await db.commit()
     await db.refresh(api_key)
+    await request_stats.adjust(str(current_user.id), keys=1)
 
     logger.info(
         "API key created",
@@ -217,26 +365,170 @@ async def create_api_key(
 
 @router.get("/api-keys", response_model=list[ApiKeyResponse])
 async def list_api_keys(
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: str | None = Query(None, description="X-Next-Cursor of the previous page"),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(
-        select(ApiKey)
-        .where(ApiKey.user_id == current_user.id)
-        .order_by(ApiKey.created_at)
-        .offset(skip)
-        .limit(limit)
+    return await _page(db, ApiKey, current_user.id, cursor, limit, response)
+
+
+# Keys per INSERT and commit of POST /admin/api-keys/bulk
+_BULK_INSERT_ROWS = 5000
+
+# One multi-row INSERT per chunk. The ids and hashes travel as two array
+# parameters, so the statement text is the same for every chunk size and is
+# parsed once, unlike a VALUES list with a parameter per column per row.
+_INSERT_KEYS = (
+    insert(ApiKey.__table__)
+    .from_select(
+        ["id", "key_hash", "label", "plan_id", "is_active", "created_at", "user_id"],
+        select(
+            func.unnest(bindparam("ids", type_=ARRAY(Uuid))),
+            func.unnest(bindparam("key_hashes", type_=ARRAY(String))),
+            bindparam("label", type_=String),
+            bindparam("plan_id", type_=Uuid),
+            true(),
+            bindparam("created_at", type_=DateTime(timezone=True)),
+            bindparam("user_id", type_=Uuid),
+        ),
+    )
+    .returning(ApiKey.id)
+)
+
+
+async def _insert_keys(
+    user_id: uuid.UUID, plan_id: uuid.UUID, label: str, count: int
+) -> AsyncIterator[str]:
+    """Insert ``count`` keys in chunks, yielding each committed chunk as NDJSON.
+
+    Runs on its own session: the request's session is closed by the time a
+    streaming response body is produced. A failure stops the stream, and
+    every key already sent exists.
+    """
+    async with AsyncSessionLocal() as session:
+        for start in range(0, count, _BULK_INSERT_ROWS):
+            size = min(_BULK_INSERT_ROWS, count - start)
+            plaintexts = {uuid.uuid4(): secrets.token_hex(16) for _ in range(size)}
+            created_at = datetime.now(timezone.utc)
+            inserted = await session.execute(
+                _INSERT_KEYS,
+                {
+                    "ids": list(plaintexts),
+                    "key_hashes": [
+                        hashlib.sha256(p.encode()).hexdigest() for p in plaintexts.values()
+                    ],
+                    "label": label,
+                    "plan_id": plan_id,
+                    "created_at": created_at,
+                    "user_id": user_id,
+                },
+            )
+            key_ids = inserted.scalars().all()
+            await session.commit()
+            await request_stats.adjust(str(user_id), keys=len(key_ids))
+            yield "".join(
+                ApiKeyCreatedResponse(
+                    id=key_id,
+                    label=label,
+                    plan_id=plan_id,
+                    is_active=True,
+                    created_at=created_at,
+                    last_used_at=None,
+                    plaintext_key=plaintexts[key_id],
+                ).model_dump_json()
+                + "\n"
+                for key_id in key_ids
+            )
+    logger.info(
+        "API keys created in bulk",
+        extra={"count": count, "label": label, "plan_id": str(plan_id)},
+    )
+
+
+@router.post(
+    "/api-keys/bulk",
+    status_code=201,
+    response_class=StreamingResponse,
+    responses={201: {"content": {"application/x-ndjson": {}}}},
+)
+async def create_api_keys(
+    body: ApiKeyBulkCreate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Create ``count`` keys on one plan. The response streams one
+    ApiKeyCreatedResponse per line, with its plaintext key, as they commit."""
+    plan = await db.get(Plan, body.plan_id)
+    if not plan or plan.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    return StreamingResponse(
+        _insert_keys(current_user.id, body.plan_id, body.label, body.count),
+        status_code=201,
+        media_type="application/x-ndjson",
     )
-    return result.scalars().all()
+
+
+def _owned_keys(ids: list[uuid.UUID], user_id: uuid.UUID):
+    # One array parameter rather than an IN list of up to BULK_KEYS_MAX
+    return (ApiKey.user_id == user_id) & (
+        ApiKey.id == any_(bindparam("ids", ids, type_=ARRAY(Uuid)))
+    )
+
+
+@router.patch("/api-keys/bulk", response_model=ApiKeyBulkResult)
+async def update_api_keys(
+    body: ApiKeyBulkUpdate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Activate or deactivate many keys with one UPDATE."""
+    rows = (
+        await db.execute(
+            update(ApiKey)
+            .where(_owned_keys(body.ids, current_user.id))
+            .values(is_active=body.is_active)
+            .returning(ApiKey.id, ApiKey.key_hash)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+    await db.commit()
+    await publish_invalidations([row.key_hash for row in rows])
+    logger.info(
+        "API keys updated in bulk",
+        extra={"count": len(rows), "is_active": body.is_active},
+    )
+    return ApiKeyBulkResult(ids=[row.id for row in rows])
+
+
+@router.post("/api-keys/bulk/delete", response_model=ApiKeyBulkResult)
+async def delete_api_keys(
+    body: ApiKeyBulkIds,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Delete many keys with one DELETE."""
+    rows = (
+        await db.execute(
+            delete(ApiKey)
+            .where(_owned_keys(body.ids, current_user.id))
+            .returning(ApiKey.id, ApiKey.key_hash)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+    await db.commit()
+    await publish_invalidations([row.key_hash for row in rows])
+    await request_stats.adjust(str(current_user.id), keys=-len(rows))
+    logger.info("API keys deleted in bulk", extra={"count": len(rows)})
+    return ApiKeyBulkResult(ids=[row.id for row in rows])
 
 
 @router.patch("/api-keys/{key_id}", response_model=ApiKeyResponse)
 async def update_api_key(
     key_id: uuid.UUID,
     body: ApiKeyUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     key = await db.get(ApiKey, key_id)
@@ -245,6 +537,7 @@ async def update_api_key(
     key.is_active = body.is_active
     await db.commit()
     await db.refresh(key)
+    await publish_invalidation(key.key_hash)
     logger.info(
         "API key updated",
         extra={"key_id": str(key_id), "is_active": body.is_active},
@@ -255,7 +548,7 @@ async def update_api_key(
 @router.delete("/api-keys/{key_id}", status_code=204)
 async def delete_api_key(
     key_id: uuid.UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     key = await db.get(ApiKey, key_id)
@@ -263,4 +556,6 @@ async def delete_api_key(
         raise HTTPException(status_code=404, detail="API key not found")
     await db.delete(key)
     await db.commit()
+    await publish_invalidation(key.key_hash)
+    await request_stats.adjust(str(current_user.id), keys=-1)
     logger.info("API key deleted", extra={"key_id": str(key_id)})
@@ -1,27 +1,67 @@
+import hashlib
+import time
 import uuid
+from collections.abc import Awaitable
 from datetime import datetime, timedelta, timezone
+from typing import TypeVar
 
-import bcrypt
 import jwt
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import JWT_ALGORITHM, JWT_EXPIRE_DAYS, JWT_SECRET
+from app.circuit_breaker import RedisUnavailable, redis_breaker
+from app.config import (
+    JWT_ALGORITHM,
+    JWT_EXPIRE_DAYS,
+    JWT_SECRET,
+    LOGIN_RATE_LIMIT_PER_EMAIL,
+    LOGIN_RATE_LIMIT_PER_IP,
+)
 from app.dependencies import get_db
 from app.models import User
+from app.passwords import PasswordHasherBusy, password_hasher
 from app.schemas import TokenResponse, UserCreate
+from app.storage import storage
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+T = TypeVar("T")
 
-def _hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+async def _bcrypt(call: Awaitable[T]) -> T:
+    """Await a password_hasher call; 503 if the hashing pool is saturated."""
+    try:
+        return await call
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"}
+        )
 
 
-def _verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+async def _throttle_login(email: str, request: Request) -> None:
+    """Fixed one-minute windows per email and per client IP, counted in the
+    limiter's storage like the admin rate limit, before any bcrypt work."""
+    now = time.time()
+    window = int(now) // 60
+    client_ip = request.client.host if request.client else "unknown"
+    email_hash = hashlib.sha256(email.encode()).hexdigest()[:32]
+    for key, limit in (
+        (f"login_rl:email:{email_hash}:{window}", LOGIN_RATE_LIMIT_PER_EMAIL),
+        (f"login_rl:ip:{client_ip}:{window}", LOGIN_RATE_LIMIT_PER_IP),
+    ):
+        try:
+            count = await redis_breaker.call(storage.incr_window, key, 60)
+        except RedisUnavailable:
+            # Passwords are still checked; don't lock everyone out
+            return
+        if count > limit:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts",
+                headers={"Retry-After": str((window + 1) * 60 - int(now))},
+            )
 
 
 def _create_token(user_id: uuid.UUID) -> str:
@@ -37,7 +77,7 @@ async def register(body: UserCreate, db: AsyncSession = Depends(get_db)):
     user = User(
         id=uuid.uuid4(),
         email=body.email.lower().strip(),
-        password_hash=_hash_password(body.password),
+        password_hash=await _bcrypt(password_hasher.hash(body.password)),
         created_at=datetime.now(timezone.utc),
     )
     db.add(user)
@@ -50,11 +90,13 @@ async def register(body: UserCreate, db: AsyncSession = Depends(get_db)):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(body: UserCreate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(User).where(User.email == body.email.lower().strip())
-    )
+async def login(body: UserCreate, request: Request, db: AsyncSession = Depends(get_db)):
+    email = body.email.lower().strip()
+    await _throttle_login(email, request)
+    result = await db.execute(select(User).where(User.email == email))
     user = result.scalars().first()
-    if not user or not _verify_password(body.password, user.password_hash):
+    if not user or not await _bcrypt(
+        password_hasher.verify(body.password, user.password_hash)
+    ):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     return TokenResponse(access_token=_create_token(user.id))
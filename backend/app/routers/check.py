@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+
+from app.checks import check_many
+from app.dependencies import require_admin
+from app.schemas import CheckBatchRequest, CheckBatchResponse, CheckRequest, CheckResult
+
+# Called by gateways and other services with the admin token; the API keys
+# being charged are in the body.
+router = APIRouter(prefix="/v1/check", dependencies=[Depends(require_admin)])
+
+
+@router.post("", response_model=CheckResult)
+async def check(body: CheckRequest):
+    (outcome,) = await check_many([(body.key, body.cost)])
+    return CheckResult.model_validate(outcome)
+
+
+@router.post("/batch", response_model=CheckBatchResponse)
+async def check_batch(body: CheckBatchRequest):
+    outcomes = await check_many([(item.key, item.cost) for item in body.checks])
+    return CheckBatchResponse(results=[CheckResult.model_validate(o) for o in outcomes])
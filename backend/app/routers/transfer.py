@@ -0,0 +1,234 @@
+"""Tenant export and import: all of a user's plans and keys as NDJSON.
+
+GET /admin/export streams the caller's plans, then their keys, one record
+per line, from server-side cursors over a single REPEATABLE READ snapshot,
+so memory use does not depend on the tenant's size. POST /admin/import takes
+the same format, COPYs it into staging tables in batches as the body
+arrives, and inserts everything in one transaction at the end: an import
+applies completely or not at all. Records whose id, plan name or key hash
+already exist are skipped, so importing the same file twice is harmless.
+"""
+import json
+import logging
+import uuid
+import zlib
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy import select, text
+
+from app.database import AsyncSessionLocal, engine
+from app.dependencies import get_current_user
+from app.models import ApiKey, Plan
+from app.principal_cache import Principal
+from app.request_stats import request_stats
+from app.schemas import ApiKeyRecord, ExportRecord, ImportResult, PlanRecord
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(get_current_user)])
+
+# Rows per server-side cursor fetch
+EXPORT_FETCH_ROWS = 1000
+# Records per COPY into the staging tables
+IMPORT_BATCH_ROWS = 5000
+# Longest import line accepted; also bounds each gunzipped piece of the body
+MAX_RECORD_BYTES = 1 << 20
+
+_PLAN_COLUMNS = (
+    "id",
+    "name",
+    "default_rpm",
+    "algorithm",
+    "burst",
+    "limits",
+    "routes",
+    "pool_limits",
+    "max_concurrent",
+    "failure_mode",
+    "created_at",
+)
+_KEY_COLUMNS = (
+    "id",
+    "key_hash",
+    "label",
+    "plan_id",
+    "is_active",
+    "created_at",
+    "last_used_at",
+)
+
+_INSERT_PLANS = text(
+    f"INSERT INTO plans ({', '.join(_PLAN_COLUMNS)}, user_id) "
+    f"SELECT {', '.join(_PLAN_COLUMNS)}, :user_id FROM import_plans "
+    "ON CONFLICT DO NOTHING"
+)
+# Keys are only attached to plans the importing user owns
+_INSERT_KEYS = text(
+    f"INSERT INTO api_keys ({', '.join(_KEY_COLUMNS)}, user_id) "
+    f"SELECT {', '.join('k.' + c for c in _KEY_COLUMNS)}, :user_id FROM import_api_keys k "
+    "JOIN plans p ON p.id = k.plan_id AND p.user_id = :user_id "
+    "ON CONFLICT DO NOTHING"
+)
+
+_record = TypeAdapter(ExportRecord)
+
+
+async def _export(user_id: uuid.UUID) -> AsyncIterator[str]:
+    async with AsyncSessionLocal() as session:
+        # Plans and keys from one snapshot, so every key's plan is included
+        await session.connection(
+            execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+        )
+        for model, columns, record in (
+            (Plan, _PLAN_COLUMNS, PlanRecord),
+            (ApiKey, _KEY_COLUMNS, ApiKeyRecord),
+        ):
+            rows = await session.stream(
+                select(*(getattr(model, c) for c in columns))
+                .where(model.user_id == user_id)
+                .order_by(model.created_at, model.id)
+                .execution_options(yield_per=EXPORT_FETCH_ROWS)
+            )
+            async for partition in rows.partitions():
+                yield "".join(
+                    record.model_validate(row._asdict()).model_dump_json() + "\n"
+                    for row in partition
+                )
+
+
+async def _gzip(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        if data := compressor.compress(chunk.encode()):
+            yield data
+    yield compressor.flush()
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def export_records(
+    gzip: bool = Query(False, description="Compress the body (Content-Encoding: gzip)"),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Every plan, then every API key, as PlanRecord / ApiKeyRecord lines."""
+    body = _export(current_user.id)
+    if gzip:
+        return StreamingResponse(
+            _gzip(body), media_type="application/x-ndjson", headers={"Content-Encoding": "gzip"}
+        )
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
+async def _body(request: Request) -> AsyncIterator[bytes]:
+    """The request body, gunzipped if it was sent with Content-Encoding: gzip."""
+    encoding = request.headers.get("content-encoding", "identity")
+    if encoding not in ("identity", "gzip"):
+        raise HTTPException(status_code=415, detail="Content-Encoding must be gzip or identity")
+    decompressor = zlib.decompressobj(wbits=31) if encoding == "gzip" else None
+    try:
+        async for chunk in request.stream():
+            if decompressor is None:
+                yield chunk
+                continue
+            # Bounded pieces: a small, highly compressed chunk must not
+            # expand into one huge buffer
+            while chunk:
+                yield decompressor.decompress(chunk, MAX_RECORD_BYTES)
+                chunk = decompressor.unconsumed_tail
+        if decompressor is not None:
+            yield decompressor.flush()
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+
+
+async def _lines(request: Request) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for data in _body(request):
+        *lines, buffer = (buffer + data).split(b"\n")
+        if len(buffer) > MAX_RECORD_BYTES:
+            raise HTTPException(status_code=413, detail="Import record too large")
+        for line in lines:
+            yield line
+    yield buffer
+
+
+def _copy_row(record: BaseModel, columns: tuple[str, ...]) -> tuple:
+    data = record.model_dump(mode="json")
+    # JSONB columns go through COPY as JSON text
+    return tuple(json.dumps(data[c]) if isinstance(data[c], list) else data[c] for c in columns)
+
+
+@router.post(
+    "/import",
+    response_model=ImportResult,
+    openapi_extra={"requestBody": {"required": True, "content": {"application/x-ndjson": {}}}},
+)
+async def import_records(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+):
+    """Import GET /admin/export output (optionally gzip-encoded) for the
+    calling user. Invalid lines fail the whole import with 422."""
+    staged = {"import_plans": [], "import_api_keys": []}
+    columns = {"import_plans": _PLAN_COLUMNS, "import_api_keys": _KEY_COLUMNS}
+    received = 0
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("CREATE TEMP TABLE import_plans (LIKE plans) ON COMMIT DROP")
+        await conn.exec_driver_sql(
+            "CREATE TEMP TABLE import_api_keys (LIKE api_keys) ON COMMIT DROP"
+        )
+        raw = await conn.get_raw_connection()
+
+        async def copy_staged() -> None:
+            async with raw.driver_connection.cursor() as cursor:
+                for table, rows in staged.items():
+                    if not rows:
+                        continue
+                    async with cursor.copy(
+                        f"COPY {table} ({', '.join(columns[table])}) FROM STDIN"
+                    ) as copy:
+                        for row in rows:
+                            await copy.write_row(row)
+                    rows.clear()
+
+        line_number = 0
+        async for line in _lines(request):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = _record.validate_json(line)
+            except ValidationError as exc:
+                raise HTTPException(
+                    status_code=422,
+                    detail={
+                        "line": line_number,
+                        "errors": exc.errors(
+                            include_url=False, include_context=False, include_input=False
+                        ),
+                    },
+                )
+            table = "import_plans" if isinstance(record, PlanRecord) else "import_api_keys"
+            staged[table].append(_copy_row(record, columns[table]))
+            received += 1
+            if received % IMPORT_BATCH_ROWS == 0:
+                await copy_staged()
+        await copy_staged()
+
+        params = {"user_id": current_user.id}
+        plans = (await conn.execute(_INSERT_PLANS, params)).rowcount
+        keys = (await conn.execute(_INSERT_KEYS, params)).rowcount
+        await conn.commit()
+
+    await request_stats.adjust(str(current_user.id), plans=plans, keys=keys)
+    logger.info(
+        "Plans and API keys imported",
+        extra={"user_id": str(current_user.id), "plans": plans, "api_keys": keys},
+    )
+    return ImportResult(plans=plans, api_keys=keys, skipped=received - plans - keys)
@@ -0,0 +1,70 @@
+import logging
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dependencies import get_db, require_admin
+from app.key_cache import publish_invalidations
+from app.models import ApiKey, Plan, User
+from app.principal_cache import publish_user_invalidation
+from app.rate_limiter import invalidate_plans
+from app.schemas import UserLimits
+
+logger = logging.getLogger(__name__)
+
+# Operator endpoints: tenants must not be able to raise their own pools, so
+# these take the admin API token rather than a user JWT.
+router = APIRouter(prefix="/admin/users", dependencies=[Depends(require_admin)])
+
+
+@router.get("/{user_id}/limits", response_model=UserLimits)
+async def get_user_limits(user_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserLimits(limits=user.limits)
+
+
+@router.put("/{user_id}/limits", response_model=UserLimits)
+async def set_user_limits(
+    user_id: uuid.UUID,
+    body: UserLimits,
+    db: AsyncSession = Depends(get_db),
+):
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.limits = [lim.model_dump() for lim in body.limits]
+    await db.commit()
+    # Right away here; other instances hear of it through the change feed
+    invalidate_plans(
+        str(plan_id)
+        for plan_id in (await db.execute(select(Plan.id).where(Plan.user_id == user_id))).scalars()
+    )
+    logger.info("User limits updated", extra={"user_id": str(user_id)})
+    return UserLimits(limits=user.limits)
+
+
+@router.delete("/{user_id}", status_code=204)
+async def delete_user(user_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    """Remove a user with their plans and keys; their tokens stop working
+    and their keys stop resolving on every instance."""
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    plan_ids = select(Plan.id).where(Plan.user_id == user_id)
+    key_hashes = (
+        await db.execute(
+            delete(ApiKey)
+            .where(or_(ApiKey.user_id == user_id, ApiKey.plan_id.in_(plan_ids)))
+            .returning(ApiKey.key_hash)
+        )
+    ).scalars().all()
+    await db.execute(delete(Plan).where(Plan.user_id == user_id))
+    await db.delete(user)
+    await db.commit()
+    await publish_user_invalidation(user_id)
+    await publish_invalidations(key_hashes)
+    logger.info("User deleted", extra={"user_id": str(user_id), "keys": len(key_hashes)})
@@ -1,23 +1,115 @@
 import uuid
 from datetime import datetime
+from typing import Annotated, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+
+Algorithm = Literal["fixed_window", "sliding_window", "gcra"]
+Period = Literal["second", "minute", "hour", "day", "month"]
+FailureMode = Literal["local", "open", "closed"]
+UsagePeriod = Literal["hour", "day"]
+
+
+class PlanLimit(BaseModel):
+    period: Period
+    limit: int = Field(ge=0)
+
+
+def _unique_periods(limits: list[PlanLimit] | None) -> list[PlanLimit] | None:
+    if limits is not None and len({lim.period for lim in limits}) != len(limits):
+        raise ValueError("at most one limit per period")
+    return limits
+
+
+def _plan_limits(limits: list[PlanLimit] | None) -> list[PlanLimit] | None:
+    if limits is not None and any(lim.period == "minute" for lim in limits):
+        raise ValueError("the per-minute limit is default_rpm")
+    return _unique_periods(limits)
+
+
+class PlanRoute(BaseModel):
+    """Cost and optional extra limits for requests matching method + path.
+
+    ``path`` may use ``{name}`` for one segment and a trailing ``*`` for any
+    remainder. Plan limits are charged ``cost`` units per matching request;
+    the route's own ``limits`` count matching requests.
+    """
+
+    method: str = "*"
+    path: str
+    cost: int = Field(1, ge=1)
+    limits: list[PlanLimit] = []
+
+    _check_limits = field_validator("limits")(_unique_periods)
+
+    @field_validator("method")
+    @classmethod
+    def _upper_method(cls, method: str) -> str:
+        return method.upper()
+
+    @field_validator("path")
+    @classmethod
+    def _check_path(cls, path: str) -> str:
+        segments = [s for s in path.split("/") if s]
+        if not path.startswith("/v1") or "*" in segments[:-1]:
+            raise ValueError("path must start with /v1 and may only end in '*'")
+        return path
+
+
+def _unique_routes(routes: list[PlanRoute] | None) -> list[PlanRoute] | None:
+    if routes is not None and len({(r.method, r.path) for r in routes}) != len(routes):
+        raise ValueError("duplicate method + path")
+    return routes
 
 
 class PlanCreate(BaseModel):
     name: str
     default_rpm: int
+    algorithm: Algorithm = "fixed_window"
+    # gcra only: requests admitted back to back; defaults to default_rpm
+    burst: int | None = Field(None, ge=1)
+    # Windows enforced in addition to default_rpm (the per-minute limit)
+    limits: list[PlanLimit] = []
+    routes: list[PlanRoute] = []
+    # Limits shared by all keys on the plan
+    pool_limits: list[PlanLimit] = []
+    # Requests per key in flight at once
+    max_concurrent: int | None = Field(None, ge=1)
+    # Behaviour while Redis is unreachable
+    failure_mode: FailureMode = "local"
+
+    _check_limits = field_validator("limits")(_plan_limits)
+    _check_routes = field_validator("routes")(_unique_routes)
+    _check_pool_limits = field_validator("pool_limits")(_unique_periods)
 
 
 class PlanUpdate(BaseModel):
     name: str | None = None
     default_rpm: int | None = None
+    algorithm: Algorithm | None = None
+    burst: int | None = Field(None, ge=1)
+    limits: list[PlanLimit] | None = None
+    routes: list[PlanRoute] | None = None
+    pool_limits: list[PlanLimit] | None = None
+    max_concurrent: int | None = Field(None, ge=1)
+    failure_mode: FailureMode | None = None
+
+    _check_limits = field_validator("limits")(_plan_limits)
+    _check_routes = field_validator("routes")(_unique_routes)
+    _check_pool_limits = field_validator("pool_limits")(_unique_periods)
 
 
 class PlanResponse(BaseModel):
     id: uuid.UUID
     name: str
     default_rpm: int
+    algorithm: Algorithm
+    burst: int | None
+    limits: list[PlanLimit] = []
+    routes: list[PlanRoute] = []
+    pool_limits: list[PlanLimit] = []
+    max_concurrent: int | None = None
+    failure_mode: FailureMode = "local"
     created_at: datetime
     key_count: int = 0
 
@@ -48,12 +140,104 @@ class ApiKeyCreatedResponse(ApiKeyResponse):
     plaintext_key: str
 
 
+# Keys one bulk request may create or change
+BULK_KEYS_MAX = 100_000
+
+
+class ApiKeyBulkCreate(BaseModel):
+    label: str
+    plan_id: uuid.UUID
+    count: int = Field(ge=1, le=BULK_KEYS_MAX)
+
+
+class ApiKeyBulkIds(BaseModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=BULK_KEYS_MAX)
+
+
+class ApiKeyBulkUpdate(ApiKeyBulkIds):
+    is_active: bool
+
+
+class ApiKeyBulkResult(BaseModel):
+    # The keys that were changed; ids that are unknown or not yours are skipped
+    ids: list[uuid.UUID]
+
+
+class PlanRecord(PlanCreate):
+    """A plan line of GET /admin/export and POST /admin/import."""
+
+    type: Literal["plan"] = "plan"
+    id: uuid.UUID
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class ApiKeyRecord(BaseModel):
+    """An API key line of the export: its hash, never a plaintext key."""
+
+    type: Literal["api_key"] = "api_key"
+    id: uuid.UUID
+    key_hash: str = Field(pattern=r"^[0-9a-f]{64}$")
+    label: str
+    plan_id: uuid.UUID
+    is_active: bool
+    created_at: datetime
+    last_used_at: datetime | None = None
+
+    model_config = {"from_attributes": True}
+
+
+ExportRecord = Annotated[PlanRecord | ApiKeyRecord, Field(discriminator="type")]
+
+
+class ImportResult(BaseModel):
+    plans: int
+    api_keys: int
+    # Records left out: the id, plan name or key already exists, or the
+    # key's plan is not one of yours
+    skipped: int
+
+
 class StatsResponse(BaseModel):
     total_plans: int
     total_keys: int
     requests_today: int
 
 
+class RouteUsage(BaseModel):
+    route: str
+    allowed: int
+    rejected: int
+
+
+class UsageBucket(BaseModel):
+    start: datetime
+    allowed: int
+    rejected: int
+    routes: list[RouteUsage]
+
+
+class UsageResponse(BaseModel):
+    """Every bucket in [start, end), including empty ones, oldest first."""
+
+    key_id: uuid.UUID
+    period: UsagePeriod
+    start: datetime
+    end: datetime
+    allowed: int
+    rejected: int
+    buckets: list[UsageBucket]
+
+
+class UserLimits(BaseModel):
+    """Quota pools shared by all of a user's keys (set with the admin API token)."""
+
+    limits: list[PlanLimit]
+
+    _check_limits = field_validator("limits")(_unique_periods)
+
+
 class UserCreate(BaseModel):
     email: str
     password: str
@@ -62,3 +246,28 @@ class UserCreate(BaseModel):
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
+
+
+class CheckRequest(BaseModel):
+    key: str
+    cost: int = Field(1, ge=1)
+
+
+class CheckBatchRequest(BaseModel):
+    checks: list[CheckRequest] = Field(min_length=1, max_length=1000)
+
+
+class CheckResult(BaseModel):
+    # The status /v1 would have answered with: 200, 401, 429 or 503
+    status: int
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int | None = None
+
+    model_config = {"from_attributes": True}
+
+
+class CheckBatchResponse(BaseModel):
+    results: list[CheckResult]
@@ -0,0 +1,43 @@
+"""Pluggable storage for rate limit counters.
+
+``LIMITER_BACKEND`` selects the implementation used by this process:
+
+- ``redis`` (default): one standalone Redis shared by every instance
+- ``redis_cluster``: Redis Cluster at ``REDIS_CLUSTER_URL``; each API key's
+  counters share a hash tag and so a slot
+- ``memory``: in-process counters for single-node deployments and tests
+"""
+from app.config import LIMITER_BACKEND, REDIS_CLUSTER_URL
+from app.storage.base import LeaseRequest, LeaseResult, LimiterBackend
+from app.storage.memory import MemoryBackend
+from app.storage.redis import RedisBackend
+
+__all__ = [
+    "LeaseRequest",
+    "LeaseResult",
+    "LimiterBackend",
+    "MemoryBackend",
+    "RedisBackend",
+    "create_backend",
+    "storage",
+]
+
+
+def create_backend(name: str) -> LimiterBackend:
+    if name == "memory":
+        return MemoryBackend()
+    if name == "redis":
+        from app.redis_client import redis_client
+
+        return RedisBackend(redis_client)
+    if name == "redis_cluster":
+        from redis.asyncio.cluster import RedisCluster
+
+        from app.storage.cluster import RedisClusterBackend
+
+        client = RedisCluster.from_url(REDIS_CLUSTER_URL, decode_responses=True)
+        return RedisClusterBackend(client, owns_client=True)
+    raise ValueError(f"Unknown LIMITER_BACKEND: {name!r}")
+
+
+storage = create_backend(LIMITER_BACKEND)
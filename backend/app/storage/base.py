@@ -0,0 +1,117 @@
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from app.algorithms import Charge, Decision
+
+
+@dataclass(frozen=True, slots=True)
+class LeaseRequest:
+    """Reserve up to ``want`` (at least ``need``) of a fixed window counter."""
+
+    key: str
+    limit: int
+    window_end: int  # ms
+    want: int
+    need: int
+
+
+@dataclass(frozen=True, slots=True)
+class LeaseResult:
+    allowed: bool
+    # index of the request that could not be covered when not allowed
+    failed: int = -1
+    # (granted, counter after the grant) per request when allowed
+    grants: tuple[tuple[int, int], ...] = ()
+
+
+class LimiterBackend(ABC):
+    """Where rate limit counters live.
+
+    Every method that changes more than one counter is atomic: either all of
+    its effects apply or none do, and no other call interleaves with it.
+    """
+
+    # Whether counters are shared between instances (and so key cache
+    # invalidations have to be broadcast)
+    shared = True
+
+    def key_prefix(self, key_id: str, tenant: str | None = None) -> str:
+        """Namespace for all of one API key's counters.
+
+        ``tenant`` (the plan owner, else the plan) groups keys whose counters
+        may be charged together with shared pools in one atomic call.
+        """
+        return f"rl:{key_id}:"
+
+    def pool_prefix(self, pool_id: str, tenant: str | None = None) -> str:
+        """Namespace for a quota pool shared by several keys of ``tenant``."""
+        return f"rl:{pool_id}:"
+
+    @abstractmethod
+    async def decide(
+        self,
+        charges: Sequence[Charge],
+        now_ms: int,
+        seen_key: str,
+    ) -> Decision:
+        """Check every charge and apply all of them, or none if any limit
+        would be exceeded. Also bumps the key's last-seen time."""
+
+    async def decide_many(
+        self,
+        requests: Sequence[tuple[Sequence[Charge], str]],
+        now_ms: int,
+    ) -> list[Decision]:
+        """``decide`` for each (charges, seen key) pair, in order."""
+        return [
+            await self.decide(charges, now_ms, seen_key)
+            for charges, seen_key in requests
+        ]
+
+    @abstractmethod
+    async def lease(
+        self,
+        requests: Sequence[LeaseRequest],
+        now_ms: int,
+        seen_key: str,
+    ) -> LeaseResult:
+        """Grant ``min(want, limit - count)`` of every request, or nothing if
+        any grant would fall short of ``need``."""
+
+    @abstractmethod
+    async def release(self, keys: Sequence[str], amounts: Sequence[int]) -> None:
+        """Hand unused leased quota back; counters never go below zero."""
+
+    @abstractmethod
+    async def acquire_slot(
+        self, key: str, lease_id: str, limit: int, now_ms: int, expire_at: int
+    ) -> bool:
+        """Hold one of ``limit`` concurrency slots in ``key`` until
+        ``expire_at`` (ms), dropping leases that expired by ``now_ms``;
+        False if all slots are taken."""
+
+    @abstractmethod
+    async def renew_slots(
+        self, leases: Sequence[tuple[str, str]], now_ms: int, expire_at: int
+    ) -> None:
+        """Extend held (key, lease id) slots to ``expire_at``; leases that
+        expired by ``now_ms`` stay gone."""
+
+    @abstractmethod
+    async def release_slot(self, key: str, lease_id: str) -> None:
+        """Free a slot before its lease expires."""
+
+    @abstractmethod
+    async def incr_window(self, key: str, ttl: int) -> int:
+        """Increment a counter that expires ``ttl`` seconds after creation."""
+
+    @abstractmethod
+    async def read_counters(self, keys: Sequence[str]) -> list[int]:
+        """Current value of each counter (0 if missing or expired)."""
+
+    async def load_scripts(self) -> None:
+        """Preload server-side scripts so the first requests don't pay for it."""
+
+    async def aclose(self) -> None:
+        pass
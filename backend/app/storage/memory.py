@@ -0,0 +1,216 @@
+"""In-process backend for single-node deployments and fast tests.
+
+Implements the same algorithms as the Redis scripts over a plain dict. The
+event loop runs each call to completion without awaiting, so every call is
+atomic with respect to other requests. Counters are not shared between
+processes.
+"""
+import math
+import time
+from collections.abc import Sequence
+
+from app.algorithms import (
+    BLOCKED,
+    LAST_SEEN_TTL,
+    Charge,
+    Decision,
+    blocks_everything,
+    window_args,
+)
+from app.storage.base import LeaseRequest, LeaseResult, LimiterBackend
+
+# Drop expired entries after this many writes
+SWEEP_EVERY = 10_000
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class MemoryBackend(LimiterBackend):
+    shared = False
+
+    def __init__(self):
+        # key -> [value, expire_at ms or None]
+        self._entries: dict[str, list] = {}
+        self._writes = 0
+        # slot set key -> {lease id: expire_at ms}
+        self._slots: dict[str, dict[str, int]] = {}
+
+    def _get(self, key: str, now_ms: int) -> float:
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0
+        if entry[1] is not None and entry[1] <= now_ms:
+            del self._entries[key]
+            return 0
+        return entry[0]
+
+    def _set(self, key: str, value: float, expire_at: int | None, now_ms: int) -> None:
+        self._entries[key] = [value, expire_at]
+        self._written(now_ms)
+
+    def _incrby(self, key: str, amount: int, now_ms: int) -> int:
+        """INCRBY; returns the new value (== amount when the key is new)."""
+        entry = self._entries.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= now_ms):
+            self._entries[key] = [amount, None]
+            self._written(now_ms)
+            return amount
+        entry[0] += amount
+        return entry[0]
+
+    def _written(self, now_ms: int) -> None:
+        self._writes += 1
+        if self._writes % SWEEP_EVERY == 0:
+            self._entries = {
+                k: e for k, e in self._entries.items() if e[1] is None or e[1] > now_ms
+            }
+
+    def _touch_seen(self, seen_key: str, now_ms: int) -> None:
+        self._set(seen_key, now_ms // 1000, now_ms + LAST_SEEN_TTL * 1000, now_ms)
+
+    async def decide(
+        self,
+        charges: Sequence[Charge],
+        now_ms: int,
+        seen_key: str,
+    ) -> Decision:
+        if blocks_everything(charges):
+            return BLOCKED
+        self._touch_seen(seen_key, now_ms)
+
+        now = now_ms
+        checks = []
+        binding = -1
+        denied = False
+        for i, charge in enumerate(charges):
+            keys, (algo, limit, window, burst, window_end) = window_args(
+                charge.limit, charge.prefix, now_ms
+            )
+            cost = charge.cost
+            new_tat = None
+            if algo == 1:
+                count = self._get(keys[0], now)
+                reset = window_end - now
+                allowed = count + cost <= limit
+                remaining = limit - count - cost
+                retry = reset
+            elif algo == 2:
+                cur = self._get(keys[0], now)
+                prev = self._get(keys[1], now)
+                reset = window_end - now
+                elapsed = window - reset
+                weighted = prev * reset / window + cur
+                allowed = weighted + cost <= limit
+                remaining = math.floor(limit - weighted - cost)
+                if cur == 0:
+                    retry = reset
+                elif cur + cost > limit:
+                    retry = reset + math.ceil(window * (1 - (limit - cost) / cur))
+                elif prev == 0:
+                    retry = reset  # allowed; only reachable when nothing is denied
+                else:
+                    retry = math.ceil(window - (limit - cur - cost) * window / prev) - elapsed
+            else:
+                interval = window / limit
+                tat = max(self._get(keys[0], now), now)
+                new_tat = tat + interval * cost
+                allow_at = new_tat - burst * interval
+                allowed = allow_at <= now
+                remaining = math.floor((now - allow_at) / interval)
+                reset = math.ceil(new_tat - now) if allowed else math.ceil(tat - now)
+                retry = math.ceil(allow_at - now)
+            checks.append((keys[0], algo, window, window_end, cost, new_tat, remaining, retry, reset))
+
+            if allowed:
+                if not denied and (binding < 0 or remaining < checks[binding][6]):
+                    binding = i
+            elif not denied or retry > checks[binding][7]:
+                denied = True
+                binding = i
+
+        b = checks[binding]
+        limit = charges[binding].limit.limit
+        if denied:
+            return Decision(False, limit, 0, b[8] / 1000, max(b[7], 1) / 1000, binding)
+
+        for key, algo, window, window_end, cost, new_tat, *_ in checks:
+            if algo == 3:
+                self._set(key, new_tat, now + math.ceil(new_tat - now), now)
+            elif self._incrby(key, cost, now) == cost:
+                expire_at = window_end + window if algo == 2 else window_end
+                self._entries[key][1] = expire_at
+        return Decision(True, limit, max(b[6], 0), b[8] / 1000, 0.0, binding)
+
+    async def lease(
+        self,
+        requests: Sequence[LeaseRequest],
+        now_ms: int,
+        seen_key: str,
+    ) -> LeaseResult:
+        self._touch_seen(seen_key, now_ms)
+
+        counts = [self._get(r.key, now_ms) for r in requests]
+        grants = [min(r.want, r.limit - count) for r, count in zip(requests, counts)]
+        for i, (r, grant) in enumerate(zip(requests, grants)):
+            if grant < r.need:
+                return LeaseResult(False, failed=i)
+
+        result = []
+        for r, grant, count in zip(requests, grants, counts):
+            if grant > 0:
+                count = self._incrby(r.key, grant, now_ms)
+                if count == grant:
+                    self._entries[r.key][1] = r.window_end
+            result.append((grant, int(count)))
+        return LeaseResult(True, grants=tuple(result))
+
+    async def release(self, keys: Sequence[str], amounts: Sequence[int]) -> None:
+        now_ms = _now_ms()
+        for key, amount in zip(keys, amounts):
+            unused = min(amount, self._get(key, now_ms))
+            if unused > 0:
+                self._entries[key][0] -= unused
+
+    async def acquire_slot(
+        self, key: str, lease_id: str, limit: int, now_ms: int, expire_at: int
+    ) -> bool:
+        leases = self._slots.setdefault(key, {})
+        for held, held_until in list(leases.items()):
+            if held_until <= now_ms:
+                del leases[held]
+        if len(leases) >= limit:
+            return False
+        leases[lease_id] = expire_at
+        return True
+
+    async def renew_slots(
+        self, leases: Sequence[tuple[str, str]], now_ms: int, expire_at: int
+    ) -> None:
+        for key, lease_id in leases:
+            held = self._slots.get(key)
+            if held is not None and held.get(lease_id, 0) > now_ms:
+                held[lease_id] = expire_at
+
+    async def release_slot(self, key: str, lease_id: str) -> None:
+        held = self._slots.get(key)
+        if held is not None:
+            held.pop(lease_id, None)
+            if not held:
+                del self._slots[key]
+
+    async def incr_window(self, key: str, ttl: int) -> int:
+        now_ms = _now_ms()
+        count = self._incrby(key, 1, now_ms)
+        if count == 1:
+            self._entries[key][1] = now_ms + ttl * 1000
+        return count
+
+    async def read_counters(self, keys: Sequence[str]) -> list[int]:
+        now_ms = _now_ms()
+        return [int(self._get(key, now_ms)) for key in keys]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._slots.clear()
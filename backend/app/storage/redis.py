@@ -0,0 +1,349 @@
+"""Standalone Redis backend: every operation is one registered Lua script."""
+from collections.abc import Sequence
+
+import redis.asyncio as aioredis
+from redis.exceptions import NoScriptError
+
+from app.algorithms import (
+    BLOCKED,
+    LAST_SEEN_TTL,
+    Charge,
+    Decision,
+    blocks_everything,
+    window_args,
+)
+from app.storage.base import LeaseRequest, LeaseResult, LimiterBackend
+
+# KEYS: last-seen key, then each limit's state keys (fixed: current window;
+#   sliding: current + previous window; gcra: TAT).
+# ARGV: now (ms), last-seen ttl, number of limits, then per
+#   limit: algorithm code, limit, window (ms), burst, window end (ms), cost.
+# Returns {allowed, binding limit index (1-based), remaining,
+#   reset_after_ms, retry_after_ms} for the most restrictive limit.
+DECISION_SCRIPT = """
+local now = tonumber(ARGV[1])
+local n = tonumber(ARGV[3])
+redis.call('SET', KEYS[1], math.floor(now / 1000), 'EX', ARGV[2])
+
+local k = 2
+local checks = {}
+local binding = 0
+local denied = false
+for i = 1, n do
+  local a = 3 + (i - 1) * 6
+  local algo = tonumber(ARGV[a + 1])
+  local limit = tonumber(ARGV[a + 2])
+  local window = tonumber(ARGV[a + 3])
+  local burst = tonumber(ARGV[a + 4])
+  local window_end = tonumber(ARGV[a + 5])
+  local cost = tonumber(ARGV[a + 6])
+  local c = {key = KEYS[k], algo = algo, window = window, window_end = window_end, cost = cost}
+  if algo == 1 then
+    local count = tonumber(redis.call('GET', c.key) or '0')
+    c.reset = window_end - now
+    c.allowed = count + cost <= limit
+    c.remaining = limit - count - cost
+    c.retry = c.reset
+    k = k + 1
+  elseif algo == 2 then
+    local cur = tonumber(redis.call('GET', c.key) or '0')
+    local prev = tonumber(redis.call('GET', KEYS[k + 1]) or '0')
+    c.reset = window_end - now
+    local elapsed = window - c.reset
+    local weighted = prev * c.reset / window + cur
+    c.allowed = weighted + cost <= limit
+    c.remaining = math.floor(limit - weighted - cost)
+    if cur == 0 then
+      c.retry = c.reset
+    elseif cur + cost > limit then
+      -- wait for the next window, then for this window's weight to decay
+      c.retry = c.reset + math.ceil(window * (1 - (limit - cost) / cur))
+    else
+      c.retry = math.ceil(window - (limit - cur - cost) * window / prev) - elapsed
+    end
+    k = k + 2
+  else
+    local interval = window / limit
+    local tat = tonumber(redis.call('GET', c.key) or '0')
+    if tat < now then tat = now end
+    c.new_tat = tat + interval * cost
+    local allow_at = c.new_tat - burst * interval
+    c.allowed = allow_at <= now
+    c.remaining = math.floor((now - allow_at) / interval)
+    c.reset = math.ceil(c.new_tat - now)
+    c.retry = math.ceil(allow_at - now)
+    if not c.allowed then c.reset = math.ceil(tat - now) end
+    k = k + 1
+  end
+  checks[i] = c
+  if c.allowed then
+    if not denied and (binding == 0 or c.remaining < checks[binding].remaining) then
+      binding = i
+    end
+  elseif not denied or c.retry > checks[binding].retry then
+    denied = true
+    binding = i
+  end
+end
+
+local b = checks[binding]
+if denied then
+  return {0, binding, 0, b.reset, math.max(b.retry, 1)}
+end
+
+for i = 1, n do
+  local c = checks[i]
+  if c.algo == 3 then
+    redis.call('SET', c.key, c.new_tat, 'PX', math.ceil(c.new_tat - now))
+  elseif redis.call('INCRBY', c.key, c.cost) == c.cost then
+    local expire_at = c.window_end
+    -- a sliding window counter is read as "previous window" one more window
+    if c.algo == 2 then expire_at = expire_at + c.window end
+    redis.call('PEXPIREAT', c.key, expire_at)
+  end
+end
+return {1, binding, math.max(b.remaining, 0), b.reset, 0}
+"""
+
+# KEYS: last-seen key, one window counter per lease.
+# ARGV: now (ms), last-seen ttl, number of leases, then per lease: limit,
+#   window end (ms), slice wanted, minimum needed.
+# Grants min(wanted, limit - count) of every lease, or nothing if any grant
+# would fall short of its minimum. Returns {allowed, failed lease index,
+# then per lease: granted, counter after the grant}.
+LEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local n = tonumber(ARGV[3])
+redis.call('SET', KEYS[1], math.floor(now / 1000), 'EX', ARGV[2])
+
+local grants = {}
+local counts = {}
+for i = 1, n do
+  local a = 3 + (i - 1) * 4
+  local limit = tonumber(ARGV[a + 1])
+  local want = tonumber(ARGV[a + 3])
+  local need = tonumber(ARGV[a + 4])
+  local count = tonumber(redis.call('GET', KEYS[i + 1]) or '0')
+  local grant = math.min(want, limit - count)
+  if grant < need then
+    return {0, i}
+  end
+  grants[i] = grant
+  counts[i] = count
+end
+
+local result = {1, 0}
+for i = 1, n do
+  local count = counts[i]
+  if grants[i] > 0 then
+    count = redis.call('INCRBY', KEYS[i + 1], grants[i])
+    if count == grants[i] then
+      redis.call('PEXPIREAT', KEYS[i + 1], ARGV[3 + (i - 1) * 4 + 2])
+    end
+  end
+  result[#result + 1] = grants[i]
+  result[#result + 1] = count
+end
+return result
+"""
+
+# KEYS: window counters. ARGV: the unused amount of each lease. A counter
+# that has already expired (window over) is left alone.
+RELEASE_SCRIPT = """
+for i = 1, #KEYS do
+  local count = tonumber(redis.call('GET', KEYS[i]) or '0')
+  local unused = math.min(tonumber(ARGV[i]), count)
+  if unused > 0 then redis.call('DECRBY', KEYS[i], unused) end
+end
+return 0
+"""
+
+# KEYS: sorted set of lease ids scored by expiry (ms).
+# ARGV: now (ms), lease id, limit, lease expiry (ms).
+# Returns 1 if the lease was added, 0 if every slot is taken.
+SLOT_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local expire_at = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then return 0 end
+redis.call('ZADD', KEYS[1], expire_at, ARGV[2])
+if redis.call('PTTL', KEYS[1]) < expire_at - now then
+  redis.call('PEXPIREAT', KEYS[1], expire_at)
+end
+return 1
+"""
+
+# KEYS: slot sets. ARGV: now (ms), new expiry (ms), then one lease id per key.
+# Only leases that have not expired are extended. As on acquire, a set's TTL
+# only grows: another lease in it may outlive this one.
+SLOT_RENEW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local expire_at = tonumber(ARGV[2])
+for i = 1, #KEYS do
+  redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now)
+  if redis.call('ZADD', KEYS[i], 'XX', 'CH', expire_at, ARGV[i + 2]) == 1
+      and redis.call('PTTL', KEYS[i]) < expire_at - now then
+    redis.call('PEXPIREAT', KEYS[i], expire_at)
+  end
+end
+return 0
+"""
+
+# KEYS: counter. ARGV: increment, ttl (s) set when the counter is created.
+INCR_SCRIPT = """
+local count = redis.call('INCRBY', KEYS[1], ARGV[1])
+if count == tonumber(ARGV[1]) then redis.call('EXPIRE', KEYS[1], ARGV[2]) end
+return count
+"""
+
+
+class RedisBackend(LimiterBackend):
+    def __init__(self, client: aioredis.Redis, owns_client: bool = False):
+        self.client = client
+        self.owns_client = owns_client
+        # Registered scripts run via EVALSHA and reload themselves on NOSCRIPT.
+        self.decision_script = client.register_script(DECISION_SCRIPT)
+        self.lease_script = client.register_script(LEASE_SCRIPT)
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+        self.incr_script = client.register_script(INCR_SCRIPT)
+        self.slot_acquire_script = client.register_script(SLOT_ACQUIRE_SCRIPT)
+        self.slot_renew_script = client.register_script(SLOT_RENEW_SCRIPT)
+
+    def _scripts(self):
+        return (
+            self.decision_script,
+            self.lease_script,
+            self.release_script,
+            self.incr_script,
+            self.slot_acquire_script,
+            self.slot_renew_script,
+        )
+
+    async def decide(
+        self,
+        charges: Sequence[Charge],
+        now_ms: int,
+        seen_key: str,
+    ) -> Decision:
+        if blocks_everything(charges):
+            return BLOCKED
+        keys, args = self._decision_args(charges, now_ms, seen_key)
+        result = await self.decision_script(keys=keys, args=args)
+        return self._decision(charges, result)
+
+    async def decide_many(
+        self,
+        requests: Sequence[tuple[Sequence[Charge], str]],
+        now_ms: int,
+    ) -> list[Decision]:
+        """All decisions in one pipelined round trip (EVALSHA per request)."""
+        calls = []
+        for charges, seen_key in requests:
+            if not blocks_everything(charges):
+                calls.append(self._decision_args(charges, now_ms, seen_key))
+
+        async def run() -> list:
+            # execute() empties the pipeline, so each attempt queues afresh
+            pipe = self.client.pipeline(transaction=False)
+            for keys, args in calls:
+                pipe.evalsha(self.decision_script.sha, len(keys), *keys, *args)
+            return await pipe.execute(raise_on_error=False)
+
+        results = []
+        if calls:
+            results = await run()
+            if isinstance(results[0], NoScriptError):
+                # Nothing ran (the script is gone, e.g. after SCRIPT FLUSH or a
+                # failover); load it and replay the batch.
+                await self.client.script_load(DECISION_SCRIPT)
+                results = await run()
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+
+        results = iter(results)
+        return [
+            BLOCKED if blocks_everything(charges) else self._decision(charges, next(results))
+            for charges, _ in requests
+        ]
+
+    @staticmethod
+    def _decision_args(charges: Sequence[Charge], now_ms: int, seen_key: str) -> tuple[list, list]:
+        keys = [seen_key]
+        args = [now_ms, LAST_SEEN_TTL, len(charges)]
+        for charge in charges:
+            limit_keys, limit_args = window_args(charge.limit, charge.prefix, now_ms)
+            keys.extend(limit_keys)
+            args.extend(limit_args)
+            args.append(charge.cost)
+        return keys, args
+
+    @staticmethod
+    def _decision(charges: Sequence[Charge], result: list) -> Decision:
+        allowed, binding, remaining, reset_ms, retry_ms = result
+        return Decision(
+            allowed=bool(allowed),
+            limit=charges[binding - 1].limit.limit,
+            remaining=remaining,
+            reset_after=reset_ms / 1000,
+            retry_after=retry_ms / 1000,
+            binding=binding - 1,
+        )
+
+    async def lease(
+        self,
+        requests: Sequence[LeaseRequest],
+        now_ms: int,
+        seen_key: str,
+    ) -> LeaseResult:
+        keys = [seen_key, *(r.key for r in requests)]
+        args = [now_ms, LAST_SEEN_TTL, len(requests)]
+        for r in requests:
+            args.extend([r.limit, r.window_end, r.want, r.need])
+        result = await self.lease_script(keys=keys, args=args)
+
+        if not result[0]:
+            return LeaseResult(False, failed=result[1] - 1)
+        grants = tuple(
+            (result[2 + i * 2], result[3 + i * 2]) for i in range(len(requests))
+        )
+        return LeaseResult(True, grants=grants)
+
+    async def release(self, keys: Sequence[str], amounts: Sequence[int]) -> None:
+        if keys:
+            await self.release_script(keys=list(keys), args=list(amounts))
+
+    async def acquire_slot(
+        self, key: str, lease_id: str, limit: int, now_ms: int, expire_at: int
+    ) -> bool:
+        return bool(
+            await self.slot_acquire_script(keys=[key], args=[now_ms, lease_id, limit, expire_at])
+        )
+
+    async def renew_slots(
+        self, leases: Sequence[tuple[str, str]], now_ms: int, expire_at: int
+    ) -> None:
+        if leases:
+            await self.slot_renew_script(
+                keys=[key for key, _ in leases],
+                args=[now_ms, expire_at, *(lease_id for _, lease_id in leases)],
+            )
+
+    async def release_slot(self, key: str, lease_id: str) -> None:
+        await self.client.zrem(key, lease_id)
+
+    async def incr_window(self, key: str, ttl: int) -> int:
+        return await self.incr_script(keys=[key], args=[1, ttl])
+
+    async def read_counters(self, keys: Sequence[str]) -> list[int]:
+        if not keys:
+            return []
+        return [int(float(v)) if v is not None else 0 for v in await self.client.mget(keys)]
+
+    async def load_scripts(self) -> None:
+        for script in self._scripts():
+            await self.client.script_load(script.script)
+
+    async def aclose(self) -> None:
+        if self.owns_client:
+            await self.client.aclose()
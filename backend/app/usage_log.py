@@ -0,0 +1,413 @@
+"""Usage metering: per-request events into a partitioned Postgres ``usage_log``.
+
+The request path never touches Postgres. ``UsageRecorder.record`` appends
+to an in-process buffer that is flushed to a Redis Stream every
+``USAGE_FLUSH_INTERVAL`` seconds in pipelined XADDs. ``UsageIngester``
+reads the stream as a member of a consumer group, so any number of
+instances share the work, and writes each batch with COPY into a staging
+table and one INSERT ... ON CONFLICT DO NOTHING into ``usage_log``.
+Entries are acknowledged (and deleted) only after the batch commits, and
+each event's id (stream entry id and position) is part of the primary key,
+so a batch redelivered after a crash is not counted twice.
+
+``usage_log`` is range-partitioned by day (``usage_log_YYYYMMDD``);
+partitions are created on demand and dropped once they are older than
+``USAGE_LOG_RETENTION_DAYS``.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections.abc import Iterable
+from datetime import date, datetime, timedelta, timezone
+from datetime import time as dt_time
+
+from redis.exceptions import ResponseError
+from sqlalchemy import text
+
+from app.config import (
+    USAGE_BATCH_SIZE,
+    USAGE_BUFFER_SIZE,
+    USAGE_FLUSH_INTERVAL,
+    USAGE_LOG_ENABLED,
+    USAGE_LOG_RETENTION_DAYS,
+    USAGE_STREAM_KEY,
+    USAGE_STREAM_MAXLEN,
+)
+from app.database import engine
+from app.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_GROUP = "usage-log"
+# Events packed into one stream entry, and entries per pipelined XADD round trip
+EVENTS_PER_ENTRY = 100
+XADD_CHUNK_SIZE = 1000
+# Entries delivered to a consumer that has not acknowledged them for this
+# long (it crashed or hung) are claimed by another one.
+CLAIM_IDLE_MS = 60_000
+# Seconds between passes that reclaim abandoned entries and drop expired
+# partitions
+MAINTENANCE_INTERVAL = 60
+
+DAY_MS = 86_400_000
+_EPOCH = date(1970, 1, 1)
+# Routes are request paths; keep them from breaking the COPY text format
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def partition_name(day: date) -> str:
+    return f"usage_log_{day:%Y%m%d}"
+
+
+class UsageRecorder:
+    """Buffers usage events in memory and appends them to the stream in bulk.
+
+    ``record`` is a list append; when the buffer is full (Redis has been
+    unreachable for a while) new events are dropped and counted. Each
+    stream entry carries up to ``events_per_entry`` events as lines in
+    COPY text format, so neither side pays per-event stream overhead.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        stream: str,
+        maxlen: int,
+        interval: float,
+        max_buffer: int,
+        events_per_entry: int = EVENTS_PER_ENTRY,
+        client=redis_client,
+    ):
+        self.enabled = enabled
+        self.stream = stream
+        self.maxlen = maxlen  # events
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.events_per_entry = events_per_entry
+        self.client = client
+        self.recorded = 0
+        self.dropped = 0
+        self.sent = 0
+        self._buffer: list[tuple[str, str, int, bool, int]] = []
+
+    def record(self, key_id: str, route: str, ts: float, allowed: bool, cost: int) -> None:
+        if not self.enabled:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append((key_id, route, int(ts * 1000), allowed, cost))
+        self.recorded += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    async def flush(self) -> int:
+        if not self._buffer:
+            return 0
+        batch, self._buffer = self._buffer, []
+        per_entry = self.events_per_entry
+        chunk = XADD_CHUNK_SIZE * per_entry
+        maxlen = max(1, self.maxlen // per_entry)
+        sent = 0
+        try:
+            for i in range(0, len(batch), chunk):
+                events = batch[i : i + chunk]
+                lines = [
+                    f"{key_id}\t{route.translate(_COPY_ESCAPES)}\t{ts_ms}\t{int(allowed)}\t{cost}"
+                    for key_id, route, ts_ms, allowed, cost in events
+                ]
+                pipe = self.client.pipeline(transaction=False)
+                for j in range(0, len(lines), per_entry):
+                    pipe.xadd(
+                        self.stream,
+                        {"e": "\n".join(lines[j : j + per_entry])},
+                        maxlen=maxlen,
+                        approximate=True,
+                    )
+                await pipe.execute()
+                sent += len(events)
+        except Exception:
+            # Keep what was not sent, oldest first, within the buffer bound
+            unsent = batch[sent:]
+            room = self.max_buffer - len(self._buffer)
+            self.dropped += max(0, len(unsent) - room)
+            self._buffer[:0] = unsent[:room]
+            raise
+        finally:
+            self.sent += sent
+        return sent
+
+    async def run(self) -> None:
+        """Flush every ``interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Usage event flush failed", extra={"pending": self.pending})
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "recorded": self.recorded,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "buffered": self.pending,
+        }
+
+
+def _parse_line(line: str) -> int | None:
+    """The event's timestamp (ms) if ``line`` is a well-formed event."""
+    parts = line.split("\t")
+    if len(parts) != 5 or parts[3] not in ("0", "1") or not parts[4].isdigit():
+        return None
+    try:
+        uuid.UUID(parts[0])
+        return int(parts[2])
+    except ValueError:
+        return None
+
+
+class UsageIngester:
+    """Consumer group worker: stream entries -> ``usage_log`` in COPY batches."""
+
+    def __init__(
+        self,
+        stream: str,
+        batch_size: int,
+        retention_days: int,
+        group: str = CONSUMER_GROUP,
+        consumer: str | None = None,
+        client=redis_client,
+    ):
+        self.stream = stream
+        self.batch_size = batch_size  # events, approximately
+        self.retention_days = retention_days
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.client = client
+        self.ingested = 0
+        self.duplicates = 0
+        self.malformed = 0
+        self.expired = 0
+        self.batches = 0
+        self.partitions_dropped = 0
+        # Commit time minus the oldest event's timestamp, for the last batch
+        self.last_lag_ms = 0
+        self.max_lag_ms = 0
+        self.last_batch_rows_per_s = 0.0
+        self._partitions: set[date] = set()
+
+    @property
+    def _entries_per_read(self) -> int:
+        return max(1, self.batch_size // EVENTS_PER_ENTRY)
+
+    async def ensure_group(self) -> None:
+        try:
+            await self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def ingest_once(self, block_ms: int | None = None) -> int:
+        """Write one batch of new entries; returns the number of entries handled."""
+        response = await self.client.xreadgroup(
+            self.group,
+            self.consumer,
+            {self.stream: ">"},
+            count=self._entries_per_read,
+            block=block_ms,
+        )
+        entries = response[0][1] if response else []
+        await self.write(entries)
+        return len(entries)
+
+    async def reclaim(self, min_idle_ms: int = CLAIM_IDLE_MS) -> int:
+        """Take over and write entries other consumers left unacknowledged."""
+        handled = 0
+        start = "0-0"
+        while True:
+            result = await self.client.xautoclaim(
+                self.stream,
+                self.group,
+                self.consumer,
+                min_idle_ms,
+                start,
+                count=self._entries_per_read,
+            )
+            start, entries = result[0], result[1]
+            await self.write(entries)
+            handled += len(entries)
+            if start == "0-0":
+                return handled
+
+    async def write(self, entries: list[tuple[str, dict | None]]) -> None:
+        """Load ``entries`` into usage_log, then acknowledge and delete them."""
+        if not entries:
+            return
+        started = time.time()
+        lines, days, oldest_ms = self._copy_lines(entries, started)
+        if lines:
+            inserted = await self._copy(lines, days)
+            self.ingested += inserted
+            self.duplicates += len(lines) - inserted
+            done = time.time()
+            self.last_lag_ms = max(0, int(done * 1000) - oldest_ms)
+            self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+            self.last_batch_rows_per_s = round(len(lines) / max(done - started, 1e-6), 1)
+        ids = [entry_id for entry_id, _ in entries]
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xack(self.stream, self.group, *ids)
+        pipe.xdel(self.stream, *ids)
+        await pipe.execute()
+        self.batches += 1
+
+    def _copy_lines(
+        self, entries: list[tuple[str, dict | None]], now: float
+    ) -> tuple[list[str], set[date], int]:
+        """Staging table rows for every valid event, the days they fall on
+        and the oldest timestamp (ms)."""
+        cutoff = self._cutoff(now)
+        cutoff_ms = (
+            int(datetime.combine(cutoff, dt_time(), timezone.utc).timestamp() * 1000)
+            if cutoff is not None
+            else 0
+        )
+        lines = []
+        day_numbers = set()
+        oldest_ms = int(now * 1000)
+        for entry_id, fields in entries:
+            # No fields: deleted before it could be claimed
+            payload = fields.get("e") if fields else None
+            if not payload:
+                self.malformed += 1
+                continue
+            for n, line in enumerate(payload.split("\n")):
+                ts_ms = _parse_line(line)
+                if ts_ms is None:
+                    self.malformed += 1
+                    continue
+                if ts_ms < cutoff_ms:
+                    # Its partition is gone or about to be; don't recreate it
+                    self.expired += 1
+                    continue
+                # The entry id plus position makes redelivered events collide
+                lines.append(f"{entry_id}.{n}\t{line}\n")
+                day_numbers.add(ts_ms // DAY_MS)
+                oldest_ms = min(oldest_ms, ts_ms)
+        days = {_EPOCH + timedelta(days=d) for d in day_numbers}
+        return lines, days, oldest_ms
+
+    async def _copy(self, lines: list[str], days: set[date]) -> int:
+        async with engine.connect() as conn:
+            created = await self._ensure_partitions(conn, days)
+            await conn.exec_driver_sql(
+                "CREATE TEMP TABLE IF NOT EXISTS usage_log_staging ("
+                "event_id text, key_id uuid, route text, ts_ms bigint, allowed boolean, "
+                "cost integer) ON COMMIT DELETE ROWS"
+            )
+            raw = await conn.get_raw_connection()
+            async with raw.driver_connection.cursor() as cursor:
+                async with cursor.copy("COPY usage_log_staging FROM STDIN") as copy:
+                    await copy.write("".join(lines))
+            result = await conn.exec_driver_sql(
+                "INSERT INTO usage_log (ts, event_id, key_id, route, allowed, cost) "
+                "SELECT to_timestamp(ts_ms / 1000.0), event_id, key_id, route, allowed, cost "
+                "FROM usage_log_staging ON CONFLICT DO NOTHING"
+            )
+            await conn.commit()
+        self._partitions.update(created)
+        return result.rowcount
+
+    async def _ensure_partitions(self, conn, days: Iterable[date]) -> list[date]:
+        """Create the daily partitions this batch needs, in its transaction."""
+        missing = sorted(set(days) - self._partitions)
+        if not missing:
+            return []
+        # Serialise with other ingesters creating the same partition
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('usage_log_partitions'))"))
+        for day in missing:
+            await conn.exec_driver_sql(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF usage_log "
+                f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') "
+                f"TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+            )
+        return missing
+
+    def _cutoff(self, now: float) -> date | None:
+        if self.retention_days <= 0:
+            return None
+        return datetime.fromtimestamp(now, timezone.utc).date() - timedelta(days=self.retention_days)
+
+    async def drop_expired_partitions(self, now: float | None = None) -> list[str]:
+        """Drop daily partitions entirely older than the retention period."""
+        cutoff = self._cutoff(time.time() if now is None else now)
+        if cutoff is None:
+            return []
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = 'usage_log'"
+                )
+            )
+            expired = []
+            for (name,) in result:
+                try:
+                    day = datetime.strptime(name.removeprefix("usage_log_"), "%Y%m%d").date()
+                except ValueError:
+                    continue
+                if day < cutoff:
+                    expired.append((day, name))
+            for day, name in sorted(expired):
+                await conn.exec_driver_sql(f"DROP TABLE IF EXISTS {name}")
+                self._partitions.discard(day)
+            await conn.commit()
+        self.partitions_dropped += len(expired)
+        if expired:
+            logger.info("Dropped usage_log partitions", extra={"partitions": len(expired)})
+        return [name for _, name in sorted(expired)]
+
+    async def run(self) -> None:
+        """Ingest until cancelled, with a maintenance pass every
+        MAINTENANCE_INTERVAL seconds."""
+        last_maintenance = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                    await self.ensure_group()
+                    await self.reclaim()
+                    await self.drop_expired_partitions()
+                    last_maintenance = time.monotonic()
+                await self.ingest_once(block_ms=1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Usage ingestion failed")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "ingested": self.ingested,
+            "duplicates": self.duplicates,
+            "malformed": self.malformed,
+            "expired": self.expired,
+            "batches": self.batches,
+            "last_lag_ms": self.last_lag_ms,
+            "max_lag_ms": self.max_lag_ms,
+            "last_batch_rows_per_s": self.last_batch_rows_per_s,
+            "partitions_dropped": self.partitions_dropped,
+        }
+
+
+usage_recorder = UsageRecorder(
+    USAGE_LOG_ENABLED, USAGE_STREAM_KEY, USAGE_STREAM_MAXLEN, USAGE_FLUSH_INTERVAL, USAGE_BUFFER_SIZE
+)
+usage_ingester = UsageIngester(USAGE_STREAM_KEY, USAGE_BATCH_SIZE, USAGE_LOG_RETENTION_DAYS)
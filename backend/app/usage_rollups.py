@@ -0,0 +1,262 @@
+"""Per-key, per-route hourly and daily request counts for GET /admin/usage.
+
+Three stages, none of which scans raw events:
+
+1. ``record`` bumps an in-process counter per (key, route, hour); no I/O.
+2. Every ``interval`` seconds the counters are added to Redis hashes, one
+   per key and bucket (``{ns}:hour:{start}:{key_id}`` and
+   ``{ns}:day:{start}:{key_id}``, fields ``a:{route}`` and ``r:{route}``),
+   in one pipelined round trip. A set per bucket lists the keys it has.
+   Everything expires a couple of buckets after it closes.
+3. Every ``fold_interval`` seconds one instance (under a Redis lock) folds
+   buckets that closed more than ``grace`` seconds ago into the
+   ``usage_rollups`` table and advances ``{ns}:folded:{period}``.
+
+Reads come from Postgres up to the folded mark and from the Redis hashes
+after it, so the current hour and day are live to within ``interval``.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Sequence
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import (
+    USAGE_ROLLUP_FLUSH_INTERVAL,
+    USAGE_ROLLUP_FOLD_INTERVAL,
+    USAGE_ROLLUP_GRACE,
+)
+from app.database import AsyncSessionLocal
+from app.models import UsageRollup
+from app.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Bucket sizes in seconds; buckets start at multiples of these (UTC)
+PERIODS = {"hour": 3600, "day": 86400}
+# Rows per upsert statement; six bind params per row
+FOLD_CHUNK_SIZE = 5000
+# A fold that hasn't finished in this long is presumed dead
+FOLD_LOCK_TTL_MS = 300_000
+
+
+def bucket_start(ts: float, period: str) -> int:
+    size = PERIODS[period]
+    return int(ts) // size * size
+
+
+def _add_fields(counts: dict[str, list[int]], fields: dict[str, str]) -> None:
+    for field, value in fields.items():
+        kind, _, route = field.partition(":")
+        counts[route][0 if kind == "a" else 1] += int(value)
+
+
+class UsageRollups:
+    def __init__(
+        self,
+        interval: float,
+        fold_interval: float,
+        grace: float,
+        namespace: str = "usage",
+        client=redis_client,
+    ):
+        self.interval = interval
+        self.fold_interval = fold_interval
+        self.grace = grace
+        self.namespace = namespace
+        self.client = client
+        self.flushes = 0
+        self.folded_buckets = 0
+        self.folded_rows = 0
+        # (key id, route, hour start) -> [allowed, rejected]
+        self._counts: dict[tuple[str, str, int], list[int]] = {}
+
+    def record(self, key_id: str, route: str, ts: float, allowed: bool) -> None:
+        slot = (key_id, route, int(ts) // 3600 * 3600)
+        counts = self._counts.get(slot)
+        if counts is None:
+            counts = self._counts[slot] = [0, 0]
+        counts[0 if allowed else 1] += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._counts)
+
+    def _hash(self, period: str, start: int, key_id: str) -> str:
+        return f"{self.namespace}:{period}:{start}:{key_id}"
+
+    def _members(self, period: str, start: int) -> str:
+        return f"{self.namespace}:keys:{period}:{start}"
+
+    def _ttl(self, period: str) -> int:
+        # Long enough to be folded, even if folding stalls for a while
+        return int(2 * PERIODS[period] + self.grace + 86400)
+
+    async def flush(self) -> int:
+        if not self._counts:
+            return 0
+        batch, self._counts = self._counts, {}
+        pipe = self.client.pipeline(transaction=False)
+        touched: set[tuple[str, int, str]] = set()
+        for (key_id, route, hour), (allowed, rejected) in batch.items():
+            for period in PERIODS:
+                start = bucket_start(hour, period)
+                name = self._hash(period, start, key_id)
+                if allowed:
+                    pipe.hincrby(name, f"a:{route}", allowed)
+                if rejected:
+                    pipe.hincrby(name, f"r:{route}", rejected)
+                touched.add((period, start, key_id))
+        for period, start, key_id in touched:
+            ttl = self._ttl(period)
+            pipe.expire(self._hash(period, start, key_id), ttl)
+            pipe.sadd(self._members(period, start), key_id)
+            pipe.expire(self._members(period, start), ttl)
+        try:
+            await pipe.execute()
+        except Exception:
+            # Merge the batch back; a partly applied pipeline may count some
+            # requests twice, which beats losing them.
+            for slot, (allowed, rejected) in batch.items():
+                counts = self._counts.setdefault(slot, [0, 0])
+                counts[0] += allowed
+                counts[1] += rejected
+            raise
+        self.flushes += 1
+        return len(batch)
+
+    async def fold(self, now: float | None = None) -> int:
+        """Fold every bucket closed for ``grace`` seconds into Postgres; returns
+        the rows written. A no-op if another instance is folding."""
+        now = time.time() if now is None else now
+        lock = f"{self.namespace}:fold:lock"
+        token = uuid.uuid4().hex
+        if not await self.client.set(lock, token, nx=True, px=FOLD_LOCK_TTL_MS):
+            return 0
+        rows = 0
+        try:
+            for period, size in PERIODS.items():
+                last_closed = bucket_start(now - self.grace, period) - size
+                folded = await self.folded_mark(period)
+                # With no mark yet, start from the oldest bucket Redis may still hold
+                start = folded + size if folded is not None else bucket_start(
+                    now - self._ttl(period), period
+                )
+                for bucket in range(start, last_closed + 1, size):
+                    rows += await self._fold_bucket(period, bucket)
+                    await self.client.set(f"{self.namespace}:folded:{period}", bucket)
+                    self.folded_buckets += 1
+        finally:
+            if await self.client.get(lock) == token:
+                await self.client.delete(lock)
+        self.folded_rows += rows
+        return rows
+
+    async def folded_mark(self, period: str) -> int | None:
+        """Start of the last bucket folded into Postgres."""
+        value = await self.client.get(f"{self.namespace}:folded:{period}")
+        return int(value) if value is not None else None
+
+    async def _fold_bucket(self, period: str, start: int) -> int:
+        key_ids = sorted(await self.client.smembers(self._members(period, start)))
+        if not key_ids:
+            return 0
+        pipe = self.client.pipeline(transaction=False)
+        for key_id in key_ids:
+            pipe.hgetall(self._hash(period, start, key_id))
+        bucket = datetime.fromtimestamp(start, timezone.utc)
+        rows = []
+        for key_id, fields in zip(key_ids, await pipe.execute()):
+            counts: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+            _add_fields(counts, fields)
+            rows.extend(
+                {
+                    "key_id": uuid.UUID(key_id),
+                    "period": period,
+                    "bucket_start": bucket,
+                    "route": route,
+                    "allowed": allowed,
+                    "rejected": rejected,
+                }
+                for route, (allowed, rejected) in counts.items()
+            )
+        async with AsyncSessionLocal() as session:
+            for i in range(0, len(rows), FOLD_CHUNK_SIZE):
+                stmt = insert(UsageRollup).values(rows[i : i + FOLD_CHUNK_SIZE])
+                # The hashes hold running totals: folding again replaces
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["key_id", "period", "bucket_start", "route"],
+                        set_={"allowed": stmt.excluded.allowed, "rejected": stmt.excluded.rejected},
+                    )
+                )
+            await session.commit()
+        return len(rows)
+
+    async def read(
+        self, key_id: uuid.UUID, period: str, starts: Sequence[int]
+    ) -> dict[int, dict[str, list[int]]]:
+        """route -> [allowed, rejected] for each bucket start in ``starts``
+        (ascending), from Postgres up to the folded mark and Redis after it."""
+        folded = await self.folded_mark(period)
+        result: dict[int, dict[str, list[int]]] = {
+            start: defaultdict(lambda: [0, 0]) for start in starts
+        }
+        closed = [s for s in starts if folded is not None and s <= folded]
+        live = [s for s in starts if folded is None or s > folded]
+        if closed:
+            async with AsyncSessionLocal() as session:
+                rows = await session.execute(
+                    select(UsageRollup).where(
+                        UsageRollup.key_id == key_id,
+                        UsageRollup.period == period,
+                        UsageRollup.bucket_start >= datetime.fromtimestamp(closed[0], timezone.utc),
+                        UsageRollup.bucket_start <= datetime.fromtimestamp(closed[-1], timezone.utc),
+                    )
+                )
+                for row in rows.scalars():
+                    counts = result[int(row.bucket_start.timestamp())][row.route]
+                    counts[0] += row.allowed
+                    counts[1] += row.rejected
+        if live:
+            pipe = self.client.pipeline(transaction=False)
+            for start in live:
+                pipe.hgetall(self._hash(period, start, str(key_id)))
+            for start, fields in zip(live, await pipe.execute()):
+                _add_fields(result[start], fields)
+        return result
+
+    async def run(self) -> None:
+        """Flush every ``interval`` and fold every ``fold_interval`` seconds
+        until cancelled."""
+        last_fold = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Usage rollup flush failed", extra={"pending": self.pending})
+            if time.monotonic() - last_fold >= self.fold_interval:
+                last_fold = time.monotonic()
+                try:
+                    await self.fold()
+                except Exception:
+                    logger.exception("Usage rollup fold failed")
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "folded_buckets": self.folded_buckets,
+            "folded_rows": self.folded_rows,
+        }
+
+
+usage_rollups = UsageRollups(
+    USAGE_ROLLUP_FLUSH_INTERVAL, USAGE_ROLLUP_FOLD_INTERVAL, USAGE_ROLLUP_GRACE
+)
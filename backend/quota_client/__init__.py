@@ -0,0 +1,10 @@
+"""Async Python client for Quota.
+
+``QuotaClient.check`` batches decisions into POST /v1/check/batch;
+``QuotaClient.request`` calls /v1 endpoints with an API key. Both skip the
+network for keys known to be exhausted until their window resets, and back
+off as the server's Retry-After says.
+"""
+from quota_client.client import CheckResult, QuotaClient, QuotaError
+
+__all__ = ["CheckResult", "QuotaClient", "QuotaError"]
@@ -0,0 +1,250 @@
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass
+
+import httpx
+
+# Statuses where nothing was charged (or the server says to wait): safe to
+# retry for any method
+RETRY_STATUSES = frozenset({429, 503})
+# A proxy's 502/504 may follow a request the server did handle, so these are
+# only retried for methods that are safe to repeat
+IDEMPOTENT_RETRY_STATUSES = frozenset({502, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Connection never established, so retrying cannot double-charge
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class QuotaError(Exception):
+    """The Quota server could not be reached or answered with an error."""
+
+
+@dataclass(frozen=True, slots=True)
+class CheckResult:
+    status: int  # what /v1 would have answered: 200, 401, 429 or 503
+    limit: int
+    remaining: int
+    reset: int  # unix seconds
+    retry_after: int | None = None
+    # Answered from the local exhausted-key cache, without a server call
+    local: bool = False
+
+    @property
+    def allowed(self) -> bool:
+        return self.status == 200
+
+
+class QuotaClient:
+    """Pooled client for one Quota deployment.
+
+    ``token`` is the service (admin API) token, needed only for ``check``.
+    Concurrent ``check`` calls are sent together: a batch goes out when it
+    reaches ``max_batch`` items or ``batch_delay`` seconds after its first
+    item. Pass ``transport=httpx.ASGITransport(app)`` to run in-process.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: str | None = None,
+        *,
+        max_batch: int = 100,
+        batch_delay: float = 0.002,
+        max_connections: int = 20,
+        retries: int = 3,
+        backoff: float = 0.1,
+        max_backoff: float = 5.0,
+        timeout: float = 5.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections),
+            transport=transport,
+        )
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # api key (from ``check``) or (api key, method, path) (from
+        # ``request``, as a 429 there may come from a route's own limit)
+        # -> (limit, blocked until unix seconds)
+        self._exhausted: dict[str | tuple[str, str, str], tuple[int, float]] = {}
+        self._pending: list[tuple[str, int, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._batches: set[asyncio.Task] = set()
+        self.batches_sent = 0
+        self.short_circuited = 0
+
+    async def __aenter__(self) -> "QuotaClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Send what is queued, wait for batches in flight, close the pool."""
+        self._send_pending()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        await self._http.aclose()
+
+    # -- exhausted keys ----------------------------------------------------
+
+    def _blocked(self, key: str | tuple, now: float) -> tuple[int, float] | None:
+        entry = self._exhausted.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._exhausted[key]
+            return None
+        self.short_circuited += 1
+        return entry
+
+    def _block(
+        self, key: str | tuple, limit: int, reset: float, retry_after: float | None
+    ) -> None:
+        now = time.time()
+        until = reset if retry_after is None else min(reset, now + retry_after)
+        if until > now:
+            self._exhausted[key] = (limit, until)
+
+    # -- batched checks ----------------------------------------------------
+
+    async def check(self, key: str, cost: int = 1) -> CheckResult:
+        """Charge ``cost`` to API key ``key``; needs the service token."""
+        now = time.time()
+        blocked = self._blocked(key, now)
+        if blocked is not None:
+            limit, until = blocked
+            return CheckResult(
+                429, limit, 0, math.ceil(until), max(1, math.ceil(until - now)), local=True
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((key, cost, future))
+        if len(self._pending) >= self.max_batch:
+            self._send_pending()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.batch_delay, self._send_pending
+            )
+        return await future
+
+    async def check_many(self, items: list[tuple[str, int]]) -> list[CheckResult]:
+        return list(await asyncio.gather(*(self.check(key, cost) for key, cost in items)))
+
+    def _send_pending(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            task = asyncio.ensure_future(self._send_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _send_batch(self, batch: list[tuple[str, int, asyncio.Future]]) -> None:
+        body = {"checks": [{"key": key, "cost": cost} for key, cost, _ in batch]}
+        try:
+            resp = await self._send("POST", "/v1/check/batch", json=body)
+            if resp.status_code != 200:
+                raise QuotaError(f"check batch failed: {resp.status_code} {resp.text}")
+            results = [
+                CheckResult(r["status"], r["limit"], r["remaining"], r["reset"], r["retry_after"])
+                for r in resp.json()["results"]
+            ]
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.batches_sent += 1
+        for (key, cost, future), result in zip(batch, results):
+            # A denied cost-1 check means the key is exhausted for everyone
+            if result.status == 429 and cost == 1:
+                self._block(key, result.limit, result.reset, result.retry_after)
+            if not future.done():
+                future.set_result(result)
+
+    # -- /v1 requests --------------------------------------------------------
+
+    async def request(self, api_key: str, method: str, path: str, **kwargs) -> httpx.Response:
+        """Call a rate-limited /v1 endpoint as ``api_key``.
+
+        While the key is known to be exhausted, for this route or (from
+        ``check``) for all of them, returns a local 429 (with the usual rate
+        limit headers) instead of calling the server.
+        """
+        now = time.time()
+        route = (api_key, method.upper(), path.partition("?")[0])
+        blocked = self._blocked(api_key, now) or self._blocked(route, now)
+        if blocked is not None:
+            limit, until = blocked
+            return httpx.Response(
+                429,
+                headers={
+                    "X-RateLimit-Limit": str(limit),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(math.ceil(until)),
+                    "Retry-After": str(max(1, math.ceil(until - now))),
+                },
+                json={"detail": "Rate limit exceeded"},
+                request=self._http.build_request(method, path),
+            )
+
+        headers = {**kwargs.pop("headers", {}), "X-API-Key": api_key}
+        resp = await self._send(method, path, headers=headers, **kwargs)
+        if resp.status_code == 429 and "X-RateLimit-Reset" in resp.headers:
+            retry_after = resp.headers.get("Retry-After")
+            self._block(
+                route,
+                int(resp.headers.get("X-RateLimit-Limit", 0)),
+                float(resp.headers["X-RateLimit-Reset"]),
+                float(retry_after) if retry_after else None,
+            )
+        return resp
+
+    # -- transport -----------------------------------------------------------
+
+    async def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send with retries; the last retryable response is returned as is."""
+        attempt = 0
+        while True:
+            try:
+                resp = await self._http.request(method, path, **kwargs)
+            except RETRY_ERRORS as exc:
+                if attempt >= self.retries:
+                    raise QuotaError(f"{method} {path}: {exc!r}") from exc
+                delay = self._delay(attempt, None)
+            else:
+                retryable = resp.status_code in RETRY_STATUSES or (
+                    resp.status_code in IDEMPOTENT_RETRY_STATUSES
+                    and method.upper() in IDEMPOTENT_METHODS
+                )
+                if not retryable or attempt >= self.retries:
+                    return resp
+                delay = self._delay(attempt, resp.headers.get("Retry-After"))
+                if delay is None:
+                    return resp
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _delay(self, attempt: int, retry_after: str | None) -> float | None:
+        """Seconds before the next attempt; None when the server asks for longer
+        than ``max_backoff``, so the caller gets the response instead."""
+        if retry_after is not None:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                seconds = 0.0
+            return seconds if seconds <= self.max_backoff else None
+        # Exponential with full jitter
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
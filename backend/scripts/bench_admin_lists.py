@@ -0,0 +1,163 @@
+"""GET /admin/plans and /admin/api-keys: OFFSET pages vs. keyset pages.
+
+    cd backend && python scripts/bench_admin_lists.py [--keys 1000000] [--plans 1000]
+
+Seeds one user with ``--plans`` plans and ``--keys`` keys spread over them
+(INSERT ... SELECT generate_series, so it takes a minute or so), then times a
+100-row page at increasing depths: the old OFFSET/LIMIT query and GROUP BY
+over every key of the user, against the endpoints' keyset query and key
+counts for the page's plans only. The endpoint functions are called
+directly, bypassing HTTP and the admin rate limit. The seeded rows are
+deleted afterwards.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import benchutil  # noqa: F401  (puts the backend root on sys.path)
+from fastapi import Response
+from sqlalchemy import delete, func, select, text
+
+from app.database import AsyncSessionLocal, engine
+from app.models import ApiKey, Plan, User
+from app.routers.admin import _encode_cursor, list_api_keys, list_plans
+
+PAGE = 100
+
+
+async def _seed(keys: int, plans: int) -> User:
+    user = User(
+        id=uuid.uuid4(), email=f"bench-{uuid.uuid4().hex[:12]}@example.com", password_hash="x"
+    )
+    async with AsyncSessionLocal() as session:
+        session.add(user)
+        await session.commit()
+        params = {"user_id": user.id, "plans": plans, "keys": keys, "run": uuid.uuid4().hex}
+        await session.execute(
+            text(
+                "INSERT INTO plans (id, name, default_rpm, created_at, user_id) "
+                "SELECT gen_random_uuid(), 'bench-' || g, 60, "
+                "  now() - (:plans - g) * interval '1 s', :user_id "
+                "FROM generate_series(1, :plans) g"
+            ),
+            params,
+        )
+        await session.execute(
+            text(
+                "INSERT INTO api_keys "
+                "  (id, key_hash, label, plan_id, is_active, created_at, user_id) "
+                "SELECT gen_random_uuid(), encode(sha256((:run || g)::bytea), 'hex'), 'bench', "
+                "  p.ids[1 + g % :plans], true, now() - (:keys - g) * interval '1 ms', :user_id "
+                "FROM generate_series(1, :keys) g, "
+                "  (SELECT array_agg(id) AS ids FROM plans WHERE user_id = :user_id) p"
+            ),
+            params,
+        )
+        await session.commit()
+    # As autovacuum would: statistics, plus the visibility map that lets the
+    # key counts be index-only scans
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE plans"))
+        await conn.execute(text("VACUUM ANALYZE api_keys"))
+    return user
+
+
+async def _time(fn, repeat: int = 5) -> float:
+    await fn()  # warm the buffer cache
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+async def _cursor(model, user: User, depth: int) -> str | None:
+    if depth == 0:
+        return None
+    async with AsyncSessionLocal() as session:
+        row = (
+            await session.execute(
+                select(model.created_at, model.id)
+                .where(model.user_id == user.id)
+                .order_by(model.created_at, model.id)
+                .offset(depth - 1)
+                .limit(1)
+            )
+        ).one()
+    return _encode_cursor(row.created_at, row.id)
+
+
+async def _offset_keys(user: User, depth: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            select(ApiKey)
+            .where(ApiKey.user_id == user.id)
+            .order_by(ApiKey.created_at)
+            .offset(depth)
+            .limit(PAGE)
+        )
+
+
+async def _offset_plans(user: User, depth: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            select(Plan)
+            .where(Plan.user_id == user.id)
+            .order_by(Plan.created_at)
+            .offset(depth)
+            .limit(PAGE)
+        )
+        await session.execute(
+            select(ApiKey.plan_id, func.count(ApiKey.id))
+            .where(ApiKey.user_id == user.id)
+            .group_by(ApiKey.plan_id)
+        )
+
+
+async def main(keys: int, plans: int) -> None:
+    t0 = time.perf_counter()
+    user = await _seed(keys, plans)
+    print(f"seeded {keys} keys on {plans} plans in {time.perf_counter() - t0:.0f} s\n")
+
+    print(f"{'GET /admin/api-keys':<28} {'OFFSET':>10} {'keyset':>10}")
+    for depth in (0, 10_000, keys // 2, keys - PAGE):
+        cursor = await _cursor(ApiKey, user, depth)
+
+        async def keyset():
+            async with AsyncSessionLocal() as session:
+                await list_api_keys(Response(), cursor, PAGE, current_user=user, db=session)
+
+        old = await _time(lambda: _offset_keys(user, depth))
+        new = await _time(keyset)
+        print(f"{f'  page at row {depth}':<28} {old:>7.2f} ms {new:>7.2f} ms")
+
+    print(f"\n{'GET /admin/plans':<28} {'OFFSET':>10} {'keyset':>10}")
+    for depth in (0, plans - PAGE):
+        cursor = await _cursor(Plan, user, depth)
+
+        async def keyset():
+            async with AsyncSessionLocal() as session:
+                await list_plans(Response(), cursor, PAGE, current_user=user, db=session)
+
+        old = await _time(lambda: _offset_plans(user, depth))
+        new = await _time(keyset)
+        print(f"{f'  page at row {depth}':<28} {old:>7.2f} ms {new:>7.2f} ms")
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(ApiKey).where(ApiKey.user_id == user.id))
+        await session.execute(delete(Plan).where(Plan.user_id == user.id))
+        await session.execute(delete(User).where(User.id == user.id))
+        await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--plans", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.keys, args.plans))
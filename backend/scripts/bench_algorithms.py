@@ -0,0 +1,118 @@
+"""Compare rate limit algorithms: Redis ops, memory per key and decision latency.
+
+    cd backend && python scripts/bench_algorithms.py [--backend redis] [--keys 1000] [--requests 20000]
+
+``--backend`` is memory, redis, redis_cluster (REDIS_CLUSTER_URL) or all.
+On Redis each decision is one EVALSHA; "ops/decision" counts the commands
+the script runs internally (from INFO commandstats), including the shared
+last-seen bookkeeping. The last row evaluates a plan with per-second,
+per-minute, per-day and per-month limits in that same single call. Ops and
+bytes are not measured for the in-memory backend.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from benchutil import run_load
+
+from redis.asyncio.cluster import RedisCluster
+
+from app.algorithms import ALGORITHMS, Charge, Limit, window_args
+from app.storage import LimiterBackend, RedisBackend, create_backend
+
+BACKENDS = ("memory", "redis", "redis_cluster")
+
+
+async def _command_calls(backend: LimiterBackend) -> dict[str, int] | None:
+    if not isinstance(backend, RedisBackend):
+        return None
+    client = backend.client
+    if isinstance(client, RedisCluster):
+        per_node = await client.info("commandstats", target_nodes=RedisCluster.PRIMARIES)
+    else:
+        per_node = {"": await client.info("commandstats")}
+    calls: dict[str, int] = {}
+    for stats in per_node.values():
+        for name, value in stats.items():
+            calls[name] = calls.get(name, 0) + value["calls"]
+    return calls
+
+
+async def bench(
+    backend: LimiterBackend,
+    label: str,
+    limits: list[Limit],
+    keys: int,
+    total: int,
+    concurrency: int,
+) -> None:
+    run = uuid.uuid4().hex[:8]
+    prefixes = [backend.key_prefix(f"bench-{run}-{i}") for i in range(keys)]
+
+    async def call():
+        prefix = random.choice(prefixes)
+        await backend.decide(
+            [Charge(limit, prefix) for limit in limits],
+            int(time.time() * 1000),
+            f"{prefix}seen",
+        )
+
+    await run_load(call, min(total, 1000), concurrency)  # warm-up + script load
+    before = await _command_calls(backend)
+    result = await run_load(call, total, concurrency)
+    after = await _command_calls(backend)
+
+    if after is None:
+        ops, memory = "    -", "     -"
+    else:
+        internal = sum(
+            after[name] - before.get(name, 0)
+            for name in after
+            if not name.startswith(("cmdstat_evalsha", "cmdstat_info", "cmdstat_cluster"))
+        )
+        now_ms = int(time.time() * 1000)
+        sample = prefixes[: min(keys, 200)]
+        total_bytes = 0
+        for prefix in sample:
+            for limit in limits:
+                for key in window_args(limit, prefix, now_ms)[0]:
+                    total_bytes += await backend.client.memory_usage(key) or 0
+        ops, memory = f"{internal / total:5.1f}", f"{total_bytes / len(sample):6.0f}"
+
+    print(
+        f"{backend.__class__.__name__:<20} {label:<24} {ops} ops/decision"
+        f"   {memory} B/key"
+        f"   {result['rps']:8.0f} decisions/s"
+        f"   p50 {result['p50_ms']:5.2f} ms   p99 {result['p99_ms']:5.2f} ms"
+    )
+
+
+async def main(backends: list[str], keys: int, total: int, concurrency: int, limit: int) -> None:
+    multi = [
+        Limit("second", limit),
+        Limit("minute", limit),
+        Limit("day", limit),
+        Limit("month", limit),
+    ]
+    for name in backends:
+        backend = create_backend(name)
+        for algorithm in ALGORITHMS:
+            await bench(
+                backend, algorithm, [Limit("minute", limit, algorithm)], keys, total, concurrency
+            )
+        await bench(backend, "fixed_window x4 windows", multi, keys, total, concurrency)
+        await backend.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=(*BACKENDS, "all"), default="redis")
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10**6)
+    args = parser.parse_args()
+    backends = list(BACKENDS) if args.backend == "all" else [args.backend]
+    asyncio.run(main(backends, args.keys, args.requests, args.concurrency, args.limit))
@@ -0,0 +1,90 @@
+"""Provisioning keys: POST /admin/api-keys one at a time vs. the bulk endpoints.
+
+    cd backend && python scripts/bench_bulk_keys.py [--keys 100000] [--single 1000]
+
+Creates ``--single`` keys through the one-key endpoint (a commit and refresh
+each) and extrapolates to ``--keys``, then creates ``--keys`` keys through
+POST /admin/api-keys/bulk, consuming its NDJSON stream, and deactivates and
+deletes them all with the bulk PATCH and delete. The endpoint functions are
+called directly, bypassing HTTP and the admin rate limit. The seeded user is
+deleted afterwards.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import benchutil  # noqa: F401  (puts the backend root on sys.path)
+from sqlalchemy import delete
+
+from app.database import AsyncSessionLocal, engine
+from app.models import ApiKey, Plan, User
+from app.principal_cache import Principal
+from app.routers.admin import create_api_key, create_api_keys, delete_api_keys, update_api_keys
+from app.schemas import ApiKeyBulkCreate, ApiKeyBulkIds, ApiKeyBulkUpdate, ApiKeyCreate
+
+
+async def _seed() -> tuple[Principal, uuid.UUID]:
+    user = User(
+        id=uuid.uuid4(), email=f"bench-{uuid.uuid4().hex[:12]}@example.com", password_hash="x"
+    )
+    plan = Plan(id=uuid.uuid4(), name="bench", default_rpm=60, user_id=user.id)
+    async with AsyncSessionLocal() as session:
+        session.add(user)
+        await session.flush()
+        session.add(plan)
+        await session.commit()
+    return Principal(id=user.id, email=user.email), plan.id
+
+
+async def main(keys: int, single: int) -> None:
+    principal, plan_id = await _seed()
+
+    t0 = time.perf_counter()
+    for _ in range(single):
+        async with AsyncSessionLocal() as session:
+            await create_api_key(
+                ApiKeyCreate(label="single", plan_id=plan_id), current_user=principal, db=session
+            )
+    one_by_one = (time.perf_counter() - t0) / single
+    print(f"POST /admin/api-keys          {one_by_one * 1000:8.2f} ms/key  "
+          f"-> {one_by_one * keys:6.1f} s for {keys} keys")
+
+    t0 = time.perf_counter()
+    ids = []
+    async with AsyncSessionLocal() as session:
+        response = await create_api_keys(
+            ApiKeyBulkCreate(label="bulk", plan_id=plan_id, count=keys),
+            current_user=principal,
+            db=session,
+        )
+    async for chunk in response.body_iterator:
+        ids.extend(line[7:43] for line in chunk.splitlines())  # {"id":"<uuid>",...
+    print(f"POST /admin/api-keys/bulk     {time.perf_counter() - t0:8.2f} s for {len(ids)} keys")
+
+    t0 = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        await update_api_keys(
+            ApiKeyBulkUpdate(ids=ids, is_active=False), current_user=principal, db=session
+        )
+    print(f"PATCH /admin/api-keys/bulk    {time.perf_counter() - t0:8.2f} s")
+
+    t0 = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        await delete_api_keys(ApiKeyBulkIds(ids=ids), current_user=principal, db=session)
+    print(f"POST .../bulk/delete          {time.perf_counter() - t0:8.2f} s")
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(ApiKey).where(ApiKey.user_id == principal.id))
+        await session.execute(delete(Plan).where(Plan.user_id == principal.id))
+        await session.execute(delete(User).where(User.id == principal.id))
+        await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--single", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.keys, args.single))
@@ -0,0 +1,68 @@
+"""Decisions/sec through POST /v1/check and /v1/check/batch by batch size.
+
+    cd backend && python scripts/bench_check.py [--decisions 20000] [--keys 50] [--concurrency 20]
+
+Every row makes the same number of decisions over ``--keys`` keys; a batch
+of N costs one HTTP request, one pipelined Redis round trip and (on a key
+cache miss) one Postgres query. "GET /v1/hello" is the per-request
+middleware path for reference.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from benchutil import asgi_request, run_load, seed_api_keys
+
+from app.config import ADMIN_API_TOKEN
+from app.main import app
+from app.redis_client import redis_client
+
+BATCH_SIZES = (1, 10, 100, 1000)
+
+
+def _row(label: str, result: dict, batch: int) -> None:
+    print(
+        f"{label:<28} {result['rps'] * batch:>10.0f} decisions/s"
+        f"   p50 {result['p50_ms']:7.2f} ms   p99 {result['p99_ms']:7.2f} ms per request"
+    )
+
+
+async def main(decisions: int, keys: int, concurrency: int) -> None:
+    plaintext = await seed_api_keys(app, rpm=10**9, count=keys)
+    service = [
+        (b"authorization", f"Bearer {ADMIN_API_TOKEN}".encode()),
+        (b"content-type", b"application/json"),
+    ]
+
+    async def hello():
+        await asgi_request(app, "GET", "/v1/hello", [(b"x-api-key", random.choice(plaintext).encode())])
+
+    await run_load(hello, min(decisions, 500), concurrency)  # warm-up
+    _row("GET /v1/hello", await run_load(hello, decisions, concurrency), 1)
+
+    for batch in BATCH_SIZES:
+        if batch == 1:
+            path, label = "/v1/check", "POST /v1/check"
+        else:
+            path, label = "/v1/check/batch", f"POST /v1/check/batch x{batch}"
+
+        async def call(path=path, batch=batch):
+            items = [{"key": random.choice(plaintext)} for _ in range(batch)]
+            body = json.dumps(items[0] if batch == 1 else {"checks": items}).encode()
+            assert await asgi_request(app, "POST", path, service, body) == 200
+
+        total = max(decisions // batch, 1)
+        await run_load(call, min(total, 50), concurrency)  # warm-up
+        _row(label, await run_load(call, total, concurrency), batch)
+
+    await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--decisions", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.decisions, args.keys, args.concurrency))
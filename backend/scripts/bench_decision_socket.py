@@ -0,0 +1,120 @@
+"""Decisions/sec and p99: Unix socket protocol vs. HTTP, both served in-process.
+
+    cd backend && python scripts/bench_decision_socket.py [--decisions 20000] [--connections 20]
+
+HTTP rows go through a real uvicorn server on a Unix socket, with hand-written
+keep-alive HTTP/1.1 requests so client overhead stays as low as for the
+binary protocol; the difference is the server's HTTP + JSON handling.
+"depth" is how many requests each connection keeps in flight; latency is per
+round trip (one request, or one window of ``depth`` pipelined requests).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+
+import uvicorn
+from benchutil import run_load, seed_api_keys
+
+from app.config import ADMIN_API_TOKEN
+from app.decision_socket import LENGTH, DecisionServer, encode_request
+from app.main import app
+
+
+def _row(label: str, result: dict, depth: int) -> None:
+    print(
+        f"{label:<34} {result['rps'] * depth:>9.0f} decisions/s"
+        f"   p50 {result['p50_ms']:6.2f} ms   p99 {result['p99_ms']:6.2f} ms"
+    )
+
+
+async def _http_roundtrip(reader, writer, request: bytes) -> None:
+    writer.write(request)
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(head.lower().split(b"content-length: ")[1].split(b"\r\n")[0])
+    await reader.readexactly(length)
+
+
+async def _http(path: str, keys: list[str], total: int, connections: int) -> None:
+    pool: asyncio.Queue = asyncio.Queue()
+    for _ in range(connections):
+        pool.put_nowait(await asyncio.open_unix_connection(path))
+    auth = f"Authorization: Bearer {ADMIN_API_TOKEN}\r\n"
+
+    def hello() -> bytes:
+        return (
+            f"GET /v1/hello HTTP/1.1\r\nHost: quota\r\nX-API-Key: {random.choice(keys)}\r\n\r\n"
+        ).encode()
+
+    def check() -> bytes:
+        body = json.dumps({"key": random.choice(keys)})
+        return (
+            f"POST /v1/check HTTP/1.1\r\nHost: quota\r\n{auth}"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n{body}"
+        ).encode()
+
+    for label, make_request in (("HTTP GET /v1/hello", hello), ("HTTP POST /v1/check", check)):
+
+        async def call(make_request=make_request):
+            reader, writer = await pool.get()
+            await _http_roundtrip(reader, writer, make_request())
+            pool.put_nowait((reader, writer))
+
+        await run_load(call, min(total, 500), connections)  # warm-up
+        _row(label, await run_load(call, total, connections), 1)
+    while not pool.empty():
+        _, writer = pool.get_nowait()
+        writer.close()
+
+
+async def _socket(path: str, keys: list[str], total: int, connections: int, depth: int) -> None:
+    pool: asyncio.Queue = asyncio.Queue()
+    for _ in range(connections):
+        pool.put_nowait(await asyncio.open_unix_connection(path))
+
+    async def call():
+        reader, writer = await pool.get()
+        writer.write(b"".join(encode_request(i, random.choice(keys)) for i in range(depth)))
+        for _ in range(depth):
+            (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+            await reader.readexactly(length)
+        pool.put_nowait((reader, writer))
+
+    rounds = max(total // depth, 1)
+    await run_load(call, min(rounds, 500), connections)  # warm-up
+    _row(f"socket depth {depth}", await run_load(call, rounds, connections), depth)
+    while not pool.empty():
+        _, writer = pool.get_nowait()
+        writer.close()
+
+
+async def main(total: int, connections: int) -> None:
+    directory = tempfile.mkdtemp()
+    http_path = os.path.join(directory, "http.sock")
+    socket_path = os.path.join(directory, "decisions.sock")
+
+    server = uvicorn.Server(uvicorn.Config(app, uds=http_path, log_level="warning", access_log=False))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    decisions = DecisionServer(socket_path, 0o600)
+    await decisions.start()
+
+    keys = await seed_api_keys(app, rpm=10**9, count=50)
+    await _http(http_path, keys, total, connections)
+    for depth in (1, 10, 100):
+        await _socket(socket_path, keys, total, connections, depth)
+
+    await decisions.close()
+    server.should_exit = True
+    await serving
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--decisions", type=int, default=20000)
+    parser.add_argument("--connections", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.decisions, args.connections))
@@ -0,0 +1,143 @@
+"""GET /admin/export and POST /admin/import: time and peak memory by tenant size.
+
+    cd backend && python scripts/bench_export_import.py [--keys 10000 100000 1000000]
+
+For each size, seeds one user with that many keys (INSERT ... SELECT
+generate_series) over 100 plans and exports them to a temporary file. It
+then deletes the plans and keys and imports the file back through the ASGI
+app as a gzip-encoded stream. Peak Python memory of each phase comes from
+tracemalloc, which also slows both phases down, so the times are an upper
+bound. Flat peaks across sizes show that neither side buffers the tenant.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+import zlib
+
+import benchutil  # noqa: F401  (puts the backend root on sys.path)
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, text
+
+from app.database import AsyncSessionLocal, engine
+from app.main import app
+from app.models import ApiKey, Plan, User
+from app.principal_cache import Principal
+from app.routers.auth import _create_token
+from app.routers.transfer import export_records
+
+PLANS = 100
+
+
+async def _seed(keys: int) -> User:
+    user = User(
+        id=uuid.uuid4(), email=f"bench-{uuid.uuid4().hex[:12]}@example.com", password_hash="x"
+    )
+    async with AsyncSessionLocal() as session:
+        session.add(user)
+        await session.commit()
+        params = {"user_id": user.id, "plans": PLANS, "keys": keys, "run": uuid.uuid4().hex}
+        await session.execute(
+            text(
+                "INSERT INTO plans (id, name, default_rpm, created_at, user_id) "
+                "SELECT gen_random_uuid(), 'bench-' || g, 60, "
+                "  now() - (:plans - g) * interval '1 s', :user_id "
+                "FROM generate_series(1, :plans) g"
+            ),
+            params,
+        )
+        await session.execute(
+            text(
+                "INSERT INTO api_keys "
+                "  (id, key_hash, label, plan_id, is_active, created_at, user_id) "
+                "SELECT gen_random_uuid(), encode(sha256((:run || g)::bytea), 'hex'), 'bench', "
+                "  p.ids[1 + g % :plans], true, now() - (:keys - g) * interval '1 ms', :user_id "
+                "FROM generate_series(1, :keys) g, "
+                "  (SELECT array_agg(id) AS ids FROM plans WHERE user_id = :user_id) p"
+            ),
+            params,
+        )
+        await session.commit()
+    return user
+
+
+async def _clear(user: User) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(ApiKey).where(ApiKey.user_id == user.id))
+        await session.execute(delete(Plan).where(Plan.user_id == user.id))
+        await session.commit()
+
+
+async def _export(user: User, path: str) -> None:
+    response = await export_records(
+        gzip=True, current_user=Principal(id=user.id, email=user.email)
+    )
+    with open(path, "wb") as f:
+        async for chunk in response.body_iterator:
+            f.write(chunk)
+
+
+async def _import(user: User, path: str) -> dict:
+    async def body():
+        with open(path, "rb") as f:
+            while chunk := f.read(64 * 1024):
+                yield chunk
+
+    headers = {
+        "Authorization": f"Bearer {_create_token(user.id)}",
+        "Content-Encoding": "gzip",
+    }
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        resp = await client.post("/admin/import", content=body(), headers=headers)
+    return resp.json()
+
+
+async def _measure(fn) -> tuple[float, float]:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    await fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+async def main(sizes: list[int]) -> None:
+    print(f"{'keys':>9} {'file':>9} {'export':>16} {'import':>16}")
+    for keys in sizes:
+        user = await _seed(keys)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "export.ndjson.gz")
+            export_s, export_mb = await _measure(lambda: _export(user, path))
+            size_mb = os.path.getsize(path) / 2**20
+            with open(path, "rb") as f:
+                lines = zlib.decompress(f.read(), wbits=31).count(b"\n")
+            assert lines == keys + PLANS, lines
+            await _clear(user)
+            result = {}
+
+            async def restore():
+                result.update(await _import(user, path))
+
+            import_s, import_mb = await _measure(restore)
+            assert result["api_keys"] == keys, result
+        print(
+            f"{keys:>9} {size_mb:>6.1f} MB "
+            f"{export_s:>6.1f} s {export_mb:>5.1f} MB "
+            f"{import_s:>6.1f} s {import_mb:>5.1f} MB"
+        )
+        await _clear(user)
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    asyncio.run(main(args.keys))
@@ -0,0 +1,46 @@
+"""Requests/sec through ``app.main:app`` for the rate limit middleware paths.
+
+    cd backend && python scripts/bench_middleware.py [--requests 20000] [--concurrency 50]
+
+Measures an allowed /v1 request, the 401 (missing key) and 429 (over limit)
+fast paths, and a non-rate-limited route for reference.
+"""
+import argparse
+import asyncio
+
+from benchutil import asgi_request, print_row, run_load, seed_api_key
+
+from app.main import app
+from app.redis_client import redis_client
+
+
+async def main(total: int, concurrency: int) -> None:
+    allowed_key = (await seed_api_key(app, rpm=10**9)).encode()
+    limited_key = (await seed_api_key(app, rpm=1)).encode()
+    await asgi_request(app, "GET", "/v1/hello", [(b"x-api-key", limited_key)])
+
+    cases = {
+        "GET /health": [],
+        "GET /v1/hello (200)": [(b"x-api-key", allowed_key)],
+        "GET /v1/hello (401 no key)": None,
+        "GET /v1/hello (429)": [(b"x-api-key", limited_key)],
+    }
+    for label, headers in cases.items():
+        path = "/health" if label.startswith("GET /health") else "/v1/hello"
+        hdrs = headers or []
+
+        async def call(path=path, hdrs=hdrs):
+            await asgi_request(app, "GET", path, hdrs)
+
+        await run_load(call, min(total, 500), concurrency)  # warm-up
+        print_row(label, await run_load(call, total, concurrency))
+
+    await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,121 @@
+"""Usage metering pipeline: request overhead, ingestion throughput and lag.
+
+    cd backend && python scripts/bench_usage_log.py [--events 200000] [--rate 20000]
+
+1. /v1/hello req/s with usage events off and on (recording + stream flushes).
+2. Ingestion throughput: a stream pre-filled with ``--events`` events is
+   drained into usage_log by one ingester.
+3. End-to-end lag: events are produced at ``--rate`` per second for 10 s
+   while the ingester runs; lag is commit time minus the oldest event of
+   each batch.
+
+Uses a throwaway stream; rows land in usage_log under random key ids.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from benchutil import asgi_request, print_row, run_load, seed_api_key
+
+from app.main import app
+from app.redis_client import redis_client
+from app.usage_log import UsageIngester, UsageRecorder, usage_recorder
+
+
+async def _overhead(total: int, concurrency: int) -> None:
+    key = (await seed_api_key(app, rpm=10**9)).encode()
+
+    async def call():
+        await asgi_request(app, "GET", "/v1/hello", [(b"x-api-key", key)])
+
+    for enabled in (False, True):
+        usage_recorder.enabled = enabled
+        flusher = asyncio.create_task(usage_recorder.run()) if enabled else None
+        await run_load(call, min(total, 500), concurrency)  # warm-up
+        print_row(f"GET /v1/hello usage {'on' if enabled else 'off'}", await run_load(call, total, concurrency))
+        if flusher:
+            flusher.cancel()
+    usage_recorder.enabled = False
+    await redis_client.delete(usage_recorder.stream)
+
+
+def _pipeline(events: int) -> tuple[UsageRecorder, UsageIngester]:
+    stream = f"usage:bench:{uuid.uuid4().hex[:8]}"
+    recorder = UsageRecorder(True, stream, maxlen=10**8, interval=0.2, max_buffer=10**7)
+    ingester = UsageIngester(stream, batch_size=5000, retention_days=30, consumer="bench")
+    return recorder, ingester
+
+
+def _produce(recorder: UsageRecorder, count: int, key_ids: list[str], now: float) -> None:
+    for i in range(count):
+        recorder.record(key_ids[i % len(key_ids)], "GET /v1/hello", now, i % 10 != 0, 1)
+
+
+async def _throughput(events: int) -> None:
+    recorder, ingester = _pipeline(events)
+    await ingester.ensure_group()
+    key_ids = [str(uuid.uuid4()) for _ in range(100)]
+
+    _produce(recorder, events, key_ids, time.time())
+    t0 = time.perf_counter()
+    await recorder.flush()
+    xadd = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    while await ingester.ingest_once():
+        pass
+    ingest = time.perf_counter() - t0
+    print(f"{'XADD (pipelined)':<28} {events / xadd:>10.0f} events/s")
+    print(f"{'stream -> usage_log (COPY)':<28} {ingester.ingested / ingest:>10.0f} events/s")
+    await redis_client.delete(recorder.stream)
+
+
+async def _lag(rate: int, seconds: int) -> None:
+    recorder, ingester = _pipeline(rate * seconds)
+    await ingester.ensure_group()
+    key_ids = [str(uuid.uuid4()) for _ in range(100)]
+    flusher = asyncio.create_task(recorder.run())
+    lags: list[int] = []
+
+    async def consume():
+        while True:
+            if await ingester.ingest_once(block_ms=100):
+                lags.append(ingester.last_lag_ms)
+
+    consumer = asyncio.create_task(consume())
+    tick = 0.01
+    for _ in range(int(seconds / tick)):
+        _produce(recorder, int(rate * tick), key_ids, time.time())
+        await asyncio.sleep(tick)
+    await recorder.flush()
+    while await redis_client.xlen(recorder.stream):
+        await asyncio.sleep(0.05)
+    consumer.cancel()
+    flusher.cancel()
+
+    lags.sort()
+    print(
+        f"{'end-to-end lag':<28} {rate:>10} events/s offered"
+        f"   p50 {statistics.median(lags):6.0f} ms   p99 {lags[int(len(lags) * 0.99) - 1]:6.0f} ms"
+        f"   max {lags[-1]} ms   ({ingester.batches} batches)"
+    )
+    await redis_client.delete(recorder.stream)
+
+
+async def main(events: int, rate: int, requests: int, concurrency: int) -> None:
+    await _overhead(requests, concurrency)
+    await _throughput(events)
+    await _lag(rate, 10)
+    await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--rate", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.events, args.rate, args.requests, args.concurrency))
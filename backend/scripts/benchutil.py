@@ -0,0 +1,126 @@
+"""Shared helpers for the scripts/bench_*.py benchmarks.
+
+Benchmarks run in-process against ``app.main:app`` and need the same Postgres
+and Redis as the test suite (``docker compose up -d postgres redis``).
+"""
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Make the backend root importable when run as ``python scripts/bench_x.py``
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    headers: list[tuple[bytes, bytes]],
+    body: bytes = b"",
+) -> int:
+    """Drive one request straight through the ASGI callable and return its status.
+
+    Skips HTTP parsing and client overhead so the numbers reflect the app and
+    its middleware stack only.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    body_sent = False
+    status = 0
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # like a server: disconnect never comes
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_load(make_call, total: int, concurrency: int) -> dict:
+    """Run ``total`` calls of ``make_call()`` with ``concurrency`` workers."""
+    latencies: list[float] = []
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            await make_call()
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def seed_api_key(app, rpm: int) -> str:
+    """Register a throwaway user, create a plan with ``rpm`` and return a plaintext key."""
+    return (await seed_api_keys(app, rpm, 1))[0]
+
+
+async def seed_api_keys(app, rpm: int, count: int) -> list[str]:
+    """``count`` keys on one new plan with ``rpm``.
+
+    Each key is an admin call, and admin calls are limited to 60 a minute.
+    """
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as ac:
+        resp = await ac.post(
+            "/auth/register",
+            json={"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "password": "bench"},
+        )
+        headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+        resp = await ac.post(
+            "/admin/plans",
+            json={"name": f"bench-{uuid.uuid4().hex[:8]}", "default_rpm": rpm},
+            headers=headers,
+        )
+        plan_id = resp.json()["id"]
+        keys = []
+        for _ in range(count):
+            resp = await ac.post(
+                "/admin/api-keys",
+                json={"label": "bench", "plan_id": plan_id},
+                headers=headers,
+            )
+            keys.append(resp.json()["plaintext_key"])
+        return keys
+
+
+def print_row(label: str, result: dict) -> None:
+    print(
+        f"{label:<28} {result['rps']:>10.0f} req/s"
+        f"   p50 {result['p50_ms']:6.2f} ms   p99 {result['p99_ms']:6.2f} ms"
+    )
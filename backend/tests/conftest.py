@@ -4,9 +4,12 @@ import pytest
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy import text
 
+from app.config import REDIS_CLUSTER_URL
 from app.database import AsyncSessionLocal
 from app.main import app
-from app.rate_limiter import redis_client
+from app.penalty_box import penalty_box
+from app.redis_client import redis_client
+from app.storage import MemoryBackend, RedisBackend
 
 
 @pytest.fixture(autouse=True, scope="session")
@@ -15,6 +18,31 @@ async def _warmup_redis():
     await redis_client.ping()
 
 
+@pytest.fixture(scope="session", params=["memory", "redis", "redis_cluster"])
+async def backend(request):
+    """Each storage backend in turn; tests using it form the conformance suite.
+
+    The cluster run is skipped unless a Redis Cluster answers at REDIS_CLUSTER_URL.
+    """
+    if request.param == "memory":
+        yield MemoryBackend()
+    elif request.param == "redis":
+        yield RedisBackend(redis_client)
+    else:
+        from redis.asyncio.cluster import RedisCluster
+
+        from app.storage.cluster import RedisClusterBackend
+
+        client = RedisCluster.from_url(REDIS_CLUSTER_URL, decode_responses=True)
+        try:
+            await client.initialize()
+        except Exception:
+            pytest.skip(f"no Redis Cluster at {REDIS_CLUSTER_URL}")
+        cluster = RedisClusterBackend(client, owns_client=True)
+        yield cluster
+        await cluster.aclose()
+
+
 @pytest.fixture(autouse=True, scope="session")
 async def _clean_db():
     """Truncate all tables before the test session to avoid cross-run pollution."""
@@ -25,6 +53,23 @@ async def _clean_db():
         await session.commit()
 
 
+@pytest.fixture(autouse=True)
+async def _reset_admin_rate_limit():
+    """The suite makes far more than ADMIN_RATE_LIMIT_RPM admin calls (and
+    LOGIN_RATE_LIMIT_PER_IP logins) per minute from one client IP; reset the
+    per-IP counters so tests stay independent."""
+    keys = [k async for k in redis_client.scan_iter("admin_rl:*")]
+    keys += [k async for k in redis_client.scan_iter("login_rl:*")]
+    if keys:
+        await redis_client.delete(*keys)
+
+
+@pytest.fixture(autouse=True)
+def _reset_penalty_box():
+    """Local blocks outlive the Redis counters tests reset between requests."""
+    penalty_box.clear()
+
+
 @pytest.fixture
 async def client():
     transport = ASGITransport(app=app)
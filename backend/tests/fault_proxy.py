@@ -0,0 +1,95 @@
+"""TCP proxy that injects latency and drops in front of Redis (or anything).
+
+Used by the resilience tests; also runnable by hand to watch the API's tail
+latency while Redis misbehaves:
+
+    cd backend && python -m tests.fault_proxy --listen 6380 --latency 0.5 --drop 0.1
+    REDIS_URL=redis://localhost:6380/0 uvicorn app.main:app
+
+``latency`` delays every chunk sent towards the upstream; ``drop_rate`` is
+the chance that a chunk is swallowed and the connection reset instead.
+Both can be changed while the proxy is running.
+"""
+import argparse
+import asyncio
+import random
+
+
+class FaultProxy:
+    def __init__(
+        self,
+        upstream_host: str = "localhost",
+        upstream_port: int = 6379,
+        latency: float = 0.0,
+        drop_rate: float = 0.0,
+    ):
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.port: int | None = None
+        self._server: asyncio.Server | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self, port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _handle(self, client_reader, client_writer) -> None:
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(
+                self.upstream_host, self.upstream_port
+            )
+        except OSError:
+            client_writer.close()
+            return
+        upstream = asyncio.create_task(
+            self._pipe(client_reader, upstream_writer, client_writer, inject=True)
+        )
+        downstream = asyncio.create_task(
+            self._pipe(upstream_reader, client_writer, upstream_writer, inject=False)
+        )
+        self._tasks.update((upstream, downstream))
+        upstream.add_done_callback(self._tasks.discard)
+        downstream.add_done_callback(self._tasks.discard)
+
+    async def _pipe(self, reader, writer, peer, inject: bool) -> None:
+        try:
+            while data := await reader.read(65536):
+                if inject:
+                    if self.drop_rate and random.random() < self.drop_rate:
+                        break
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                writer.write(data)
+                await writer.drain()
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            peer.close()
+
+
+async def _main(args) -> None:
+    proxy = FaultProxy(args.upstream_host, args.upstream_port, args.latency, args.drop)
+    port = await proxy.start(args.listen)
+    print(f"proxying :{port} -> {args.upstream_host}:{args.upstream_port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listen", type=int, default=6380)
+    parser.add_argument("--upstream-host", default="localhost")
+    parser.add_argument("--upstream-port", type=int, default=6379)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--drop", type=float, default=0.0)
+    asyncio.run(_main(parser.parse_args()))
@@ -1,4 +1,13 @@
+import time
+import uuid
+
+import jwt
 import pytest
+from sqlalchemy import event
+
+from app.config import ADMIN_API_TOKEN, JWT_ALGORITHM, JWT_SECRET
+from app.database import engine
+from app.principal_cache import principal_cache
 
 pytestmark = pytest.mark.asyncio(loop_scope="session")
 
@@ -32,3 +41,65 @@ async def test_malformed_auth_scheme_returns_403(client):
         headers={"Authorization": "Basic dXNlcjpwYXNz"},
     )
     assert resp.status_code == 403
+
+
+async def _register(client) -> tuple[str, str]:
+    resp = await client.post(
+        "/auth/register",
+        json={"email": f"principal-{uuid.uuid4().hex[:8]}@example.com", "password": "password123"},
+    )
+    token = resp.json()["access_token"]
+    return token, jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])["sub"]
+
+
+async def test_cached_token_skips_the_user_lookup(client):
+    token, _ = await _register(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    await client.get("/admin/api-keys", headers=headers)
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        resp = await client.get("/admin/api-keys", headers=headers)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert resp.status_code == 200
+    assert len(statements) == 1
+    assert "FROM users" not in statements[0]
+
+
+async def test_cached_principal_expires_with_the_token(client):
+    _, user_id = await _register(client)
+    exp = int(time.time()) + 60
+    token = jwt.encode({"sub": user_id, "exp": exp}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+    resp = await client.get("/admin/plans", headers={"Authorization": f"Bearer {token}"})
+
+    assert resp.status_code == 200
+    assert principal_cache._entries[token][1] <= exp
+
+
+async def test_removed_user_is_rejected_at_once(client):
+    token, user_id = await _register(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    plan = await client.post(
+        "/admin/plans", json={"name": "doomed", "default_rpm": 10}, headers=headers
+    )
+    key = await client.post(
+        "/admin/api-keys", json={"label": "doomed", "plan_id": plan.json()["id"]}, headers=headers
+    )
+    key_headers = {"X-API-Key": key.json()["plaintext_key"]}
+    assert (await client.get("/v1/hello", headers=key_headers)).status_code == 200
+
+    resp = await client.delete(
+        f"/admin/users/{user_id}", headers={"Authorization": f"Bearer {ADMIN_API_TOKEN}"}
+    )
+    assert resp.status_code == 204
+
+    resp = await client.get("/admin/plans", headers=headers)
+    assert resp.status_code == 401
+    assert (await client.get("/v1/hello", headers=key_headers)).status_code == 401
@@ -0,0 +1,135 @@
+import uuid
+
+import pytest
+
+from app.algorithms import FIXED_WINDOW, GCRA, SLIDING_WINDOW, Charge, Limit
+from app.rate_limiter import _plan_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+# Start of some 60s window, far enough in the future not to collide with
+# counters written by the other tests.
+T0 = 10_000_000_020 * 60 * 1000
+
+
+def _prefix(backend) -> str:
+    return backend.key_prefix(f"test-{uuid.uuid4().hex}")
+
+
+async def _decide(backend, algorithm, prefix, limit, now_ms, burst=None):
+    charges = [Charge(Limit("minute", limit, algorithm, burst), prefix)]
+    return await backend.decide(charges, now_ms, f"{prefix}seen")
+
+
+async def _burst(backend, algorithm, prefix, limit, now_ms, n, burst=None):
+    allowed = 0
+    for _ in range(n):
+        allowed += (await _decide(backend, algorithm, prefix, limit, now_ms, burst)).allowed
+    return allowed
+
+
+async def test_fixed_window_allows_double_burst_at_boundary(backend):
+    prefix = _prefix(backend)
+
+    assert await _burst(backend, FIXED_WINDOW, prefix, 10, T0 + 59_900, 10) == 10
+    assert await _burst(backend, FIXED_WINDOW, prefix, 10, T0 + 60_100, 10) == 10
+
+
+async def test_sliding_window_smooths_boundary_burst(backend):
+    prefix = _prefix(backend)
+
+    assert await _burst(backend, SLIDING_WINDOW, prefix, 10, T0 + 59_900, 10) == 10
+    # Just after the boundary almost all of the previous window still counts
+    assert await _burst(backend, SLIDING_WINDOW, prefix, 10, T0 + 60_100, 10) == 0
+    # Half a window later half of it has decayed
+    assert await _burst(backend, SLIDING_WINDOW, prefix, 10, T0 + 90_000, 10) == 5
+
+
+async def test_sliding_window_retry_after_points_at_next_allowed_request(backend):
+    prefix = _prefix(backend)
+    await _burst(backend, SLIDING_WINDOW, prefix, 10, T0 + 59_900, 10)
+
+    rejected = await _decide(backend, SLIDING_WINDOW, prefix, 10, T0 + 60_100, None)
+    assert not rejected.allowed
+
+    retry_at = T0 + 60_100 + int(rejected.retry_after * 1000)
+    assert (await _decide(backend, SLIDING_WINDOW, prefix, 10, retry_at, None)).allowed
+
+
+async def test_gcra_admits_burst_then_steady_rate(backend):
+    prefix = _prefix(backend)
+
+    # 60 per minute = one per second, up to 5 back to back
+    assert await _burst(backend, GCRA, prefix, 60, T0, 10, burst=5) == 5
+
+    rejected = await _decide(backend, GCRA, prefix, 60, T0, 5)
+    assert not rejected.allowed
+    assert rejected.retry_after == pytest.approx(1.0)
+
+    assert await _burst(backend, GCRA, prefix, 60, T0 + 1000, 3, burst=5) == 1
+    assert await _burst(backend, GCRA, prefix, 60, T0 + 3000, 3, burst=5) == 2
+
+
+async def test_gcra_remaining_counts_down_the_burst(backend):
+    prefix = _prefix(backend)
+
+    first = await _decide(backend, GCRA, prefix, 60, T0, 3)
+    second = await _decide(backend, GCRA, prefix, 60, T0, 3)
+
+    assert (first.remaining, second.remaining) == (2, 1)
+
+
+async def test_plan_algorithm_roundtrip(client, admin_headers):
+    resp = await client.post(
+        "/admin/plans",
+        json={
+            "name": f"gcra-{uuid.uuid4().hex[:8]}",
+            "default_rpm": 600,
+            "algorithm": "gcra",
+            "burst": 20,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201
+    plan = resp.json()
+    assert (plan["algorithm"], plan["burst"]) == ("gcra", 20)
+
+    resp = await client.patch(
+        f"/admin/plans/{plan['id']}",
+        json={"algorithm": "sliding_window"},
+        headers=admin_headers,
+    )
+    assert resp.json()["algorithm"] == "sliding_window"
+
+
+async def test_unknown_algorithm_rejected(client, admin_headers):
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"bad-{uuid.uuid4().hex[:8]}", "default_rpm": 10, "algorithm": "leaky"},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 422
+
+
+async def test_middleware_enforces_plan_algorithm(client, admin_headers):
+    _plan_cache.clear()
+    resp = await client.post(
+        "/admin/plans",
+        json={
+            "name": f"gcra-{uuid.uuid4().hex[:8]}",
+            "default_rpm": 60,
+            "algorithm": "gcra",
+            "burst": 2,
+        },
+        headers=admin_headers,
+    )
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "gcra-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    headers = {"X-API-Key": resp.json()["plaintext_key"]}
+
+    statuses = [(await client.get("/v1/hello", headers=headers)).status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
@@ -1,10 +1,15 @@
-import asyncio
+import hashlib
+import json
 import uuid
+from datetime import datetime, timezone
 
 import pytest
+from sqlalchemy import select
 
 from app.database import AsyncSessionLocal
-from app.models import ApiKey
+from app.last_used import last_used_writer
+from app.models import ApiKey, Plan
+from app.routers import admin
 
 pytestmark = pytest.mark.asyncio(loop_scope="session")
 
@@ -164,11 +169,145 @@ async def test_last_used_at_updates_after_request(client, admin_headers, api_key
     )
     assert resp.status_code == 200
 
-    # The update is fire-and-forget; give it time to flush
-    await asyncio.sleep(0.5)
+    # last_used_at is buffered in memory and written in bulk; force a flush
+    await last_used_writer.flush()
 
     # Check the DB directly
     async with AsyncSessionLocal() as session:
         key = await session.get(ApiKey, uuid.UUID(api_key["id"]))
         assert key is not None
         assert key.last_used_at is not None
+
+
+async def test_list_api_keys_pages_by_cursor(client):
+    resp = await client.post(
+        "/auth/register",
+        json={"email": f"pages-{uuid.uuid4().hex[:8]}@example.com", "password": "password123"},
+    )
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    resp = await client.post(
+        "/admin/plans", json={"name": "pages", "default_rpm": 10}, headers=headers
+    )
+    plan_id = uuid.UUID(resp.json()["id"])
+    # Keys created in the same instant are ordered by id
+    created_at = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        user_id = (await session.get(Plan, plan_id)).user_id
+        session.add_all(
+            ApiKey(
+                key_hash=hashlib.sha256(uuid.uuid4().bytes).hexdigest(),
+                label=f"page-{i}",
+                plan_id=plan_id,
+                created_at=created_at,
+                user_id=user_id,
+            )
+            for i in range(5)
+        )
+        await session.commit()
+        expected = (
+            await session.execute(
+                select(ApiKey.id).where(ApiKey.user_id == user_id).order_by(ApiKey.id)
+            )
+        ).scalars().all()
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = await client.get("/admin/api-keys", params=params, headers=headers)
+        pages.append([uuid.UUID(k["id"]) for k in resp.json()])
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [key_id for page in pages for key_id in page] == expected
+
+
+async def _bulk_create(client, headers, plan_id: str, count: int) -> list[dict]:
+    resp = await client.post(
+        "/admin/api-keys/bulk",
+        json={"label": "bulk", "plan_id": plan_id, "count": count},
+        headers=headers,
+    )
+    assert resp.status_code == 201, resp.text
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in resp.text.splitlines()]
+
+
+async def test_bulk_create_streams_usable_keys(client, admin_headers, plan, monkeypatch):
+    monkeypatch.setattr(admin, "_BULK_INSERT_ROWS", 3)
+
+    keys = await _bulk_create(client, admin_headers, plan["id"], 7)
+
+    assert len(keys) == 7
+    assert len({k["plaintext_key"] for k in keys}) == 7
+    assert {(k["label"], k["plan_id"], k["is_active"]) for k in keys} == {
+        ("bulk", plan["id"], True)
+    }
+    resp = await client.get("/v1/hello", headers={"X-API-Key": keys[-1]["plaintext_key"]})
+    assert resp.status_code == 200
+
+
+async def test_bulk_create_on_unknown_plan_returns_404(client, admin_headers):
+    resp = await client.post(
+        "/admin/api-keys/bulk",
+        json={"label": "bulk", "plan_id": str(uuid.uuid4()), "count": 3},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 404
+
+
+async def test_bulk_deactivate_reactivate_and_delete(client, admin_headers, plan):
+    keys = await _bulk_create(client, admin_headers, plan["id"], 3)
+    ids = [k["id"] for k in keys]
+    for key in keys:  # cache them as active
+        await client.get("/v1/hello", headers={"X-API-Key": key["plaintext_key"]})
+
+    resp = await client.patch(
+        "/admin/api-keys/bulk",
+        json={"ids": ids[:2] + [str(uuid.uuid4())], "is_active": False},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    assert sorted(resp.json()["ids"]) == sorted(ids[:2])  # unknown ids are skipped
+    statuses = [
+        (await client.get("/v1/hello", headers={"X-API-Key": k["plaintext_key"]})).status_code
+        for k in keys
+    ]
+    assert statuses == [401, 401, 200]
+
+    resp = await client.patch(
+        "/admin/api-keys/bulk", json={"ids": ids[:1], "is_active": True}, headers=admin_headers
+    )
+    assert resp.json()["ids"] == ids[:1]
+    resp = await client.get("/v1/hello", headers={"X-API-Key": keys[0]["plaintext_key"]})
+    assert resp.status_code == 200
+
+    resp = await client.post(
+        "/admin/api-keys/bulk/delete", json={"ids": ids}, headers=admin_headers
+    )
+    assert sorted(resp.json()["ids"]) == sorted(ids)
+    async with AsyncSessionLocal() as session:
+        remaining = await session.execute(select(ApiKey.id).where(ApiKey.id.in_(ids)))
+        assert remaining.all() == []
+    resp = await client.get("/v1/hello", headers={"X-API-Key": keys[2]["plaintext_key"]})
+    assert resp.status_code == 401
+
+
+async def test_bulk_operations_skip_other_users_keys(client, api_key):
+    resp = await client.post(
+        "/auth/register",
+        json={"email": f"bulk-{uuid.uuid4().hex[:8]}@example.com", "password": "password123"},
+    )
+    other = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    for path, body in (
+        ("/admin/api-keys/bulk", {"ids": [api_key["id"]], "is_active": False}),
+        ("/admin/api-keys/bulk/delete", {"ids": [api_key["id"]]}),
+    ):
+        method = client.patch if path.endswith("bulk") else client.post
+        resp = await method(path, json=body, headers=other)
+        assert resp.json() == {"ids": []}
+
+    resp = await client.get("/v1/hello", headers={"X-API-Key": api_key["plaintext_key"]})
+    assert resp.status_code == 200
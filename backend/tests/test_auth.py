@@ -1,5 +1,14 @@
+import asyncio
+import statistics
+import time
+import types
+import uuid
+
 import pytest
 
+from app.passwords import PasswordHasher
+from app.routers import auth
+
 pytestmark = pytest.mark.asyncio(loop_scope="session")
 
 
@@ -89,3 +98,66 @@ async def test_jwt_scopes_plans_to_owner(client):
     assert resp.status_code == 200
     names = [p["name"] for p in resp.json()]
     assert "plan-for-a" not in names
+
+
+async def _registered(client) -> dict:
+    body = {"email": f"storm-{uuid.uuid4().hex[:8]}@example.com", "password": "password123"}
+    await client.post("/auth/register", json=body)
+    return body
+
+
+async def test_login_is_throttled_per_email(client, monkeypatch):
+    body = await _registered(client)
+    # Keep every attempt in the same one-minute window
+    now = time.time() // 60 * 60 + 30
+    monkeypatch.setattr(auth, "time", types.SimpleNamespace(time=lambda: now))
+    wrong = {**body, "password": "wrong"}
+    statuses = [
+        (await client.post("/auth/login", json=wrong)).status_code
+        for _ in range(auth.LOGIN_RATE_LIMIT_PER_EMAIL)
+    ]
+    assert set(statuses) == {401}
+
+    resp = await client.post("/auth/login", json=body)
+
+    assert resp.status_code == 429
+    assert 0 < int(resp.headers["Retry-After"]) <= 60
+
+
+async def test_saturated_hashing_pool_returns_503(client, monkeypatch):
+    body = await _registered(client)
+    monkeypatch.setattr(auth, "password_hasher", PasswordHasher(workers=1, max_queue=1))
+
+    responses = await asyncio.gather(
+        *(client.post("/auth/login", json=body) for _ in range(5))
+    )
+
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [200, 200, 503, 503, 503]
+    assert next(r for r in responses if r.status_code == 503).headers["Retry-After"] == "1"
+
+
+async def test_hello_latency_stays_flat_during_login_storm(client, api_key, monkeypatch):
+    body = await _registered(client)
+    monkeypatch.setattr(auth, "LOGIN_RATE_LIMIT_PER_EMAIL", 1000)
+    headers = {"X-API-Key": api_key["plaintext_key"]}
+
+    async def hello_latencies(count: int) -> list[float]:
+        latencies = []
+        for _ in range(count):
+            t0 = time.perf_counter()
+            assert (await client.get("/v1/hello", headers=headers)).status_code == 200
+            latencies.append(time.perf_counter() - t0)
+            await asyncio.sleep(0.01)
+        return latencies
+
+    baseline = await hello_latencies(20)
+    storm = [asyncio.create_task(client.post("/auth/login", json=body)) for _ in range(8)]
+    during = await hello_latencies(30)
+    still_hashing = not all(task.done() for task in storm)
+    statuses = {(await task).status_code for task in storm}
+
+    assert still_hashing  # the storm outlasted the measurement
+    assert statuses <= {200, 503}
+    # One bcrypt call on the loop would stall a request for 250 ms or more
+    assert max(during) < 0.1, (statistics.median(baseline), max(during))
@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import json
+import uuid
+
+import psycopg
+import pytest
+from sqlalchemy import update
+
+from app.change_feed import CHANNEL, change_feed
+from app.database import AsyncSessionLocal
+from app.key_cache import key_cache
+from app.last_used import last_used_writer
+from app.models import ApiKey, Plan
+from app.rate_limiter import _plan_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest.fixture
+async def listener():
+    """A LISTEN connection on the feed's channel; returns the payloads seen so far."""
+    conn = await psycopg.AsyncConnection.connect(change_feed.dsn, autocommit=True)
+    await conn.execute(f"LISTEN {CHANNEL}")
+
+    async def received() -> list[str]:
+        return [n.payload async for n in conn.notifies(timeout=0.2)]
+
+    yield received
+    await conn.close()
+
+
+@pytest.fixture
+async def feed():
+    """The app's change feed, running; yields (start, stop) to reconnect it."""
+    tasks = []
+
+    async def start() -> None:
+        resyncs = change_feed.resyncs
+        tasks.append(asyncio.create_task(change_feed.run()))
+        for _ in range(200):
+            if change_feed.resyncs > resyncs:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("change feed did not connect")
+
+    async def stop() -> None:
+        tasks[-1].cancel()
+        await asyncio.gather(tasks[-1], return_exceptions=True)
+
+    await start()
+    yield start, stop
+    await stop()
+
+
+async def _eventually(predicate) -> None:
+    for _ in range(100):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("not applied")
+
+
+async def _limit(client, key) -> int:
+    resp = await client.get("/v1/hello", headers={"X-API-Key": key["plaintext_key"]})
+    return int(resp.headers["x-ratelimit-limit"])
+
+
+async def _execute(statement) -> None:
+    # Straight to Postgres, bypassing the admin endpoints' own invalidation
+    async with AsyncSessionLocal() as session:
+        await session.execute(statement)
+        await session.commit()
+
+
+async def test_triggers_notify_changed_plans_and_keys(client, admin_headers, plan, listener):
+    resp = await client.post(
+        "/admin/api-keys/bulk",
+        json={"label": "feed", "plan_id": plan["id"], "count": 150},
+        headers=admin_headers,
+    )
+    hashes = [
+        hashlib.sha256(json.loads(line)["plaintext_key"].encode()).hexdigest()
+        for line in resp.text.splitlines()
+    ]
+    await client.patch(f"/admin/plans/{plan['id']}", json={"default_rpm": 5}, headers=admin_headers)
+
+    payloads = await listener()
+
+    # One statement's keys in payloads of at most 100
+    key_payloads = [p.split() for p in payloads if p.startswith("key ")]
+    assert [len(p) - 1 for p in key_payloads] == [100, 50]
+    assert sorted(h for p in key_payloads for h in p[1:]) == sorted(hashes)
+    assert f"plan {plan['id']}" in payloads
+
+
+async def test_last_used_flushes_do_not_notify(client, api_key, listener):
+    await client.get("/v1/hello", headers={"X-API-Key": api_key["plaintext_key"]})
+    await listener()
+
+    assert await last_used_writer.flush() >= 1
+
+    assert await listener() == []
+
+
+async def test_plan_change_reaches_the_cache(client, api_key, feed):
+    assert await _limit(client, api_key) == 100
+
+    plan_id = uuid.UUID(api_key["plan_id"])
+    await _execute(update(Plan).where(Plan.id == plan_id).values(default_rpm=7))
+
+    await _eventually(lambda: api_key["plan_id"] not in _plan_cache)
+    assert await _limit(client, api_key) == 7
+
+
+async def test_key_change_reaches_the_cache(client, api_key, feed):
+    headers = {"X-API-Key": api_key["plaintext_key"]}
+    assert (await client.get("/v1/hello", headers=headers)).status_code == 200
+    key_hash = hashlib.sha256(api_key["plaintext_key"].encode()).hexdigest()
+
+    await _execute(update(ApiKey).where(ApiKey.key_hash == key_hash).values(is_active=False))
+
+    await _eventually(lambda: key_hash not in key_cache._entries)
+    assert (await client.get("/v1/hello", headers=headers)).status_code == 401
+
+
+async def test_changes_missed_while_disconnected_are_resynced(client, api_key, feed):
+    start, stop = feed
+    assert await _limit(client, api_key) == 100
+    key_hash = hashlib.sha256(api_key["plaintext_key"].encode()).hexdigest()
+    await stop()
+
+    plan_id = uuid.UUID(api_key["plan_id"])
+    await _execute(update(Plan).where(Plan.id == plan_id).values(default_rpm=9))
+    await _execute(update(ApiKey).where(ApiKey.key_hash == key_hash).values(is_active=False))
+    await asyncio.sleep(0.1)
+    assert api_key["plan_id"] in _plan_cache and key_cache._entries[key_hash][0].is_active
+
+    await start()
+
+    # Reloaded in place rather than dropped
+    assert _plan_cache[api_key["plan_id"]][0].limits[0].limit == 9
+    assert key_cache._entries[key_hash][0].is_active is False
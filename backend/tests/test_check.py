@@ -0,0 +1,107 @@
+import uuid
+
+import pytest
+
+from app.config import ADMIN_API_TOKEN
+from app.key_cache import key_cache
+from app.rate_limiter import _plan_cache
+from app.redis_client import redis_client
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+SERVICE_HEADERS = {"Authorization": f"Bearer {ADMIN_API_TOKEN}"}
+
+
+@pytest.fixture(autouse=True)
+def _clean_caches():
+    _plan_cache.clear()
+    key_cache.clear()
+
+
+async def _key(client, admin_headers, rpm: int) -> str:
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"check-plan-{uuid.uuid4().hex[:8]}", "default_rpm": rpm},
+        headers=admin_headers,
+    )
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "check-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    return resp.json()["plaintext_key"]
+
+
+async def test_check_requires_service_token(client, api_key):
+    body = {"key": api_key["plaintext_key"]}
+
+    assert (await client.post("/v1/check", json=body)).status_code == 403
+    assert (
+        await client.post("/v1/check", json=body, headers={"Authorization": "Bearer nope"})
+    ).status_code == 403
+
+
+async def test_paths_that_only_start_with_check_still_need_a_key(client):
+    for path in ("/v1/checkout", "/v1/checks/1"):
+        resp = await client.get(path)
+        assert resp.status_code == 401, path
+        assert resp.json()["detail"] == "Missing X-API-Key header"
+
+
+async def test_check_charges_the_key(client, admin_headers):
+    key = await _key(client, admin_headers, rpm=3)
+
+    resp = await client.post(
+        "/v1/check", json={"key": key, "cost": 2}, headers=SERVICE_HEADERS
+    )
+    assert resp.status_code == 200
+    result = resp.json()
+    assert (result["status"], result["allowed"]) == (200, True)
+    assert (result["limit"], result["remaining"]) == (3, 1)
+    assert result["retry_after"] is None
+
+    # the same budget /v1 requests draw from
+    resp = await client.get("/v1/hello", headers={"X-API-Key": key})
+    assert resp.headers["X-RateLimit-Remaining"] == "0"
+    resp = await client.post("/v1/check", json={"key": key}, headers=SERVICE_HEADERS)
+    assert resp.json()["status"] == 429
+    assert resp.json()["retry_after"] >= 1
+
+
+async def test_batch_decides_each_item_in_order(client, admin_headers):
+    small = await _key(client, admin_headers, rpm=3)
+    large = await _key(client, admin_headers, rpm=100)
+    checks = [
+        {"key": small},
+        {"key": large, "cost": 10},
+        {"key": "not-a-key"},
+        {"key": small, "cost": 2},
+        {"key": small},
+    ]
+
+    resp = await client.post("/v1/check/batch", json={"checks": checks}, headers=SERVICE_HEADERS)
+
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["status"] for r in results] == [200, 200, 401, 200, 429]
+    assert [r["remaining"] for r in results] == [2, 90, 0, 0, 0]
+
+
+async def test_batch_reloads_the_script_after_script_flush(client, admin_headers):
+    key = await _key(client, admin_headers, rpm=5)
+    await client.post("/v1/check/batch", json={"checks": [{"key": key}]}, headers=SERVICE_HEADERS)
+
+    await redis_client.script_flush()
+    resp = await client.post(
+        "/v1/check/batch", json={"checks": [{"key": key}] * 2}, headers=SERVICE_HEADERS
+    )
+
+    assert resp.status_code == 200
+    assert [r["remaining"] for r in resp.json()["results"]] == [3, 2]
+
+
+async def test_batch_size_is_bounded(client):
+    resp = await client.post(
+        "/v1/check/batch", json={"checks": [{"key": "k"}] * 1001}, headers=SERVICE_HEADERS
+    )
+    assert resp.status_code == 422
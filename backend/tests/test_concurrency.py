@@ -0,0 +1,261 @@
+import asyncio
+import random
+import uuid
+
+import pytest
+from starlette.responses import StreamingResponse
+
+from app.concurrency import concurrency_limiter
+from app.rate_limiter import RateLimitMiddleware
+from app.storage import storage
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+LIMIT = 5
+
+
+async def _capped_key(
+    client, admin_headers, max_concurrent=LIMIT, failure_mode="local", default_rpm=1_000_000
+) -> tuple[str, str]:
+    """(plaintext key, its slot set) for a new key on a capped plan."""
+    resp = await client.post(
+        "/admin/plans",
+        json={
+            "name": f"concurrent-{uuid.uuid4().hex[:8]}",
+            "default_rpm": default_rpm,
+            "max_concurrent": max_concurrent,
+            "failure_mode": failure_mode,
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201
+    assert resp.json()["max_concurrent"] == max_concurrent
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "concurrent", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201
+    body = resp.json()
+    return body["plaintext_key"], f"{storage.key_prefix(body['id'])}inflight"
+
+
+class SlowStream:
+    """Streams a few chunks slowly and tracks how many requests are inside."""
+
+    def __init__(self):
+        self.inside = 0
+        self.peak = 0
+        self.served = 0
+
+    async def __call__(self, scope, receive, send):
+        self.inside += 1
+        self.peak = max(self.peak, self.inside)
+        try:
+
+            async def chunks():
+                for _ in range(4):
+                    await asyncio.sleep(random.uniform(0.002, 0.01))
+                    yield b"x"
+
+            await StreamingResponse(chunks())(scope, receive, send)
+            self.served += 1
+        finally:
+            self.inside -= 1
+
+
+async def _request(app, key: str, disconnect_after: float | None = None) -> int | None:
+    """Status code sent, or None if nothing was sent before the client left."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/v1/hello",
+        "raw_path": b"/v1/hello",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"test"), (b"x-api-key", key.encode())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _assert_all_slots_free(slots: str) -> None:
+    await concurrency_limiter.drain()
+    assert concurrency_limiter.stats()["held"] == 0
+    assert await storage.client.zcard(slots) == 0
+
+
+class Gate:
+    """Holds every admitted request until ``open`` is set."""
+
+    def __init__(self):
+        self.inside = 0
+        self.open = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        self.inside += 1
+        await self.open.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def _rejected(tasks: list[asyncio.Task], count: int) -> list[int]:
+    while sum(task.done() for task in tasks) < count:
+        await asyncio.sleep(0.005)
+    return [task.result() for task in tasks if task.done()]
+
+
+async def test_requests_over_the_cap_are_rejected(client, admin_headers):
+    key, slots = await _capped_key(client, admin_headers, max_concurrent=2)
+    gate = Gate()
+    app = RateLimitMiddleware(gate)
+
+    tasks = [asyncio.create_task(_request(app, key)) for _ in range(6)]
+    assert await _rejected(tasks, 4) == [429] * 4
+    assert gate.inside == 2
+    gate.open.set()
+    assert sorted(await asyncio.gather(*tasks)) == [200, 200, 429, 429, 429, 429]
+
+    await _assert_all_slots_free(slots)
+    # the slots are usable again
+    assert await asyncio.gather(*(_request(app, key) for _ in range(2))) == [200, 200]
+
+
+async def test_rejection_names_the_cap(client, admin_headers):
+    key, _ = await _capped_key(client, admin_headers, max_concurrent=1)
+    gate = Gate()
+    app = RateLimitMiddleware(gate)
+    first = asyncio.create_task(_request(app, key))
+    while not gate.inside:
+        await asyncio.sleep(0.005)
+
+    headers = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            headers.update(message["headers"])
+            headers["status"] = message["status"]
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/v1/hello",
+        "headers": [(b"x-api-key", key.encode())],
+        "client": ("127.0.0.1", 1234),
+    }
+    await app(scope, None, send)
+    gate.open.set()
+    assert await first == 200
+
+    assert headers["status"] == 429
+    assert headers[b"x-concurrency-limit"] == b"1"
+    assert headers[b"retry-after"] == b"1"
+
+
+async def test_requests_over_the_cap_are_not_charged(client, admin_headers):
+    key, slots = await _capped_key(client, admin_headers, max_concurrent=1, default_rpm=3)
+    gate = Gate()
+    app = RateLimitMiddleware(gate)
+    first = asyncio.create_task(_request(app, key))
+    while not gate.inside:
+        await asyncio.sleep(0.005)
+
+    assert await asyncio.gather(*(_request(app, key) for _ in range(3))) == [429] * 3
+    gate.open.set()
+    assert await first == 200
+
+    # Only the admitted request was charged; a rate limited one frees its slot
+    assert [await _request(app, key) for _ in range(3)] == [200, 200, 429]
+    await _assert_all_slots_free(slots)
+
+
+async def test_slot_accounting_survives_cancellation_and_disconnects(client, admin_headers):
+    """Stress: a mix of completed, cancelled and abandoned requests never lets
+    more than LIMIT in at once, and leaves no slot behind."""
+    # Fail closed, so a breaker trip under load can't lift the cap either
+    key, slots = await _capped_key(client, admin_headers, failure_mode="closed")
+    inner = SlowStream()
+    app = RateLimitMiddleware(inner)
+    rng = random.Random(16)
+    assert await _request(app, key) == 200  # key and plan cached
+
+    async def one(kind: str) -> int | None:
+        await asyncio.sleep(rng.uniform(0, 0.5))
+        if kind == "disconnect":
+            return await _request(app, key, disconnect_after=rng.uniform(0, 0.01))
+        return await _request(app, key)
+
+    kinds = [rng.choice(["complete", "cancel", "disconnect"]) for _ in range(300)]
+    tasks = [asyncio.create_task(one(kind)) for kind in kinds]
+    for task, kind in zip(tasks, kinds):
+        if kind == "cancel":
+            asyncio.get_running_loop().call_later(rng.uniform(0, 0.55), task.cancel)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert 1 < inner.peak <= LIMIT
+    assert inner.inside == 0
+    statuses = [r for r in results if not isinstance(r, BaseException)]
+    assert 429 in statuses
+    assert statuses.count(200) > LIMIT  # slots were freed and reused
+    assert any(isinstance(r, asyncio.CancelledError) for r in results)
+
+    await _assert_all_slots_free(slots)
+    statuses = await asyncio.gather(*(_request(app, key) for _ in range(LIMIT + 1)))
+    assert sorted(statuses) == [200] * LIMIT + [429]
+    await _assert_all_slots_free(slots)
+
+
+async def test_uncapped_plans_take_no_slot(client, api_key):
+    inner = SlowStream()
+    app = RateLimitMiddleware(inner)
+
+    statuses = await asyncio.gather(*(_request(app, api_key["plaintext_key"]) for _ in range(20)))
+
+    assert statuses == [200] * 20
+    assert concurrency_limiter.stats()["held"] == 0
+
+
+async def test_cap_can_be_removed(client, admin_headers, plan):
+    resp = await client.patch(
+        f"/admin/plans/{plan['id']}", json={"max_concurrent": 1}, headers=admin_headers
+    )
+    assert resp.json()["max_concurrent"] == 1
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "concurrent", "plan_id": plan["id"]},
+        headers=admin_headers,
+    )
+    key = resp.json()["plaintext_key"]
+    app = RateLimitMiddleware(SlowStream())
+    statuses = await asyncio.gather(*(_request(app, key) for _ in range(3)))
+    assert sorted(statuses) == [200, 429, 429]
+
+    resp = await client.patch(
+        f"/admin/plans/{plan['id']}", json={"max_concurrent": None}, headers=admin_headers
+    )
+    assert resp.json()["max_concurrent"] is None
+
+    assert await asyncio.gather(*(_request(app, key) for _ in range(3))) == [200] * 3
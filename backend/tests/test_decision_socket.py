@@ -0,0 +1,103 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.decision_socket import (
+    LENGTH,
+    DecisionServer,
+    decode_response,
+    encode_request,
+)
+from app.key_cache import key_cache
+from app.rate_limiter import _plan_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest.fixture
+async def server(tmp_path):
+    _plan_cache.clear()
+    key_cache.clear()
+    server = DecisionServer(str(tmp_path / "decisions.sock"), 0o600)
+    await server.start()
+    yield server
+    await server.close()
+
+
+async def _read_responses(reader, count: int):
+    responses = []
+    for _ in range(count):
+        (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+        responses.append(decode_response(await reader.readexactly(length)))
+    return responses
+
+
+async def _key(client, admin_headers, rpm: int) -> str:
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"sock-plan-{uuid.uuid4().hex[:8]}", "default_rpm": rpm},
+        headers=admin_headers,
+    )
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "sock-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    return resp.json()["plaintext_key"]
+
+
+async def test_pipelined_requests_are_answered_in_order(server, client, admin_headers):
+    key = await _key(client, admin_headers, rpm=3)
+    reader, writer = await asyncio.open_unix_connection(server.path)
+
+    writer.write(
+        encode_request(1, key)
+        + encode_request(2, "not-a-key")
+        + encode_request(3, key, cost=2)
+        + encode_request(4, key)
+    )
+    responses = await _read_responses(reader, 4)
+    writer.close()
+
+    assert [request_id for request_id, _ in responses] == [1, 2, 3, 4]
+    assert [o.status for _, o in responses] == [200, 401, 200, 429]
+    assert [o.remaining for _, o in responses] == [2, 0, 0, 0]
+    assert responses[0][1].retry_after is None
+    assert responses[3][1].retry_after >= 1
+    assert server.decisions == 4
+
+
+async def test_shares_counters_with_http(server, client, admin_headers):
+    key = await _key(client, admin_headers, rpm=5)
+    await client.get("/v1/hello", headers={"X-API-Key": key})
+
+    reader, writer = await asyncio.open_unix_connection(server.path)
+    writer.write(encode_request(7, key))
+    [(_, outcome)] = await _read_responses(reader, 1)
+    writer.close()
+
+    assert (outcome.limit, outcome.remaining) == (5, 3)
+
+
+async def test_frame_split_across_writes(server, client, admin_headers):
+    key = await _key(client, admin_headers, rpm=5)
+    frame = encode_request(9, key)
+    reader, writer = await asyncio.open_unix_connection(server.path)
+
+    for i in range(len(frame)):
+        writer.write(frame[i : i + 1])
+        await writer.drain()
+    [(request_id, outcome)] = await _read_responses(reader, 1)
+    writer.close()
+
+    assert (request_id, outcome.status) == (9, 200)
+
+
+async def test_malformed_frame_closes_connection(server):
+    reader, writer = await asyncio.open_unix_connection(server.path)
+
+    writer.write(LENGTH.pack(10**6))
+    assert await reader.read() == b""
+    assert server.malformed == 1
+    writer.close()
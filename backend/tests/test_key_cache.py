@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app.key_cache import (
+    INVALIDATION_CHANNEL,
+    CachedKey,
+    KeyCache,
+    key_cache,
+    listen_for_invalidations,
+)
+from app.redis_client import redis_client
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+def _entry(n: int) -> CachedKey:
+    return CachedKey(key_id=str(n), plan_id="p", is_active=True, redis_prefix=f"rl:{n}:")
+
+
+def _counting_loader():
+    calls = []
+
+    async def loader(key_hash):
+        calls.append(key_hash)
+        await asyncio.sleep(0.01)
+        return _entry(len(calls))
+
+    return loader, calls
+
+
+async def test_second_lookup_is_a_hit():
+    cache = KeyCache(maxsize=10, ttl=60, negative_ttl=60)
+    loader, calls = _counting_loader()
+
+    first = await cache.get("h", loader)
+    second = await cache.get("h", loader)
+
+    assert first == second
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = KeyCache(maxsize=10, ttl=60, negative_ttl=60)
+    loader, calls = _counting_loader()
+
+    results = await asyncio.gather(*(cache.get("hot", loader) for _ in range(50)))
+
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+
+
+async def test_get_many_loads_all_misses_in_one_call():
+    cache = KeyCache(maxsize=10, ttl=60, negative_ttl=60)
+    batches = []
+
+    async def loader(key_hashes):
+        batches.append(key_hashes)
+        return {h: _entry(i) for i, h in enumerate(key_hashes) if h != "unknown"}
+
+    await cache.get("a", _counting_loader()[0])
+    found = await cache.get_many(["a", "b", "c", "b", "unknown"], loader)
+
+    assert batches == [["b", "c", "unknown"]]
+    assert set(found) == {"a", "b", "c", "unknown"}
+    assert found["unknown"] is None
+    # misses (the unknown one included) are cached for the next lookup
+    await cache.get_many(["b", "c", "unknown"], loader)
+    assert len(batches) == 1
+
+
+async def test_expired_entry_is_reloaded():
+    cache = KeyCache(maxsize=10, ttl=0.05, negative_ttl=0.05)
+    loader, calls = _counting_loader()
+
+    await cache.get("h", loader)
+    await asyncio.sleep(0.06)
+    await cache.get("h", loader)
+
+    assert len(calls) == 2
+
+
+async def test_lru_eviction_drops_least_recently_used():
+    cache = KeyCache(maxsize=2, ttl=60, negative_ttl=60)
+    loader, calls = _counting_loader()
+
+    await cache.get("a", loader)
+    await cache.get("b", loader)
+    await cache.get("a", loader)  # a is now most recent
+    await cache.get("c", loader)  # evicts b
+
+    await cache.get("a", loader)
+    assert calls == ["a", "b", "c"]
+    await cache.get("b", loader)
+    assert calls == ["a", "b", "c", "b"]
+
+
+async def test_invalidation_during_load_is_not_overwritten():
+    cache = KeyCache(maxsize=10, ttl=60, negative_ttl=60)
+    loader, calls = _counting_loader()
+
+    pending = asyncio.ensure_future(cache.get("h", loader))
+    await asyncio.sleep(0.001)
+    cache.invalidate("h")
+    await pending
+
+    await cache.get("h", loader)
+    assert len(calls) == 2
+
+
+async def test_requests_hit_cache_after_first_lookup(client, api_key):
+    headers = {"X-API-Key": api_key["plaintext_key"]}
+    key_hash = hashlib.sha256(api_key["plaintext_key"].encode()).hexdigest()
+
+    await client.get("/v1/hello", headers=headers)
+    hits = key_cache.hits
+    await client.get("/v1/hello", headers=headers)
+
+    assert key_cache.hits == hits + 1
+    assert key_cache._entries[key_hash][0].key_id == api_key["id"]
+
+
+async def test_deactivation_invalidates_cached_key(client, admin_headers, api_key):
+    headers = {"X-API-Key": api_key["plaintext_key"]}
+    resp = await client.get("/v1/hello", headers=headers)
+    assert resp.status_code == 200
+
+    await client.patch(
+        f"/admin/api-keys/{api_key['id']}",
+        json={"is_active": False},
+        headers=admin_headers,
+    )
+
+    resp = await client.get("/v1/hello", headers=headers)
+    assert resp.status_code == 401
+
+
+async def test_listener_applies_remote_invalidations():
+    listener = asyncio.create_task(listen_for_invalidations())
+    try:
+        # Wait until the listener has subscribed (it clears the cache on subscribe)
+        for _ in range(100):
+            if await redis_client.pubsub_numsub(INVALIDATION_CHANNEL) != [(INVALIDATION_CHANNEL, 0)]:
+                break
+            await asyncio.sleep(0.01)
+        for key_hash in ("remote-hash", "bulk-1", "bulk-2"):
+            key_cache._entries[key_hash] = (_entry(1), float("inf"))
+
+        await redis_client.publish(INVALIDATION_CHANNEL, "remote-hash")
+        # Bulk operations send several hashes per message
+        await redis_client.publish(INVALIDATION_CHANNEL, "bulk-1 bulk-2")
+        for _ in range(100):
+            if not {"remote-hash", "bulk-1", "bulk-2"} & key_cache._entries.keys():
+                break
+            await asyncio.sleep(0.01)
+        assert not {"remote-hash", "bulk-1", "bulk-2"} & key_cache._entries.keys()
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+
+async def test_metrics_exposes_cache_counters(client):
+    resp = await client.get("/metrics")
+    assert resp.status_code == 200
+    assert {"size", "maxsize", "hits", "misses", "hit_ratio"} <= resp.json()["key_cache"].keys()
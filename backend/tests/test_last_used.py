@@ -0,0 +1,76 @@
+import time
+import uuid
+
+import pytest
+
+from app.database import AsyncSessionLocal
+from app.last_used import LastUsedWriter, last_used_writer
+from app.models import ApiKey
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def _last_used(key_id: str):
+    async with AsyncSessionLocal() as session:
+        key = await session.get(ApiKey, uuid.UUID(key_id))
+        return key.last_used_at
+
+
+async def test_requests_are_coalesced_per_key(client, api_key):
+    await last_used_writer.flush()
+    headers = {"X-API-Key": api_key["plaintext_key"]}
+    for _ in range(5):
+        resp = await client.get("/v1/hello", headers=headers)
+        assert resp.status_code == 200
+
+    assert last_used_writer.pending == 1
+    assert await _last_used(api_key["id"]) is None
+
+    assert await last_used_writer.flush() == 1
+    assert last_used_writer.pending == 0
+    assert await _last_used(api_key["id"]) is not None
+
+
+async def test_flush_updates_many_keys_in_one_pass(client, admin_headers, plan):
+    writer = LastUsedWriter(interval=60)
+    key_ids = []
+    for i in range(3):
+        resp = await client.post(
+            "/admin/api-keys",
+            json={"label": f"bulk-{i}", "plan_id": plan["id"]},
+            headers=admin_headers,
+        )
+        key_ids.append(resp.json()["id"])
+        writer.record(key_ids[-1], time.time())
+
+    assert await writer.flush() == 3
+    for key_id in key_ids:
+        assert await _last_used(key_id) is not None
+
+
+async def test_flush_never_moves_last_used_backwards(api_key):
+    writer = LastUsedWriter(interval=60)
+    now = time.time()
+    writer.record(api_key["id"], now)
+    await writer.flush()
+    writer.record(api_key["id"], now - 3600)
+    await writer.flush()
+
+    assert (await _last_used(api_key["id"])).timestamp() == pytest.approx(now)
+
+
+async def test_failed_flush_keeps_pending_updates(monkeypatch, api_key):
+    def unavailable():
+        raise ConnectionError("database unavailable")
+
+    writer = LastUsedWriter(interval=60)
+    writer.record(api_key["id"], time.time())
+    monkeypatch.setattr("app.last_used.AsyncSessionLocal", unavailable)
+
+    with pytest.raises(ConnectionError):
+        await writer.flush()
+    assert writer.pending == 1
+
+    monkeypatch.undo()
+    assert await writer.flush() == 1
+    assert await _last_used(api_key["id"]) is not None
@@ -0,0 +1,145 @@
+import asyncio
+import random
+import uuid
+
+import pytest
+
+from app.algorithms import Charge, Limit
+from app.leases import LeaseManager, lease_manager
+from app.rate_limiter import _plan_cache
+from app.redis_client import redis_client
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+# Start of some 60s window, far in the future like test_algorithms
+T0 = 10_000_000_040 * 60 * 1000
+
+
+def _instances(n: int, fraction: float) -> list[LeaseManager]:
+    return [LeaseManager(fraction, min_limit=0, release_interval=1) for _ in range(n)]
+
+
+async def _decide(manager: LeaseManager, prefix: str, limit: int, now_ms: int, cost: int = 1):
+    charges = [Charge(Limit("minute", limit), prefix, cost)]
+    return await manager.decide(charges, now_ms, f"{prefix}seen")
+
+
+async def test_instances_never_admit_more_than_the_limit():
+    prefix = f"rl:test-{uuid.uuid4().hex}:"
+    instances = _instances(5, 0.05)
+    rng = random.Random(7)
+
+    admitted = denied = 0
+    for i in range(3000):
+        decision = await _decide(rng.choice(instances), prefix, 1000, T0 + i)
+        admitted += decision.allowed
+        denied += not decision.allowed
+
+    # No overshoot, and every slice was eventually spent by its holder
+    assert admitted == 1000
+    assert int(await redis_client.get(f"{prefix}m:{T0 // 60000}")) == 1000
+    # Admissions took one Redis call per 50-request slice, not one per request
+    reservations = sum(m.storage_calls for m in instances) - denied
+    assert reservations <= 1000 // 50 + len(instances)
+    assert sum(m.local_decisions for m in instances) >= 1000 - reservations
+
+
+async def test_idle_lease_is_released_to_other_instances():
+    prefix = f"rl:test-{uuid.uuid4().hex}:"
+    a, b, c = _instances(3, 0.5)
+
+    assert (await _decide(a, prefix, 100, T0)).allowed
+    assert (await _decide(b, prefix, 100, T0)).allowed
+    # a and b hold 49 each; the counter is at the limit
+    assert not (await _decide(c, prefix, 100, T0)).allowed
+
+    assert await a.release() == 49
+    decision = await _decide(c, prefix, 100, T0)
+    assert decision.allowed
+    assert int(await redis_client.get(f"{prefix}m:{T0 // 60000}")) == 100
+
+
+async def test_clock_skew_never_overfills_a_window():
+    prefix = f"rl:test-{uuid.uuid4().hex}:"
+    slow, fast = _instances(2, 0.1)
+    limit, window = 100, T0 // 60000
+
+    # slow's clock lags a second: it keeps charging the old window while
+    # fast has moved on to the new one
+    admitted = 0
+    for i in range(300):
+        admitted += (await _decide(slow, prefix, limit, T0 + 59_000 + i)).allowed
+        admitted += (await _decide(fast, prefix, limit, T0 + 60_000 + i)).allowed
+
+    assert int(await redis_client.get(f"{prefix}m:{window}")) == limit
+    assert int(await redis_client.get(f"{prefix}m:{window + 1}")) == limit
+    assert admitted == 2 * limit
+
+
+async def test_cost_is_spent_from_the_lease():
+    prefix = f"rl:test-{uuid.uuid4().hex}:"
+    (manager,) = _instances(1, 0.1)
+
+    first = await _decide(manager, prefix, 100, T0, cost=4)
+    assert first.allowed and first.remaining == 96
+    assert manager.storage_calls == 1
+    # 6 left in the lease: one more local, then a new reservation
+    assert (await _decide(manager, prefix, 100, T0, cost=4)).allowed
+    assert manager.storage_calls == 1
+    assert (await _decide(manager, prefix, 100, T0, cost=4)).allowed
+    assert manager.storage_calls == 2
+
+    denied = await _decide(manager, prefix, 100, T0, cost=200)
+    assert not denied.allowed
+    assert denied.retry_after == pytest.approx(60.0)
+
+
+async def test_only_fixed_windows_are_leased():
+    manager = LeaseManager(0.05, min_limit=1000, release_interval=1)
+
+    assert manager.covers([Charge(Limit("minute", 5000), "p:"), Charge(Limit("day", 10**6), "p:")])
+    assert not manager.covers([Charge(Limit("minute", 500), "p:")])
+    assert not manager.covers([Charge(Limit("minute", 5000, "gcra"), "p:")])
+    assert manager.covers([Charge(Limit("month", 5000), "p:")])
+
+
+async def test_middleware_decides_from_leases(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(lease_manager, "fraction", 0.1)
+    monkeypatch.setattr(lease_manager, "min_limit", 0)
+    _plan_cache.clear()
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"lease-{uuid.uuid4().hex[:8]}", "default_rpm": 20},
+        headers=admin_headers,
+    )
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "lease-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    headers = {"X-API-Key": resp.json()["plaintext_key"]}
+    calls_before = lease_manager.storage_calls
+
+    statuses = [(await client.get("/v1/hello", headers=headers)).status_code for _ in range(21)]
+
+    assert statuses == [200] * 20 + [429]
+    # 2-request slices: 10 reservations + the rejected attempt
+    assert lease_manager.storage_calls - calls_before == 11
+    await lease_manager.release()
+
+
+async def test_keys_sharing_a_pool_never_overshoot_it():
+    pool = f"rl:test-{uuid.uuid4().hex}:"
+    keys = [f"rl:test-{uuid.uuid4().hex}:" for _ in range(10)]
+    (manager,) = _instances(1, 0.1)
+
+    async def decide(prefix: str):
+        charges = [Charge(Limit("minute", 20), prefix), Charge(Limit("minute", 100), pool)]
+        return await manager.decide(charges, T0, f"{prefix}seen")
+
+    # Small key slices: keys keep reserving while others spend the pool's lease
+    decisions = await asyncio.gather(*(decide(keys[i % len(keys)]) for i in range(300)))
+
+    assert sum(d.allowed for d in decisions) == 100
+    assert all(lease.balance >= 0 for lease in manager._leases.values())
+    assert int(await redis_client.get(f"{pool}m:{T0 // 60000}")) == 100
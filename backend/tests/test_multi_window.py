@@ -0,0 +1,132 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.algorithms import FIXED_WINDOW, Charge, Limit
+from app.rate_limiter import _plan_cache
+from app.redis_client import redis_client
+from app.storage import RedisBackend
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+# 2300-01-31T23:59:59.500Z: the last half second of a day and of a month
+T_MONTH_END = int(datetime(2300, 1, 31, 23, 59, 59, 500000, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _prefix(backend) -> str:
+    return backend.key_prefix(f"test-{uuid.uuid4().hex}")
+
+
+async def _decide(backend, limits, prefix, now_ms):
+    charges = [Charge(limit, prefix) for limit in limits]
+    return await backend.decide(charges, now_ms, f"{prefix}seen")
+
+
+async def test_tightest_window_is_reported(backend):
+    limits = [Limit("second", 5), Limit("minute", 100), Limit("day", 1000)]
+    prefix = _prefix(backend)
+
+    decision = await _decide(backend, limits, prefix, T_MONTH_END - 10_000)
+
+    assert decision.allowed
+    assert (decision.limit, decision.remaining) == (5, 4)
+    assert decision.reset_after <= 1
+
+
+async def test_rejection_by_one_window_charges_none(backend):
+    limits = [Limit("second", 2), Limit("minute", 100)]
+    prefix = _prefix(backend)
+    now = T_MONTH_END - 10_000
+
+    results = [await _decide(backend, limits, prefix, now) for _ in range(3)]
+
+    assert [r.allowed for r in results] == [True, True, False]
+    assert results[2].limit == 2
+    # the rejected request did not consume from the minute window
+    later = await _decide(backend, limits, prefix, now + 1000)
+    assert later.allowed
+    assert later.remaining == 1  # second window: 2 - 1
+    minute = await _decide(backend, [Limit("minute", 100)], prefix, now + 1000)
+    assert minute.remaining == 96
+
+
+async def test_calendar_windows_expire_at_period_end():
+    backend = RedisBackend(redis_client)
+    limits = [Limit("day", 10), Limit("month", 100)]
+    prefix = _prefix(backend)
+
+    decision = await _decide(backend, limits, prefix, T_MONTH_END)
+    assert decision.reset_after == pytest.approx(0.5)
+
+    day_key = f"{prefix}d:23000131"
+    month_key = f"{prefix}M:230001"
+    expected_ttl = T_MONTH_END + 500 - time.time() * 1000
+    assert await redis_client.pttl(day_key) == pytest.approx(expected_ttl, abs=5000)
+    assert await redis_client.pttl(month_key) == pytest.approx(expected_ttl, abs=5000)
+
+
+async def test_new_month_starts_a_fresh_counter(backend):
+    limits = [Limit("month", 1)]
+    prefix = _prefix(backend)
+
+    assert (await _decide(backend, limits, prefix, T_MONTH_END)).allowed
+    assert not (await _decide(backend, limits, prefix, T_MONTH_END)).allowed
+    assert (await _decide(backend, limits, prefix, T_MONTH_END + 1000)).allowed
+
+
+async def test_rejection_reports_longest_wait(backend):
+    limits = [Limit("second", 1, FIXED_WINDOW), Limit("day", 1)]
+    prefix = _prefix(backend)
+    now = T_MONTH_END - 3_600_000
+
+    await _decide(backend, limits, prefix, now)
+    rejected = await _decide(backend, limits, prefix, now)
+
+    assert not rejected.allowed
+    assert rejected.limit == 1
+    assert rejected.retry_after == pytest.approx(3600.5)
+
+
+async def test_plan_limits_roundtrip_and_enforced(client, admin_headers):
+    _plan_cache.clear()
+    resp = await client.post(
+        "/admin/plans",
+        json={
+            "name": f"mw-{uuid.uuid4().hex[:8]}",
+            "default_rpm": 100,
+            "limits": [{"period": "second", "limit": 2}, {"period": "month", "limit": 10000}],
+        },
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201
+    plan = resp.json()
+    assert plan["limits"] == [
+        {"period": "second", "limit": 2},
+        {"period": "month", "limit": 10000},
+    ]
+
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "mw-key", "plan_id": plan["id"]},
+        headers=admin_headers,
+    )
+    headers = {"X-API-Key": resp.json()["plaintext_key"]}
+
+    first = await client.get("/v1/hello", headers=headers)
+    assert first.headers["X-RateLimit-Limit"] == "2"
+    assert first.headers["X-RateLimit-Remaining"] == "1"
+
+
+async def test_duplicate_or_minute_periods_rejected(client, admin_headers):
+    for limits in (
+        [{"period": "day", "limit": 1}, {"period": "day", "limit": 2}],
+        [{"period": "minute", "limit": 1}],
+    ):
+        resp = await client.post(
+            "/admin/plans",
+            json={"name": f"bad-{uuid.uuid4().hex[:8]}", "default_rpm": 10, "limits": limits},
+            headers=admin_headers,
+        )
+        assert resp.status_code == 422
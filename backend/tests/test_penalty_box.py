@@ -0,0 +1,102 @@
+import uuid
+
+import pytest
+
+from app import rate_limiter
+from app.penalty_box import PenaltyBox, penalty_box
+from app.rate_limiter import _plan_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def test_block_expires_after_retry_after():
+    box = PenaltyBox(maxsize=10, escalation_factor=0, max_cooldown=3600)
+    box.block("rl:k:", "p", limit=10, retry_after=30, now=1000)
+
+    assert box.check("rl:k:", "p", now=1029).until == 1030
+    assert box.check("rl:k:", "p", now=1030) is None
+    assert box.check("rl:other:", "p", now=1000) is None
+    assert box.stats()["local_rejections"] == 1
+
+
+async def test_block_ignored_after_plan_change():
+    box = PenaltyBox(maxsize=10, escalation_factor=0, max_cooldown=3600)
+    box.block("rl:k:", "old-plan", limit=10, retry_after=30, now=1000)
+
+    assert box.check("rl:k:", "new-plan", now=1001) is None
+
+
+async def test_hammering_escalates_cooldown():
+    box = PenaltyBox(maxsize=10, escalation_factor=2, max_cooldown=100)
+
+    assert box.block("rl:k:", "p", 10, retry_after=30, now=0).until == 30
+    for _ in range(20):
+        box.check("rl:k:", "p", now=1)
+    # 20 rejected requests >= 2 x limit 10: next block is doubled
+    assert box.block("rl:k:", "p", 10, retry_after=30, now=30).until == 30 + 60
+    for _ in range(20):
+        box.check("rl:k:", "p", now=31)
+    # and doubled again, up to max_cooldown
+    assert box.block("rl:k:", "p", 10, retry_after=30, now=90).until == 90 + 100
+    # a quiet block resets the escalation
+    assert box.block("rl:k:", "p", 10, retry_after=30, now=190).until == 190 + 30
+    assert box.stats()["escalations"] == 2
+
+
+async def test_escalation_disabled_by_default_factor():
+    box = PenaltyBox(maxsize=10, escalation_factor=0, max_cooldown=100)
+    box.block("rl:k:", "p", 1, retry_after=30, now=0)
+    for _ in range(1000):
+        box.check("rl:k:", "p", now=1)
+
+    assert box.block("rl:k:", "p", 1, retry_after=30, now=30).until == 60
+
+
+async def test_full_box_evicts_expired_then_oldest():
+    box = PenaltyBox(maxsize=2, escalation_factor=0, max_cooldown=100)
+    box.block("a", "p", 1, retry_after=5, now=0)
+    box.block("b", "p", 1, retry_after=50, now=0)
+    box.block("c", "p", 1, retry_after=50, now=10)  # evicts expired "a"
+    box.block("d", "p", 1, retry_after=50, now=10)  # evicts oldest "b"
+
+    assert box.check("b", "p", now=11) is None
+    assert box.check("c", "p", now=11) is not None
+    assert box.check("d", "p", now=11) is not None
+
+
+async def test_over_limit_key_is_rejected_without_redis(client, admin_headers, monkeypatch):
+    _plan_cache.clear()
+    penalty_box.clear()
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"penalty-{uuid.uuid4().hex[:8]}", "default_rpm": 2},
+        headers=admin_headers,
+    )
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "penalty-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    headers = {"X-API-Key": resp.json()["plaintext_key"]}
+
+    assert (await client.get("/v1/hello", headers=headers)).status_code == 200
+    assert (await client.get("/v1/hello", headers=headers)).status_code == 200
+    first_429 = await client.get("/v1/hello", headers=headers)
+    assert first_429.status_code == 429
+
+    async def no_redis(*args, **kwargs):
+        raise AssertionError("blocked key reached Redis")
+
+    monkeypatch.setattr(rate_limiter.storage, "decide", no_redis)
+    before = penalty_box.stats()["local_rejections"]
+    for _ in range(5):
+        resp = await client.get("/v1/hello", headers=headers)
+        assert resp.status_code == 429
+        assert resp.headers["X-RateLimit-Remaining"] == "0"
+        assert resp.headers["X-RateLimit-Limit"] == "2"
+        assert resp.headers["X-RateLimit-Reset"] == first_429.headers["X-RateLimit-Reset"]
+        assert "Retry-After" in resp.headers
+
+    assert penalty_box.stats()["local_rejections"] == before + 5
+    metrics = await client.get("/metrics")
+    assert metrics.json()["penalty_box"]["local_rejections"] == before + 5
@@ -78,6 +78,19 @@ async def test_update_plan_rpm(client, admin_headers, plan):
     assert resp.json()["name"] == plan["name"]  # unchanged
 
 
+async def test_update_plan_clears_burst(client, admin_headers, plan):
+    url = f"/admin/plans/{plan['id']}"
+    resp = await client.patch(url, json={"algorithm": "gcra", "burst": 5}, headers=admin_headers)
+    assert resp.json()["burst"] == 5
+
+    resp = await client.patch(url, json={"default_rpm": 50}, headers=admin_headers)
+    assert resp.json()["burst"] == 5  # unchanged
+
+    resp = await client.patch(url, json={"burst": None}, headers=admin_headers)
+    assert resp.status_code == 200
+    assert resp.json()["burst"] is None
+
+
 async def test_update_plan_duplicate_name(client, admin_headers):
     # Create two plans
     name_a = f"plan-a-{uuid.uuid4().hex[:8]}"
@@ -152,3 +165,44 @@ async def test_delete_plan_not_found(client, admin_headers):
         f"/admin/plans/{fake_id}", headers=admin_headers
     )
     assert resp.status_code == 404
+
+
+async def test_list_plans_pages_by_cursor(client):
+    resp = await client.post(
+        "/auth/register",
+        json={"email": f"pages-{uuid.uuid4().hex[:8]}@example.com", "password": "password123"},
+    )
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    ids = []
+    for i in range(5):
+        resp = await client.post(
+            "/admin/plans", json={"name": f"page-{i}", "default_rpm": 10}, headers=headers
+        )
+        ids.append(resp.json()["id"])
+    for label in ("a", "b"):
+        await client.post(
+            "/admin/api-keys", json={"label": label, "plan_id": ids[1]}, headers=headers
+        )
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = await client.get("/admin/plans", params=params, headers=headers)
+        assert resp.status_code == 200
+        pages.append(resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    plans = [p for page in pages for p in page]
+    assert [p["id"] for p in plans] == ids
+    assert [p["key_count"] for p in plans] == [0, 2, 0, 0, 0]
+
+
+async def test_list_plans_rejects_bad_cursor(client, admin_headers):
+    resp = await client.get(
+        "/admin/plans", params={"cursor": "not-a-cursor"}, headers=admin_headers
+    )
+
+    assert resp.status_code == 422
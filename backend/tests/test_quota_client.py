@@ -0,0 +1,170 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+
+from app.config import ADMIN_API_TOKEN
+from app.key_cache import key_cache
+from app.main import app
+from app.rate_limiter import _plan_cache
+from quota_client import QuotaClient, QuotaError
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest.fixture(autouse=True)
+def _clean_caches():
+    _plan_cache.clear()
+    key_cache.clear()
+
+
+@pytest.fixture
+async def quota():
+    async with QuotaClient(
+        "http://test", ADMIN_API_TOKEN, transport=httpx.ASGITransport(app=app), max_backoff=0
+    ) as client:
+        yield client
+
+
+async def _key(client, admin_headers, rpm: int) -> str:
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"sdk-plan-{uuid.uuid4().hex[:8]}", "default_rpm": rpm},
+        headers=admin_headers,
+    )
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "sdk-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    return resp.json()["plaintext_key"]
+
+
+def _scripted(*responses):
+    """Transport answering with ``responses`` in turn; records the requests."""
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        response = responses[min(len(seen), len(responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    return httpx.MockTransport(handler), seen
+
+
+async def test_concurrent_checks_share_one_batch(quota, client, admin_headers):
+    key = await _key(client, admin_headers, rpm=100)
+
+    results = await asyncio.gather(*(quota.check(key) for _ in range(20)))
+
+    assert quota.batches_sent == 1
+    assert all(r.allowed for r in results)
+    assert sorted(r.remaining for r in results) == list(range(80, 100))
+
+
+async def test_batches_are_split_at_max_batch(client, admin_headers):
+    key = await _key(client, admin_headers, rpm=100)
+    async with QuotaClient(
+        "http://test", ADMIN_API_TOKEN, transport=httpx.ASGITransport(app=app), max_batch=4
+    ) as quota:
+        results = await quota.check_many([(key, 1)] * 10)
+
+    assert quota.batches_sent == 3
+    assert [r.status for r in results] == [200] * 10
+
+
+async def test_exhausted_key_is_answered_locally(quota, client, admin_headers):
+    key = await _key(client, admin_headers, rpm=2)
+
+    statuses = [(await quota.check(key)).status for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    sent = quota.batches_sent
+
+    result = await quota.check(key)
+    assert (result.status, result.local) == (429, True)
+    assert result.retry_after >= 1
+    assert quota.batches_sent == sent
+
+
+async def test_request_short_circuits_after_429(quota, client, admin_headers):
+    key = await _key(client, admin_headers, rpm=1)
+
+    assert (await quota.request(key, "GET", "/v1/hello")).status_code == 200
+    limited = await quota.request(key, "GET", "/v1/hello")
+    assert limited.status_code == 429
+
+    local = await quota.request(key, "GET", "/v1/hello")
+    assert local.status_code == 429
+    assert local.headers["X-RateLimit-Reset"] == limited.headers["X-RateLimit-Reset"]
+    assert local.headers["X-RateLimit-Remaining"] == "0"
+    assert quota.short_circuited == 1
+
+
+async def test_request_blocks_only_the_exhausted_route(quota, client, admin_headers):
+    resp = await client.post(
+        "/admin/plans",
+        json={
+            "name": f"sdk-plan-{uuid.uuid4().hex[:8]}",
+            "default_rpm": 100,
+            "routes": [{"path": "/v1/export", "limits": [{"period": "minute", "limit": 1}]}],
+        },
+        headers=admin_headers,
+    )
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "sdk-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    key = resp.json()["plaintext_key"]
+
+    assert (await quota.request(key, "POST", "/v1/export")).status_code == 200
+    assert (await quota.request(key, "POST", "/v1/export")).status_code == 429
+
+    assert (await quota.request(key, "GET", "/v1/hello")).status_code == 200
+    assert (await quota.request(key, "POST", "/v1/export")).status_code == 429
+    assert quota.short_circuited == 1
+
+
+async def test_retries_follow_retry_after():
+    transport, seen = _scripted(
+        httpx.Response(503, headers={"Retry-After": "0"}),
+        httpx.ConnectError("refused"),
+        httpx.Response(200, json={"message": "hello"}),
+    )
+    async with QuotaClient("http://test", transport=transport, backoff=0) as quota:
+        resp = await quota.request("k", "GET", "/v1/hello")
+
+    assert resp.status_code == 200
+    assert len(seen) == 3
+    assert seen[0].headers["X-API-Key"] == "k"
+
+
+@pytest.mark.parametrize("method, attempts", [("GET", 2), ("POST", 1)])
+async def test_gateway_errors_are_retried_only_for_idempotent_methods(method, attempts):
+    transport, seen = _scripted(httpx.Response(502), httpx.Response(200))
+    async with QuotaClient("http://test", transport=transport, backoff=0) as quota:
+        await quota.request("k", method, "/v1/export")
+
+    assert len(seen) == attempts
+
+
+async def test_retry_after_beyond_max_backoff_is_returned():
+    transport, seen = _scripted(httpx.Response(503, headers={"Retry-After": "30"}))
+    async with QuotaClient("http://test", transport=transport, max_backoff=5) as quota:
+        resp = await quota.request("k", "GET", "/v1/hello")
+
+    assert resp.status_code == 503
+    assert len(seen) == 1
+
+
+async def test_failed_batch_fails_every_check():
+    transport, _ = _scripted(httpx.ConnectError("refused"))
+    async with QuotaClient("http://test", "t", transport=transport, retries=1, backoff=0) as quota:
+        results = await asyncio.gather(
+            quota.check("a"), quota.check("b"), return_exceptions=True
+        )
+
+    assert all(isinstance(r, QuotaError) for r in results)
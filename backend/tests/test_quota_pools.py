@@ -0,0 +1,123 @@
+import uuid
+
+import jwt
+import pytest
+
+from app.config import ADMIN_API_TOKEN
+from app.key_cache import key_cache
+from app.rate_limiter import _plan_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+SERVICE_HEADERS = {"Authorization": f"Bearer {ADMIN_API_TOKEN}"}
+
+
+@pytest.fixture(autouse=True)
+def _clean_caches():
+    _plan_cache.clear()
+    key_cache.clear()
+
+
+@pytest.fixture
+async def tenant(client):
+    """A fresh user, so user pools don't leak between tests."""
+    resp = await client.post(
+        "/auth/register",
+        json={"email": f"pool-{uuid.uuid4().hex[:8]}@example.com", "password": "pw"},
+    )
+    token = resp.json()["access_token"]
+    user_id = jwt.decode(token, options={"verify_signature": False})["sub"]
+    return {"Authorization": f"Bearer {token}"}, user_id
+
+
+async def _plan(client, headers, **fields) -> dict:
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"pool-plan-{uuid.uuid4().hex[:8]}", "default_rpm": 100, **fields},
+        headers=headers,
+    )
+    assert resp.status_code == 201
+    return resp.json()
+
+
+async def _keys(client, headers, plan: dict, count: int) -> list[str]:
+    keys = []
+    for _ in range(count):
+        resp = await client.post(
+            "/admin/api-keys", json={"label": "pool", "plan_id": plan["id"]}, headers=headers
+        )
+        keys.append(resp.json()["plaintext_key"])
+    return keys
+
+
+async def test_plan_pool_is_shared_by_its_keys(client, tenant):
+    headers, _ = tenant
+    plan = await _plan(client, headers, pool_limits=[{"period": "minute", "limit": 3}])
+    assert plan["pool_limits"] == [{"period": "minute", "limit": 3}]
+    first, second = await _keys(client, headers, plan, 2)
+
+    statuses = []
+    for key in (first, second, first, second):
+        resp = await client.get("/v1/hello", headers={"X-API-Key": key})
+        statuses.append(resp.status_code)
+
+    assert statuses == [200, 200, 200, 429]
+    # the pool is what bound, not the key's own 100 RPM
+    assert resp.headers["X-RateLimit-Limit"] == "3"
+
+
+async def test_headers_report_the_binding_limit(client, tenant):
+    headers, _ = tenant
+    plan = await _plan(
+        client, headers, default_rpm=2, pool_limits=[{"period": "minute", "limit": 50}]
+    )
+    (key,) = await _keys(client, headers, plan, 1)
+
+    resp = await client.get("/v1/hello", headers={"X-API-Key": key})
+
+    assert resp.headers["X-RateLimit-Limit"] == "2"
+    assert resp.headers["X-RateLimit-Remaining"] == "1"
+
+
+async def test_user_pool_spans_plans(client, tenant):
+    headers, user_id = tenant
+    resp = await client.put(
+        f"/admin/users/{user_id}/limits",
+        json={"limits": [{"period": "minute", "limit": 2}]},
+        headers=SERVICE_HEADERS,
+    )
+    assert resp.status_code == 200
+    (a,) = await _keys(client, headers, await _plan(client, headers), 1)
+    (b,) = await _keys(client, headers, await _plan(client, headers), 1)
+
+    assert (await client.get("/v1/hello", headers={"X-API-Key": a})).status_code == 200
+    assert (await client.get("/v1/hello", headers={"X-API-Key": b})).status_code == 200
+    resp = await client.get("/v1/hello", headers={"X-API-Key": a})
+    assert resp.status_code == 429
+    assert resp.headers["X-RateLimit-Limit"] == "2"
+
+
+async def test_pool_applies_to_check_endpoint(client, tenant):
+    headers, _ = tenant
+    plan = await _plan(client, headers, pool_limits=[{"period": "minute", "limit": 2}])
+    keys = await _keys(client, headers, plan, 3)
+
+    resp = await client.post(
+        "/v1/check/batch",
+        json={"checks": [{"key": key} for key in keys]},
+        headers=SERVICE_HEADERS,
+    )
+
+    assert [r["status"] for r in resp.json()["results"]] == [200, 200, 429]
+
+
+async def test_user_limits_need_the_admin_token(client, tenant):
+    headers, user_id = tenant
+    body = {"limits": [{"period": "minute", "limit": 10**6}]}
+
+    resp = await client.put(f"/admin/users/{user_id}/limits", json=body, headers=headers)
+    assert resp.status_code == 403
+    resp = await client.get(f"/admin/users/{user_id}/limits", headers=SERVICE_HEADERS)
+    assert resp.json() == {"limits": []}
+    resp = await client.get(f"/admin/users/{uuid.uuid4()}/limits", headers=SERVICE_HEADERS)
+    assert resp.status_code == 404
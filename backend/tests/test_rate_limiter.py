@@ -1,10 +1,12 @@
 import hashlib
+import time
 import uuid
 
 import pytest
 from sqlalchemy import update
 
 from app.database import AsyncSessionLocal
+from app.key_cache import key_cache
 from app.models import ApiKey
 from app.rate_limiter import _plan_cache
 from app.redis_client import redis_client
@@ -22,10 +24,12 @@ async def _reset_redis_pool():
 
 @pytest.fixture(autouse=True)
 def _clean_plan_cache():
-    """Clear in-memory plan cache between tests."""
+    """Clear in-memory plan and key caches between tests."""
     _plan_cache.clear()
+    key_cache.clear()
     yield
     _plan_cache.clear()
+    key_cache.clear()
 
 
 @pytest.fixture
@@ -113,3 +117,43 @@ async def test_inactive_key_rejected(client, low_rpm_key):
 
     assert resp.status_code == 401
     assert resp.json()["detail"] == "Invalid or inactive API key"
+
+
+async def test_non_rate_limited_routes_get_no_headers(client):
+    resp = await client.get("/health")
+
+    assert resp.status_code == 200
+    assert "X-RateLimit-Limit" not in resp.headers
+
+
+async def test_rejection_bodies_are_json(client, low_rpm_key):
+    resp = await client.get("/v1/hello")
+    assert resp.headers["content-type"] == "application/json"
+    assert int(resp.headers["content-length"]) == len(resp.content)
+
+    headers = {"X-API-Key": low_rpm_key}
+    for _ in range(4):
+        resp = await client.get("/v1/hello", headers=headers)
+    assert resp.status_code == 429
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.headers["X-RateLimit-Limit"] == "3"
+
+
+async def test_decision_script_reloads_after_script_flush(client, low_rpm_key):
+    headers = {"X-API-Key": low_rpm_key}
+    resp = await client.get("/v1/hello", headers=headers)
+    assert resp.headers["X-RateLimit-Remaining"] == "2"
+
+    await redis_client.script_flush()
+
+    resp = await client.get("/v1/hello", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["X-RateLimit-Remaining"] == "1"
+
+
+async def test_request_records_last_seen(client, api_key):
+    resp = await client.get("/v1/hello", headers={"X-API-Key": api_key["plaintext_key"]})
+    assert resp.status_code == 200
+
+    last_seen = int(await redis_client.get(f"rl:{api_key['id']}:seen"))
+    assert abs(last_seen - time.time()) < 5
@@ -0,0 +1,221 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+import redis.asyncio as aioredis
+
+from app import rate_limiter
+from app.algorithms import Charge, Limit
+from app.circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError, RedisUnavailable
+from app.fallback_limiter import FallbackLimiter, fallback_limiter
+from app.rate_limiter import _plan_cache
+from app.storage import RedisBackend
+from tests.fault_proxy import FaultProxy
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+def _breaker(**overrides) -> CircuitBreaker:
+    params = dict(timeout=0.05, slow_call=0.03, failure_threshold=3, reset_timeout=0.1)
+    params.update(overrides)
+    return CircuitBreaker(**params)
+
+
+async def _fail():
+    raise ConnectionError("boom")
+
+
+async def _ok():
+    return "ok"
+
+
+async def _slow():
+    await asyncio.sleep(0.04)
+    return "slow"
+
+
+@pytest.fixture
+async def proxy():
+    proxy = FaultProxy()
+    await proxy.start()
+    yield proxy
+    await proxy.stop()
+
+
+@pytest.fixture
+async def proxied_redis(proxy):
+    client = aioredis.from_url(f"redis://127.0.0.1:{proxy.port}/0", decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+async def test_breaker_opens_after_consecutive_failures_then_probes():
+    breaker = _breaker()
+    for _ in range(3):
+        with pytest.raises(RedisUnavailable):
+            await breaker.call(_fail)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(_ok)
+
+    await asyncio.sleep(0.1)
+    # A failed probe re-opens immediately, a successful one closes
+    with pytest.raises(RedisUnavailable):
+        await breaker.call(_fail)
+    assert breaker.state == OPEN
+    await asyncio.sleep(0.1)
+    assert await breaker.call(_ok) == "ok"
+    assert breaker.stats()["state"] == "closed"
+    assert breaker.trips == 2
+
+
+async def test_half_open_breaker_lets_one_probe_through():
+    breaker = _breaker(timeout=1, slow_call=1, failure_threshold=1)
+    straggler_done, probe_done = asyncio.Event(), asyncio.Event()
+
+    async def wait_for(event):
+        await event.wait()
+        return "ok"
+
+    # Started while closed, still running when the breaker opens
+    straggler = asyncio.create_task(breaker.call(wait_for, straggler_done))
+    await asyncio.sleep(0)
+    with pytest.raises(RedisUnavailable):
+        await breaker.call(_fail)
+    await asyncio.sleep(0.1)
+    probe = asyncio.create_task(breaker.call(wait_for, probe_done))
+    await asyncio.sleep(0)
+
+    straggler_done.set()
+    await straggler
+    # The probe is still running: every other call fails fast
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(_ok)
+
+    probe_done.set()
+    assert await probe == "ok"
+    assert await breaker.call(_ok) == "ok"
+
+
+async def test_slow_calls_trip_the_breaker():
+    breaker = _breaker()
+    for _ in range(3):
+        assert await breaker.call(_slow) == "slow"
+
+    assert breaker.state == OPEN
+
+
+async def test_success_resets_failure_count():
+    breaker = _breaker()
+    for _ in range(2):
+        with pytest.raises(RedisUnavailable):
+            await breaker.call(_fail)
+    await breaker.call(_ok)
+    with pytest.raises(RedisUnavailable):
+        await breaker.call(_fail)
+
+    assert breaker.state != OPEN
+
+
+async def test_timeout_bounds_latency_through_slow_proxy(proxy, proxied_redis):
+    breaker = _breaker()
+    assert await breaker.call(proxied_redis.ping)
+
+    proxy.latency = 1.0
+    start = time.monotonic()
+    with pytest.raises(RedisUnavailable):
+        await breaker.call(proxied_redis.ping)
+    assert time.monotonic() - start < 0.2
+
+
+async def test_dropped_connections_count_as_failures(proxy, proxied_redis):
+    breaker = _breaker()
+    proxy.drop_rate = 1.0
+    for _ in range(3):
+        with pytest.raises(RedisUnavailable):
+            await breaker.call(proxied_redis.ping)
+
+    assert breaker.state == OPEN
+
+
+async def test_fallback_limiter_divides_limit_by_instances():
+    limiter = FallbackLimiter(instances=4, max_counters=100)
+    charges = [Charge(Limit("minute", 10), "rl:k:")]
+
+    allowed = [limiter.decide(charges, 60_000).allowed for _ in range(5)]
+
+    assert allowed == [True, True, True, False, False]
+    # the next window starts fresh
+    assert limiter.decide(charges, 120_000).allowed
+
+
+async def _key_for_plan(client, admin_headers, **plan_fields) -> dict:
+    _plan_cache.clear()
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"resilience-{uuid.uuid4().hex[:8]}", **plan_fields},
+        headers=admin_headers,
+    )
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "resilience-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    return {"X-API-Key": resp.json()["plaintext_key"]}
+
+
+@pytest.fixture
+async def stall_redis(monkeypatch, proxy, proxied_redis):
+    """Returns a function that routes rate limiting through a proxy stalling every call."""
+
+    def stall() -> CircuitBreaker:
+        monkeypatch.setattr(rate_limiter, "storage", RedisBackend(proxied_redis))
+        breaker = _breaker(timeout=0.05, failure_threshold=3, reset_timeout=60)
+        monkeypatch.setattr(rate_limiter, "redis_breaker", breaker)
+        proxy.latency = 2.0
+        return breaker
+
+    fallback_limiter.clear()
+    yield stall
+    fallback_limiter.clear()
+
+
+async def test_stalled_redis_falls_back_to_local_limits(client, admin_headers, stall_redis):
+    headers = await _key_for_plan(client, admin_headers, default_rpm=5)
+    breaker = stall_redis()
+
+    latencies, statuses = [], []
+    for _ in range(8):
+        start = time.monotonic()
+        resp = await client.get("/v1/hello", headers=headers)
+        latencies.append(time.monotonic() - start)
+        statuses.append(resp.status_code)
+
+    assert statuses == [200] * 5 + [429] * 3
+    assert breaker.state == OPEN
+    # no request waits for Redis longer than the call timeout...
+    assert max(latencies) < 0.5
+    # ...and once the breaker is open, not at all (the last 429s come from
+    # the penalty box)
+    assert breaker.rejected == 3
+
+
+async def test_fail_closed_plan_returns_503(client, admin_headers, stall_redis):
+    headers = await _key_for_plan(client, admin_headers, default_rpm=5, failure_mode="closed")
+    stall_redis()
+
+    resp = await client.get("/v1/hello", headers=headers)
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "60"
+
+
+async def test_fail_open_plan_ignores_limits(client, admin_headers, stall_redis):
+    headers = await _key_for_plan(client, admin_headers, default_rpm=2, failure_mode="open")
+    stall_redis()
+
+    statuses = [(await client.get("/v1/hello", headers=headers)).status_code for _ in range(5)]
+
+    assert statuses == [200] * 5
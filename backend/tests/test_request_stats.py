@@ -0,0 +1,94 @@
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models import Plan, User
+from app.redis_client import redis_client
+from app.request_stats import request_stats
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest.fixture
+async def stats(monkeypatch):
+    """The app's request stats, with their own Redis namespace."""
+    namespace = f"stats:test:{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(request_stats, "namespace", namespace)
+    monkeypatch.setattr(request_stats, "_counts", {})
+    yield request_stats
+    keys = [k async for k in redis_client.scan_iter(f"{namespace}:*")]
+    if keys:
+        await redis_client.delete(*keys)
+
+
+async def _user(client) -> tuple[dict, uuid.UUID]:
+    email = f"stats-{uuid.uuid4().hex[:8]}@example.com"
+    resp = await client.post("/auth/register", json={"email": email, "password": "password123"})
+    async with AsyncSessionLocal() as session:
+        user_id = (await session.execute(select(User.id).where(User.email == email))).scalar_one()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}, user_id
+
+
+async def _plan_and_key(client, headers) -> tuple[str, dict]:
+    plan = await client.post(
+        "/admin/plans",
+        json={"name": f"stats-{uuid.uuid4().hex[:8]}", "default_rpm": 60},
+        headers=headers,
+    )
+    key = await client.post(
+        "/admin/api-keys", json={"label": "stats", "plan_id": plan.json()["id"]}, headers=headers
+    )
+    return plan.json()["id"], key.json()
+
+
+async def _stats(client, headers) -> dict:
+    resp = await client.get("/admin/stats", headers=headers)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+async def test_requests_are_counted_per_user(client, stats):
+    (alice, alice_id), (bob, _) = await _user(client), await _user(client)
+    _, key = await _plan_and_key(client, alice)
+    await _plan_and_key(client, bob)
+    for _ in range(3):
+        await client.get("/v1/hello", headers={"X-API-Key": key["plaintext_key"]})
+
+    # Counted locally, then in the user's hash once flushed
+    assert (await _stats(client, alice))["requests_today"] == 3
+    assert await stats.flush() == 1
+    assert (await _stats(client, alice))["requests_today"] == 3
+    assert (await _stats(client, bob))["requests_today"] == 0
+    fields = await redis_client.hgetall(f"{stats.namespace}:{alice_id}")
+    assert [v for f, v in fields.items() if f.startswith("requests:")] == ["3"]
+
+
+async def test_totals_are_maintained_on_writes(client, stats):
+    headers, _ = await _user(client)
+    assert await _stats(client, headers) == {"total_plans": 0, "total_keys": 0, "requests_today": 0}
+    recounts = stats.recounts
+
+    plan_id, key = await _plan_and_key(client, headers)
+    await client.post("/admin/api-keys", json={"label": "b", "plan_id": plan_id}, headers=headers)
+    assert (await _stats(client, headers))["total_keys"] == 2
+    await client.delete(f"/admin/api-keys/{key['id']}", headers=headers)
+
+    result = await _stats(client, headers)
+    assert (result["total_plans"], result["total_keys"]) == (1, 1)
+    assert stats.recounts == recounts  # no COUNT(*) after the first read
+
+
+async def test_stale_totals_are_recounted(client, stats, monkeypatch):
+    headers, user_id = await _user(client)
+    await _stats(client, headers)
+    # A write the cached counts never saw
+    async with AsyncSessionLocal() as session:
+        session.add(Plan(name="direct", default_rpm=60, user_id=user_id))
+        await session.commit()
+    assert (await _stats(client, headers))["total_plans"] == 0
+
+    monkeypatch.setattr(stats, "totals_ttl", 0)
+
+    assert (await _stats(client, headers))["total_plans"] == 1
@@ -0,0 +1,104 @@
+import uuid
+
+import pytest
+
+from app.rate_limiter import _plan_cache
+from app.route_table import RouteTable
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def test_route_table_precedence():
+    table = RouteTable([
+        ("*", "/v1/items/{id}", "item"),
+        ("GET", "/v1/items/special", "special-get"),
+        ("*", "/v1/items/special/{x}/tail", "special-tail"),
+        ("POST", "/v1/items/{id}", "item-post"),
+        ("*", "/v1/files/*", "files"),
+        ("*", "/v1/*", "fallback"),
+    ])
+
+    assert table.match("GET", "/v1/items/special") == "special-get"
+    assert table.match("DELETE", "/v1/items/special") == "item"
+    assert table.match("POST", "/v1/items/42") == "item-post"
+    assert table.match("GET", "/v1/items/42") == "item"
+    # literal branch dead-ends, falls back to the {id} branch, then to /v1/*
+    assert table.match("GET", "/v1/items/special/a/tail") == "special-tail"
+    assert table.match("GET", "/v1/items/42/a/tail") == "fallback"
+    assert table.match("GET", "/v1/files/a/b/c") == "files"
+    assert table.match("GET", "/v1/hello") == "fallback"
+    assert table.match("GET", "/other") is None
+
+
+async def test_route_table_rejects_inner_wildcard():
+    with pytest.raises(ValueError):
+        RouteTable([("*", "/v1/*/x", 1)])
+
+
+async def _key_for_plan(client, admin_headers, **plan_fields) -> dict:
+    _plan_cache.clear()
+    resp = await client.post(
+        "/admin/plans",
+        json={"name": f"routes-{uuid.uuid4().hex[:8]}", **plan_fields},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    resp = await client.post(
+        "/admin/api-keys",
+        json={"label": "routes-key", "plan_id": resp.json()["id"]},
+        headers=admin_headers,
+    )
+    return {"X-API-Key": resp.json()["plaintext_key"]}
+
+
+async def test_route_cost_is_charged_against_plan_limit(client, admin_headers):
+    headers = await _key_for_plan(
+        client,
+        admin_headers,
+        default_rpm=10,
+        routes=[{"method": "POST", "path": "/v1/export", "cost": 4}],
+    )
+
+    first = await client.post("/v1/export", headers=headers)
+    assert first.status_code == 200
+    assert first.headers["X-RateLimit-Remaining"] == "6"
+
+    assert (await client.post("/v1/export", headers=headers)).status_code == 200
+    assert (await client.post("/v1/export", headers=headers)).status_code == 429
+
+    # two units left for cheap routes
+    assert (await client.get("/v1/hello", headers=headers)).status_code == 200
+    assert (await client.get("/v1/hello", headers=headers)).status_code == 200
+    assert (await client.get("/v1/hello", headers=headers)).status_code == 429
+
+
+async def test_route_limits_do_not_throttle_other_routes(client, admin_headers):
+    headers = await _key_for_plan(
+        client,
+        admin_headers,
+        default_rpm=100,
+        routes=[{"path": "/v1/export", "limits": [{"period": "minute", "limit": 1}]}],
+    )
+
+    assert (await client.post("/v1/export", headers=headers)).status_code == 200
+    rejected = await client.post("/v1/export", headers=headers)
+    assert rejected.status_code == 429
+    assert rejected.headers["X-RateLimit-Limit"] == "1"
+
+    resp = await client.get("/v1/hello", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["X-RateLimit-Limit"] == "100"
+
+
+async def test_invalid_routes_rejected(client, admin_headers):
+    for routes in (
+        [{"path": "/admin/plans"}],
+        [{"path": "/v1/export", "cost": 0}],
+        [{"method": "post", "path": "/v1/export"}, {"method": "POST", "path": "/v1/export"}],
+    ):
+        resp = await client.post(
+            "/admin/plans",
+            json={"name": f"bad-{uuid.uuid4().hex[:8]}", "default_rpm": 10, "routes": routes},
+            headers=admin_headers,
+        )
+        assert resp.status_code == 422
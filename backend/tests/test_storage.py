@@ -0,0 +1,169 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from redis.asyncio.cluster import RedisCluster
+
+from app.algorithms import Charge, Limit, window_args
+from app.storage import LeaseRequest
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+T0 = 10_000_000_060 * 60 * 1000
+
+
+def _prefix(backend) -> str:
+    return backend.key_prefix(f"test-{uuid.uuid4().hex}")
+
+
+async def test_decide_charges_cost(backend):
+    prefix = _prefix(backend)
+    charges = [Charge(Limit("minute", 10), prefix, cost=3)]
+
+    for _ in range(4):
+        await backend.decide(charges, T0, f"{prefix}seen")
+
+    counter = window_args(Limit("minute", 10), prefix, T0)[0][0]
+    # three admitted at cost 3; the rejected fourth charges nothing
+    assert await backend.read_counters([counter, f"{prefix}missing"]) == [9, 0]
+    assert await backend.read_counters([f"{prefix}seen"]) == [T0 // 1000]
+
+
+async def test_lease_grants_what_is_left_or_nothing(backend):
+    prefix = _prefix(backend)
+    minute, day = f"{prefix}m:1", f"{prefix}d:1"
+    end = T0 + 60_000
+
+    first = await backend.lease(
+        [LeaseRequest(minute, 10, end, want=6, need=1), LeaseRequest(day, 100, end, want=6, need=1)],
+        T0, f"{prefix}seen",
+    )
+    assert first.allowed
+    assert first.grants == ((6, 6), (6, 6))
+
+    # only 4 left in the minute window: granted in full, capped
+    second = await backend.lease(
+        [LeaseRequest(minute, 10, end, want=6, need=1)], T0, f"{prefix}seen"
+    )
+    assert second.grants == ((4, 10),)
+
+    # nothing left: rejected, and the day counter is not touched either
+    third = await backend.lease(
+        [LeaseRequest(day, 100, end, want=6, need=1), LeaseRequest(minute, 10, end, want=6, need=1)],
+        T0, f"{prefix}seen",
+    )
+    assert (third.allowed, third.failed) == (False, 1)
+    assert await backend.read_counters([minute, day]) == [10, 6]
+
+
+async def test_release_returns_quota_without_going_negative(backend):
+    first, second = _prefix(backend), _prefix(backend)
+    end = T0 + 60_000
+    for prefix in (first, second):
+        await backend.lease(
+            [LeaseRequest(f"{prefix}m:1", 10, end, want=8, need=1)],
+            T0, f"{prefix}seen",
+        )
+
+    # keys of two API keys in one call (different cluster slots)
+    await backend.release([f"{first}m:1", f"{second}m:1", f"{first}m:gone"], [5, 50, 3])
+
+    assert await backend.read_counters([f"{first}m:1", f"{second}m:1", f"{first}m:gone"]) == [3, 0, 0]
+
+
+async def test_incr_window(backend):
+    key = f"admin_rl:test-{uuid.uuid4().hex}"
+
+    assert [await backend.incr_window(key, 60) for _ in range(3)] == [1, 2, 3]
+    assert await backend.read_counters([key]) == [3]
+
+
+async def test_concurrent_decisions_are_atomic(backend):
+    prefix = _prefix(backend)
+    charges = [Charge(Limit("second", 50), prefix), Charge(Limit("minute", 1000), prefix)]
+
+    results = await asyncio.gather(
+        *(backend.decide(charges, T0, f"{prefix}seen") for _ in range(200))
+    )
+
+    assert sum(r.allowed for r in results) == 50
+    counters = [window_args(c.limit, prefix, T0)[0][0] for c in charges]
+    assert await backend.read_counters(counters) == [50, 50]
+
+
+async def test_key_counters_share_a_cluster_slot(backend):
+    if not isinstance(getattr(backend, "client", None), RedisCluster):
+        pytest.skip("cluster only")
+    prefix = _prefix(backend)
+    keys = [f"{prefix}seen", f"{prefix}m:1", f"{prefix}r:abcd:m:1", f"{prefix}d:20300101"]
+
+    assert len({backend.client.keyslot(key) for key in keys}) == 1
+
+
+async def test_tenant_keys_and_pools_share_a_cluster_slot(backend):
+    if not isinstance(getattr(backend, "client", None), RedisCluster):
+        pytest.skip("cluster only")
+    tenant = uuid.uuid4().hex
+    prefixes = [
+        backend.key_prefix("key-a", tenant),
+        backend.key_prefix("key-b", tenant),
+        backend.pool_prefix(f"u:{tenant}", tenant),
+        backend.pool_prefix("p:plan", tenant),
+    ]
+
+    assert len(set(prefixes)) == 4
+    assert len({backend.client.keyslot(f"{prefix}m:1") for prefix in prefixes}) == 1
+
+
+async def test_decide_many_matches_sequential_decide(backend):
+    prefix, other = _prefix(backend), _prefix(backend)
+    limit = Limit("minute", 5)
+    requests = [
+        ([Charge(limit, prefix, cost=2)], f"{prefix}seen"),
+        ([Charge(limit, other)], f"{other}seen"),
+        ([Charge(Limit("minute", 0), other)], f"{other}seen"),  # blocks everything
+        ([Charge(limit, prefix, cost=2)], f"{prefix}seen"),
+        ([Charge(limit, prefix, cost=2)], f"{prefix}seen"),
+    ]
+
+    decisions = await backend.decide_many(requests, T0)
+
+    assert [d.allowed for d in decisions] == [True, True, False, True, False]
+    assert [d.remaining for d in decisions] == [3, 4, 0, 1, 0]
+    counters = [window_args(limit, p, T0)[0][0] for p in (prefix, other)]
+    assert await backend.read_counters(counters) == [4, 1]
+
+
+async def test_concurrency_slots_expire_renew_and_release(backend):
+    key = f"{_prefix(backend)}inflight"
+
+    assert await backend.acquire_slot(key, "a", 2, T0, T0 + 1000)
+    assert await backend.acquire_slot(key, "b", 2, T0, T0 + 1000)
+    assert not await backend.acquire_slot(key, "c", 2, T0 + 500, T0 + 1500)
+
+    # "a" is renewed; "b" expires, as if its instance had crashed
+    await backend.renew_slots([(key, "a")], T0 + 900, T0 + 5000)
+    assert await backend.acquire_slot(key, "c", 2, T0 + 1000, T0 + 2000)
+    assert not await backend.acquire_slot(key, "d", 2, T0 + 1000, T0 + 2000)
+
+    # renewing an expired lease doesn't bring it back
+    await backend.renew_slots([(key, "c")], T0 + 2000, T0 + 9000)
+    await backend.release_slot(key, "a")
+    assert await backend.acquire_slot(key, "d", 2, T0 + 2000, T0 + 3000)
+    assert await backend.acquire_slot(key, "e", 2, T0 + 2000, T0 + 3000)
+    assert not await backend.acquire_slot(key, "f", 2, T0 + 2000, T0 + 3000)
+
+
+async def test_renewing_a_slot_never_shortens_the_set_ttl(backend):
+    if getattr(backend, "client", None) is None:
+        pytest.skip("Redis only")
+    key = f"{_prefix(backend)}inflight"
+    now = int(time.time() * 1000)
+
+    assert await backend.acquire_slot(key, "long", 2, now, now + 60_000)
+    assert await backend.acquire_slot(key, "short", 2, now, now + 1000)
+    await backend.renew_slots([(key, "short")], now, now + 5000)
+
+    # "long" still holds its slot for a minute
+    assert await backend.client.pttl(key) > 50_000
@@ -0,0 +1,121 @@
+import gzip
+import json
+import uuid
+
+import pytest
+
+from app.routers import transfer
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def _user(client) -> dict:
+    resp = await client.post(
+        "/auth/register",
+        json={"email": f"export-{uuid.uuid4().hex[:8]}@example.com", "password": "password123"},
+    )
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def _tenant(client, headers) -> list[dict]:
+    """Two plans with three keys between them; returns the created keys."""
+    keys = []
+    for name, count in (("basic", 1), ("pro", 2)):
+        plan = await client.post(
+            "/admin/plans",
+            json={"name": name, "default_rpm": 60, "limits": [{"period": "day", "limit": 1000}]},
+            headers=headers,
+        )
+        resp = await client.post(
+            "/admin/api-keys/bulk",
+            json={"label": name, "plan_id": plan.json()["id"], "count": count},
+            headers=headers,
+        )
+        keys += [json.loads(line) for line in resp.text.splitlines()]
+    return keys
+
+
+async def _export(client, headers, **params) -> list[dict]:
+    resp = await client.get("/admin/export", params=params, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in resp.text.splitlines()]
+
+
+async def _import(client, headers, records: list[dict], compress=False):
+    body = "".join(json.dumps(r) + "\n" for r in records).encode()
+    if compress:
+        body = gzip.compress(body)
+        headers = {**headers, "Content-Encoding": "gzip"}
+    return await client.post("/admin/import", content=body, headers=headers)
+
+
+async def test_export_streams_plans_then_keys(client, monkeypatch):
+    monkeypatch.setattr(transfer, "EXPORT_FETCH_ROWS", 2)
+    headers = await _user(client)
+    keys = await _tenant(client, headers)
+
+    records = await _export(client, headers)
+
+    assert [r["type"] for r in records] == ["plan"] * 2 + ["api_key"] * 3
+    assert [r["name"] for r in records[:2]] == ["basic", "pro"]
+    assert records[0]["limits"] == [{"period": "day", "limit": 1000}]
+    assert {r["id"] for r in records[2:]} == {k["id"] for k in keys}
+    assert all("plaintext_key" not in r and len(r["key_hash"]) == 64 for r in records[2:])
+    # Other tenants' rows are not included
+    assert await _export(client, await _user(client)) == []
+
+
+async def test_gzip_export(client):
+    headers = await _user(client)
+    await _tenant(client, headers)
+
+    resp = await client.get("/admin/export", params={"gzip": "true"}, headers=headers)
+
+    assert resp.headers["content-encoding"] == "gzip"
+    # httpx decodes Content-Encoding transparently
+    assert len(resp.text.splitlines()) == 5
+
+
+async def test_import_restores_an_export(client, monkeypatch):
+    monkeypatch.setattr(transfer, "IMPORT_BATCH_ROWS", 2)
+    headers = await _user(client)
+    keys = await _tenant(client, headers)
+    records = await _export(client, headers)
+    ids = [k["id"] for k in keys]
+    await client.post("/admin/api-keys/bulk/delete", json={"ids": ids}, headers=headers)
+    for plan in records[:2]:
+        await client.delete(f"/admin/plans/{plan['id']}", headers=headers)
+
+    resp = await _import(client, headers, records, compress=True)
+
+    assert resp.status_code == 200, resp.text
+    assert resp.json() == {"plans": 2, "api_keys": 3, "skipped": 0}
+    assert await _export(client, headers) == records
+    resp = await client.get("/v1/hello", headers={"X-API-Key": keys[0]["plaintext_key"]})
+    assert resp.status_code == 200
+    stats = (await client.get("/admin/stats", headers=headers)).json()
+    assert (stats["total_plans"], stats["total_keys"]) == (2, 3)
+
+    # Importing again, or as another user, adds nothing
+    resp = await _import(client, headers, records)
+    assert resp.json() == {"plans": 0, "api_keys": 0, "skipped": 5}
+    resp = await _import(client, await _user(client), records)
+    assert resp.json() == {"plans": 0, "api_keys": 0, "skipped": 5}
+
+
+async def test_import_is_all_or_nothing(client):
+    headers = await _user(client)
+    plan = {
+        "type": "plan",
+        "id": str(uuid.uuid4()),
+        "name": "imported",
+        "default_rpm": 60,
+        "created_at": "2026-01-01T00:00:00Z",
+    }
+
+    resp = await _import(client, headers, [plan, {"type": "api_key", "id": "nope"}])
+
+    assert resp.status_code == 422
+    assert resp.json()["detail"]["line"] == 2
+    assert await _export(client, headers) == []
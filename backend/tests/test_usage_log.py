@@ -0,0 +1,150 @@
+import time
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import select, text
+
+from app.database import AsyncSessionLocal
+from app.models import UsageLog
+from app.redis_client import redis_client
+from app.usage_log import UsageIngester, UsageRecorder, partition_name, usage_recorder
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+def _pipeline(retention_days: int = 30) -> tuple[UsageRecorder, UsageIngester]:
+    stream = f"usage:test:{uuid.uuid4().hex[:8]}"
+    recorder = UsageRecorder(True, stream, maxlen=10_000, interval=1, max_buffer=1000)
+    ingester = UsageIngester(stream, batch_size=500, retention_days=retention_days, consumer="c1")
+    return recorder, ingester
+
+
+async def _rows(key_id: str) -> list[UsageLog]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(UsageLog).where(UsageLog.key_id == uuid.UUID(key_id)).order_by(UsageLog.ts)
+        )
+        return list(result.scalars())
+
+
+async def test_events_reach_usage_log():
+    recorder, ingester = _pipeline()
+    await ingester.ensure_group()
+    key_id = str(uuid.uuid4())
+    now = time.time()
+    recorder.record(key_id, "GET /v1/hello", now, True, 1)
+    recorder.record(key_id, "POST /v1/export", now + 0.001, False, 50)
+
+    assert await recorder.flush() == 2
+    assert await ingester.ingest_once() == 1  # both events in one stream entry
+
+    rows = await _rows(key_id)
+    assert [(r.route, r.allowed, r.cost) for r in rows] == [
+        ("GET /v1/hello", True, 1),
+        ("POST /v1/export", False, 50),
+    ]
+    assert ingester.stats()["ingested"] == 2
+    assert ingester.last_lag_ms >= 0
+    # acknowledged and removed from the stream
+    assert await redis_client.xlen(recorder.stream) == 0
+    await redis_client.delete(recorder.stream)
+
+
+async def test_redelivered_entries_are_not_counted_twice():
+    recorder, ingester = _pipeline()
+    recorder.events_per_entry = 2
+    await ingester.ensure_group()
+    key_id = str(uuid.uuid4())
+    for i in range(10):
+        recorder.record(key_id, "GET /v1/hello", time.time(), True, 1)
+    await recorder.flush()
+
+    # c1 reads the 5 entries, writes two of them and dies before acknowledging
+    response = await redis_client.xreadgroup(
+        ingester.group, "c1", {recorder.stream: ">"}, count=100
+    )
+    entries = response[0][1]
+    assert len(entries) == 5
+    lines, days, _ = ingester._copy_lines(entries[:2], time.time())
+    await ingester._copy(lines, days)
+
+    other = UsageIngester(recorder.stream, batch_size=3, retention_days=30, consumer="c2")
+    assert await other.reclaim(min_idle_ms=0) == 5
+
+    assert len(await _rows(key_id)) == 10
+    assert other.duplicates == 4
+    assert (await redis_client.xpending(recorder.stream, ingester.group))["pending"] == 0
+    await redis_client.delete(recorder.stream)
+
+
+async def test_routes_are_escaped_for_copy():
+    recorder, ingester = _pipeline()
+    await ingester.ensure_group()
+    key_id = str(uuid.uuid4())
+    route = "GET /v1/a\tb\\c\nd"
+    recorder.record(key_id, route, time.time(), True, 1)
+    await recorder.flush()
+    await ingester.ingest_once()
+
+    assert [r.route for r in await _rows(key_id)] == [route]
+    await redis_client.delete(recorder.stream)
+
+
+async def test_full_buffer_drops_new_events():
+    recorder = UsageRecorder(True, "usage:unused", maxlen=10, interval=1, max_buffer=3)
+    for _ in range(5):
+        recorder.record(str(uuid.uuid4()), "GET /v1/hello", time.time(), True, 1)
+
+    assert recorder.stats()["buffered"] == 3
+    assert recorder.stats()["dropped"] == 2
+
+
+async def test_old_partitions_are_dropped():
+    recorder, ingester = _pipeline(retention_days=0)  # keep everything
+    await ingester.ensure_group()
+    key_id = str(uuid.uuid4())
+    old = datetime(2001, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+    recorder.record(key_id, "GET /v1/hello", old, True, 1)
+    recorder.record(key_id, "GET /v1/hello", old + 86400, True, 1)
+    recorder.record(key_id, "GET /v1/hello", time.time(), True, 1)
+    await recorder.flush()
+    await ingester.ingest_once()
+    assert len(await _rows(key_id)) == 3
+
+    ingester.retention_days = 30
+    dropped = await ingester.drop_expired_partitions()
+
+    assert partition_name(date(2001, 1, 1)) in dropped
+    assert partition_name(date(2001, 1, 2)) in dropped
+    assert partition_name(datetime.now(timezone.utc).date()) not in dropped
+    assert len(await _rows(key_id)) == 1
+
+    # Events older than the retention period don't recreate a partition
+    recorder.record(key_id, "GET /v1/hello", old, True, 1)
+    await recorder.flush()
+    await ingester.ingest_once()
+    assert ingester.expired == 1
+    async with AsyncSessionLocal() as session:
+        exists = await session.scalar(
+            text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partition_name(date(2001, 1, 1))}
+        )
+    assert not exists
+    await redis_client.delete(recorder.stream)
+
+
+async def test_middleware_records_decisions(client, api_key, monkeypatch):
+    monkeypatch.setattr(usage_recorder, "enabled", True)
+    monkeypatch.setattr(usage_recorder, "_buffer", [])
+    headers = {"X-API-Key": api_key["plaintext_key"]}
+
+    assert (await client.get("/v1/hello", headers=headers)).status_code == 200
+    assert (await client.get("/v1/hello", headers={"X-API-Key": "bogus"})).status_code == 401
+
+    events = usage_recorder._buffer
+    assert len(events) == 1
+    key_id, route, ts_ms, allowed, cost = events[0]
+    assert key_id == api_key["id"]
+    assert route == "GET /v1/hello"
+    assert allowed is True and cost == 1
+    assert abs(ts_ms / 1000 - time.time()) < 5
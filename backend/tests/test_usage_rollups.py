@@ -0,0 +1,152 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.database import AsyncSessionLocal
+from app.models import UsageRollup
+from app.redis_client import redis_client
+from app.usage_rollups import UsageRollups, bucket_start, usage_rollups
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+HOUR = 3600
+
+
+@pytest.fixture
+async def rollups(monkeypatch):
+    """The app's rollups, with their own Redis namespace."""
+    namespace = f"usage:test:{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(usage_rollups, "namespace", namespace)
+    monkeypatch.setattr(usage_rollups, "_counts", {})
+    yield usage_rollups
+    keys = [k async for k in redis_client.scan_iter(f"{namespace}:*")]
+    if keys:
+        await redis_client.delete(*keys)
+
+
+async def _usage(client, headers, key_id, **params):
+    resp = await client.get("/admin/usage", params={"key_id": key_id, **params}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+async def test_requests_are_counted_per_route(client, admin_headers, api_key, rollups):
+    headers = {"X-API-Key": api_key["plaintext_key"]}
+    for _ in range(3):
+        await client.get("/v1/hello", headers=headers)
+    # Paths the app has no route for share one bucket
+    await client.get("/v1/data", headers=headers)
+    await client.get(f"/v1/{uuid.uuid4().hex}", headers=headers)
+    await rollups.flush()
+
+    usage = await _usage(client, admin_headers, api_key["id"])
+
+    assert len(usage["buckets"]) == 24
+    current = usage["buckets"][-1]
+    assert current["routes"] == [
+        {"route": "GET /v1/hello", "allowed": 3, "rejected": 0},
+        {"route": "other", "allowed": 2, "rejected": 0},
+    ]
+    assert (usage["allowed"], usage["rejected"]) == (5, 0)
+    assert all(b["allowed"] == 0 for b in usage["buckets"][:-1])
+
+    daily = await _usage(client, admin_headers, api_key["id"], period="day")
+    assert len(daily["buckets"]) == 30
+    assert daily["buckets"][-1]["allowed"] == 5
+
+
+async def test_rejections_are_counted(client, admin_headers, rollups):
+    plan = await client.post(
+        "/admin/plans",
+        json={"name": f"rollup-{uuid.uuid4().hex[:8]}", "default_rpm": 1},
+        headers=admin_headers,
+    )
+    key = await client.post(
+        "/admin/api-keys",
+        json={"label": "rollup", "plan_id": plan.json()["id"]},
+        headers=admin_headers,
+    )
+    headers = {"X-API-Key": key.json()["plaintext_key"]}
+    statuses = [(await client.get("/v1/hello", headers=headers)).status_code for _ in range(3)]
+    assert statuses == [200, 429, 429]
+    await rollups.flush()
+
+    usage = await _usage(client, admin_headers, key.json()["id"])
+
+    assert (usage["allowed"], usage["rejected"]) == (1, 2)
+
+
+async def test_closed_buckets_are_folded_into_postgres(client, admin_headers, api_key, rollups):
+    key_id = api_key["id"]
+    hour = bucket_start(time.time(), "hour")
+    now = hour + 120  # past the grace period of the previous hour
+    rollups.record(key_id, "GET /v1/hello", hour - 2 * HOUR + 5, True)
+    rollups.record(key_id, "GET /v1/hello", hour - 2 * HOUR + 6, False)
+    rollups.record(key_id, "GET /v1/data", hour - HOUR + 1, True)
+    await rollups.flush()
+    before = await _usage(client, admin_headers, key_id, period="hour")
+
+    # Pretend the fold job never ran: it catches up on everything in Redis
+    assert await rollups.fold(now) >= 2
+    assert await rollups.folded_mark("hour") == hour - HOUR
+    async with AsyncSessionLocal() as session:
+        rows = (
+            await session.execute(
+                select(UsageRollup).where(
+                    UsageRollup.key_id == uuid.UUID(key_id), UsageRollup.period == "hour"
+                )
+            )
+        ).scalars().all()
+    assert {(r.bucket_start.timestamp(), r.route, r.allowed, r.rejected) for r in rows} == {
+        (hour - 2 * HOUR, "GET /v1/hello", 1, 1),
+        (hour - HOUR, "GET /v1/data", 1, 0),
+    }
+
+    # The same answer, now read from Postgres for the closed hours
+    after = await _usage(client, admin_headers, key_id, period="hour")
+    assert after == before
+    assert after["buckets"][-3]["allowed"] == 1 and after["buckets"][-3]["rejected"] == 1
+    assert after["buckets"][-2]["routes"] == [{"route": "GET /v1/data", "allowed": 1, "rejected": 0}]
+
+    # Folding again changes nothing; the open hour stays in Redis
+    assert await rollups.fold(now) == 0
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(UsageRollup).where(UsageRollup.key_id == uuid.UUID(key_id)))
+        await session.commit()
+
+
+async def test_only_one_instance_folds_at_a_time(rollups):
+    other = UsageRollups(1, 1, 0, namespace=rollups.namespace)
+    await redis_client.set(f"{rollups.namespace}:fold:lock", "someone-else")
+
+    assert await other.fold() == 0
+    assert await other.folded_mark("hour") is None
+
+
+async def test_usage_is_scoped_to_the_owner(client, api_key):
+    other = await client.post(
+        "/auth/register",
+        json={"email": f"usage-{uuid.uuid4().hex[:8]}@example.com", "password": "password123"},
+    )
+    headers = {"Authorization": f"Bearer {other.json()['access_token']}"}
+
+    resp = await client.get("/admin/usage", params={"key_id": api_key["id"]}, headers=headers)
+
+    assert resp.status_code == 404
+
+
+@pytest.mark.parametrize("year", [2000, 1])
+async def test_usage_range_is_bounded(client, admin_headers, api_key, year):
+    resp = await client.get(
+        "/admin/usage",
+        params={
+            "key_id": api_key["id"],
+            "start": datetime(year, 1, 1, tzinfo=timezone.utc).isoformat(),
+        },
+        headers=admin_headers,
+    )
+
+    assert resp.status_code == 422